@@ -1,12 +1,23 @@
 # app.py
+import os
+
+import counterfactual
+import instrumentation
 import streamlit as st
-from risk_engine import (
-    Inputs,
-    score_cardiometabolic,
-    score_sleep_stress,
-    score_msk_energy,
-    pick_actions,
+from normalize import canonical
+from report import (
+    DEPRIORITIZATION_MD,
+    DISCLAIMER,
+    WARNING_SIGNALS_MD,
+    build_report,
+    cache_stats,
+    report_key,
+    use_rules,
+    use_score_table,
 )
+from risk_engine import RULES, Inputs
+from rules import RuleSet, load_rules
+from score_table import ScoreTable
 
 st.set_page_config(
     page_title="HealthSignal",
@@ -17,6 +28,30 @@ st.set_page_config(
 st.title("HealthSignal — Preventive Snapshot (MVP)")
 st.caption("Decision support only. Not diagnosis or treatment.")
 
+
+# Optional precomputed score table (see score_table.py); shared across sessions.
+# Reports and the "What would lower my level?" changes both score through it.
+@st.cache_resource
+def load_score_table(path: str) -> ScoreTable:
+    return ScoreTable.load(path)
+
+
+# Optional rule version under rules/, or rule file, to score with (default:
+# the engine's); a score table only serves the engine's rules.
+@st.cache_resource
+def load_rule_set(name: str) -> RuleSet:
+    return load_rules(name)
+
+
+SCORE_TABLE_PATH = os.environ.get("HEALTHSIGNAL_SCORE_TABLE")
+RULES_NAME = os.environ.get("HEALTHSIGNAL_RULES")
+use_rules(load_rule_set(RULES_NAME) if RULES_NAME else RULES)
+use_score_table(load_score_table(SCORE_TABLE_PATH) if SCORE_TABLE_PATH else None)
+
+# Optional rule-hit counters and timings for report builds (see instrumentation.py).
+if os.environ.get("HEALTHSIGNAL_INSTRUMENT"):
+    instrumentation.enable()
+
 # Presets
 
 PRESETS = {
@@ -87,8 +122,10 @@ PRESETS = {
 if "generated" not in st.session_state:
     st.session_state.generated = False
 
-if "report" not in st.session_state:
-    st.session_state.report = None
+# Only the canonical report key lives in session state; report content is
+# cached across sessions in report.py.
+if "report_key" not in st.session_state:
+    st.session_state.report_key = None
 
 # If user has never loaded anything, default to Persona A once.
 if "initialized" not in st.session_state:
@@ -251,7 +288,7 @@ if st.sidebar.button("Generate report"):
         weight_kg=weight_kg,
         family_cvd=family_cvd,
         family_t2d=family_t2d,
-        exercise_bucket=exercise_bucket.split()[0],
+        exercise_bucket=canonical("exercise_bucket", exercise_bucket),
         sleep_quality=sleep_quality,
         sleep_duration_bucket=sleep_duration_bucket,
         alcohol_bucket=alcohol_bucket,
@@ -265,26 +302,14 @@ if st.sidebar.button("Generate report"):
         rhr_bucket=rhr_bucket,
     )
 
-    # Compute report
-    cardio_lvl, cardio_pts, cardio_reasons = score_cardiometabolic(x)
-    sleep_lvl, sleep_pts, sleep_reasons = score_sleep_stress(x)
-    msk_lvl, msk_pts, msk_reasons = score_msk_energy(x)
-    actions = pick_actions(cardio_lvl, sleep_lvl, msk_lvl, x)
-
-    # Persist report (CRITICAL)
-    st.session_state.report = {
-        "cardio": {"level": cardio_lvl, "points": cardio_pts, "reasons": cardio_reasons},
-        "sleep": {"level": sleep_lvl, "points": sleep_pts, "reasons": sleep_reasons},
-        "msk": {"level": msk_lvl, "points": msk_pts, "reasons": msk_reasons},
-        "actions": actions,
-    }
-
+    # Persist report key (CRITICAL)
+    st.session_state.report_key = report_key(x)
     st.session_state.generated = True
 
 
 if st.sidebar.button("Reset report"):
     st.session_state.generated = False
-    st.session_state.report = None
+    st.session_state.report_key = None
 
 
 
@@ -292,26 +317,13 @@ if st.sidebar.button("Reset report"):
 # Report Rendering (state-driven)
 
 if st.session_state.generated:
-    report = st.session_state.get("report")
+    key = st.session_state.get("report_key")
 
-    # If generated got flipped on but no report payload exists (edge case), fail safely.
-    if report is None:
+    # If generated got flipped on but no report key exists (edge case), fail safely.
+    if key is None:
         st.warning("Report state was cleared. Click **Generate report** again.")
     else:
-        # Unpack persisted report values (prevents NameError after reruns)
-        cardio_lvl = report["cardio"]["level"]
-        cardio_pts = report["cardio"]["points"]
-        cardio_reasons = report["cardio"]["reasons"]
-
-        sleep_lvl = report["sleep"]["level"]
-        sleep_pts = report["sleep"]["points"]
-        sleep_reasons = report["sleep"]["reasons"]
-
-        msk_lvl = report["msk"]["level"]
-        msk_pts = report["msk"]["points"]
-        msk_reasons = report["msk"]["reasons"]
-
-        actions = report["actions"]
+        report = build_report(key)
 
         # Tabs-based report (stable on desktop + mobile)
         tabs = st.tabs(
@@ -322,54 +334,43 @@ if st.session_state.generated:
         # Tab 0 — Risk Summary
  
         with tabs[0]:
-            st.markdown("## Risk Summary (5–10 year horizon)")
-            st.markdown(
-                f"**Cardiometabolic risk — {cardio_lvl}**  \n"
-                f"Drivers: {', '.join(cardio_reasons) if cardio_reasons else 'insufficient data'}"
-            )
-            st.markdown(
-                f"**Musculoskeletal / energy decline — {msk_lvl}**  \n"
-                f"Drivers: {', '.join(msk_reasons) if msk_reasons else 'insufficient data'}"
-            )
-            st.markdown(
-                f"**Sleep / stress load — {sleep_lvl}**  \n"
-                f"Drivers: {', '.join(sleep_reasons) if sleep_reasons else 'insufficient data'}"
-            )
+            for md in report.risk_summary_md:
+                st.markdown(md)
+
+            with st.expander("What would lower my level?"):
+                changes = counterfactual.for_key(key)
+                names = {"cardio": "Cardiometabolic", "sleep": "Sleep / stress", "msk": "Musculoskeletal / energy"}
+                for domain, result in (("cardio", report.cardio), ("msk", report.msk), ("sleep", report.sleep)):
+                    if result[0] == "Low":
+                        continue
+                    st.markdown(f"**{names[domain]} — {result[0]}**")
+                    top = changes[domain][:3]
+                    if not top:
+                        st.markdown("No one or two changes lower this level.")
+                    for cf in top:
+                        level = cf.levels[counterfactual.DOMAINS.index(domain)]
+                        st.markdown(f"- {cf.describe()}: {level}")
 
 
         # Tab 1 — Priority Actions
         
         with tabs[1]:
-            st.markdown("## Priority Actions (next 90 days)")
-            for i, a in enumerate(actions, 1):
-                st.markdown(
-                    f"**Action {i}: {a['title']}**  \n"
-                    f"Target: {a['target']}  \n"
-                    f"Why: {a['why']}"
-                )
+            for md in report.priority_actions_md:
+                st.markdown(md)
 
 
         # Tab 2 — Early Warning Signals
   
         with tabs[2]:
-            st.markdown("## Early Warning Signals")
-            st.markdown("- Blood pressure trending up (esp. consistent >130/85 at home)")
-            st.markdown("- Waist/weight trend increasing over 2–3 months")
-            st.markdown("- Sleep <6 hours on multiple nights/week")
-            st.markdown("- Resting HR trending upward (if tracked)")
+            for md in WARNING_SIGNALS_MD:
+                st.markdown(md)
 
        
         # Tab 3 — Deprioritization
       
         with tabs[3]:
-            st.markdown("## What you do **NOT** need to worry about right now")
-            st.markdown(
-                "- Continuous glucose monitors\n"
-                "- Advanced lipid panels\n"
-                "- VO₂ max testing\n"
-                "- Supplement stacks\n"
-                "- Extreme diets/biohacks"
-            )
+            for md in DEPRIORITIZATION_MD:
+                st.markdown(md)
 
       
         # Tab 4 — Debug (Internal)
@@ -381,32 +382,16 @@ if st.session_state.generated:
 
             if show_debug:
                 with st.container(height=400):
-                    st.write(
-                        {
-                            "cardiometabolic": {
-                                "level": cardio_lvl,
-                                "points": cardio_pts,
-                                "drivers": cardio_reasons,
-                            },
-                            "sleep_stress": {
-                                "level": sleep_lvl,
-                                "points": sleep_pts,
-                                "drivers": sleep_reasons,
-                            },
-                            "msk_energy": {
-                                "level": msk_lvl,
-                                "points": msk_pts,
-                                "drivers": msk_reasons,
-                            },
-                            "actions_selected": [a["title"] for a in actions],
-                        }
-                    )
+                    st.write(report.debug())
+                st.caption("Report cache (shared across sessions)")
+                st.write(cache_stats())
+                if instrumentation.current() is not None:
+                    st.caption("Rule hits and stage timings (report builds, all sessions)")
+                    st.write(instrumentation.snapshot())
             else:
                 st.info("Toggle **Show debug details** to display internal scoring.")
 
-        st.caption(
-            "Decision support only. Not diagnosis or treatment. Seek clinical care for concerning symptoms or major changes."
-        )
+        st.caption(DISCLAIMER)
 
 else:
     st.info("Use the sidebar to select a preset (e.g., Persona A) and click **Generate report**.")
@@ -0,0 +1,284 @@
+# arrow_io.py
+#
+# Parquet / Arrow IPC in, Arrow columns out, without per-row Python objects:
+#
+#   python arrow_io.py intake.parquet results.parquet [--table score_table.hst]
+#
+# Inputs are read one row group (Parquet) or record batch (IPC) at a time from
+# a memory map. Bucket columns may be dictionary-encoded or plain strings, or
+# already hold CATEGORIES codes; they are mapped to codes by looking up the
+# (small) dictionary once per batch and indexing with the row indices. Rows
+# fail the same checks as normalize.py (nulls, unknown bucket values, age,
+# height and weight outside normalize.RANGES, fractional ages) and are skipped
+# with the same reason codes; --rejects writes them as JSONL. Results keep each row's source
+# position in "row" and are written batch by batch; an input without rows
+# still gets an output file with the result schema.
+#
+# Needs pyarrow (installed with streamlit).
+import argparse
+import sys
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from normalize import (
+    INTEGER_FIELDS,
+    MISSING,
+    NOT_A_NUMBER,
+    NOT_AN_INTEGER,
+    OUT_OF_RANGE,
+    RANGES,
+    UNKNOWN_VALUE,
+    Problem,
+    Reject,
+)
+from risk_engine import (
+    ACTIONS,
+    BOOL_FIELDS,
+    CARDIO_REASONS,
+    CATEGORIES,
+    LEVELS,
+    MSK_REASONS,
+    SLEEP_REASONS,
+    score_batch,
+)
+from compact import unpack_results
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+INPUT_FIELDS: Tuple[str, ...] = (
+    "age", "sex", "height_cm", "weight_kg", *BOOL_FIELDS,
+    *(f for f in CATEGORIES if f != "sex"),
+)
+DOMAINS = (("cardio", CARDIO_REASONS), ("sleep", SLEEP_REASONS), ("msk", MSK_REASONS))
+
+
+class ArrowInputError(ValueError):
+    pass
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("arrow_io needs pyarrow: pip install pyarrow")
+
+
+def _numpy(arr: "pa.Array", dtype) -> np.ndarray:
+    # zero-copy for null-free numeric columns; nulls are handled by the caller
+    if arr.null_count:
+        arr = arr.fill_null(False if pa.types.is_boolean(arr.type) else 0)
+    return arr.to_numpy(zero_copy_only=False).astype(dtype, copy=False)
+
+
+def _nulls(arr: "pa.Array") -> np.ndarray:
+    if not arr.null_count:
+        return np.zeros(len(arr), dtype=bool)
+    return arr.is_null().to_numpy(zero_copy_only=False)
+
+
+def _problems(field: str, arr: "pa.Array", null: np.ndarray, bad: np.ndarray, code: str,
+              problems: Dict[int, List[Problem]]) -> None:
+    # bad rows are rare, so their values are read one at a time
+    for i in np.flatnonzero(null | bad).tolist():
+        if null[i]:
+            p = Problem(field, MISSING)
+        else:
+            v = arr[i].as_py()
+            p = Problem(field, NOT_A_NUMBER if v != v else code, v)
+        problems.setdefault(i, []).append(p)
+
+
+def _number_column(arr: "pa.Array", field: str, problems: Dict[int, List[Problem]]) -> np.ndarray:
+    if not (pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type)):
+        raise ArrowInputError(f"{field}: unsupported type {arr.type}")
+    values = _numpy(arr, np.float64)
+    lo, hi = RANGES[field]
+    null = _nulls(arr)
+    in_range = (values >= lo) & (values <= hi)
+    _problems(field, arr, null, ~in_range, OUT_OF_RANGE, problems)
+    if field in INTEGER_FIELDS and pa.types.is_floating(arr.type):
+        fraction = in_range & ~null & (values != np.floor(values))
+        _problems(field, arr, np.zeros(len(arr), dtype=bool), fraction, NOT_AN_INTEGER, problems)
+    return values
+
+
+def _category_codes(arr: "pa.Array", field: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(uint8 codes, valid mask) for one bucket column."""
+    allowed = CATEGORIES[field]
+    if pa.types.is_dictionary(arr.type):
+        lut = pc.index_in(arr.dictionary.cast(pa.string()), value_set=pa.array(allowed))
+        lut = lut.fill_null(-1).to_numpy(zero_copy_only=False)
+        codes = lut[_numpy(arr.indices, np.int64)]
+    elif pa.types.is_integer(arr.type):
+        codes = _numpy(arr, np.int64)
+        codes = np.where((codes >= 0) & (codes < len(allowed)), codes, -1)
+    elif pa.types.is_string(arr.type) or pa.types.is_large_string(arr.type):
+        codes = pc.index_in(arr, value_set=pa.array(allowed)).fill_null(-1).to_numpy(zero_copy_only=False)
+    else:
+        raise ArrowInputError(f"{field}: unsupported type {arr.type}")
+    valid = codes >= 0
+    return codes.astype(np.uint8), valid
+
+
+def batch_columns(batch: "pa.RecordBatch") -> Tuple[Dict[str, np.ndarray], Dict[int, List[Problem]]]:
+    """Integer-coded columns (as compact.columns() gives) and row -> problems, as
+    normalize.normalize_columns() returns them."""
+    missing = [f for f in INPUT_FIELDS if f not in batch.schema.names]
+    if missing:
+        raise ArrowInputError(f"missing columns: {', '.join(missing)}")
+    problems: Dict[int, List[Problem]] = {}
+    cols: Dict[str, np.ndarray] = {}
+    for f in INPUT_FIELDS:
+        arr = batch.column(f)
+        if f in CATEGORIES:
+            cols[f], ok = _category_codes(arr, f)
+            null = _nulls(arr)
+            _problems(f, arr, null, ~ok & ~null, UNKNOWN_VALUE, problems)
+        elif f in BOOL_FIELDS:
+            cols[f] = _numpy(arr, bool)
+            _problems(f, arr, _nulls(arr), np.zeros(len(arr), dtype=bool), MISSING, problems)
+        else:
+            cols[f] = _number_column(arr, f, problems)
+    cols["age"] = cols["age"].astype(np.int64)
+    return cols, problems
+
+
+def read_batches(path: str) -> Iterator["pa.RecordBatch"]:
+    """Record batches of a Parquet (one per row group) or Arrow IPC file, memory-mapped."""
+    _require_pyarrow()
+    if path.lower().endswith(".parquet"):
+        pf = pq.ParquetFile(path, memory_map=True)
+        fields = [f for f in INPUT_FIELDS if f in pf.schema_arrow.names]
+        for i in range(pf.num_row_groups):
+            yield from pf.read_row_group(i, columns=fields).to_batches()
+    else:
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+
+def _dictionary_list(codes: np.ndarray, names: Tuple[str, ...]) -> "pa.Array":
+    # (n, k) codes padded with -1 -> list<dictionary<int8, string>>
+    keep = codes >= 0
+    offsets = np.concatenate([[0], np.cumsum(keep.sum(axis=1))]).astype(np.int32)
+    values = pa.DictionaryArray.from_arrays(pa.array(codes[keep], pa.int8()), pa.array(names))
+    return pa.ListArray.from_arrays(pa.array(offsets), values)
+
+
+_ACTION_TITLES = tuple(a["title"] for a in ACTIONS)
+
+
+def result_batch(result: Dict[str, np.ndarray], rows: np.ndarray) -> "pa.RecordBatch":
+    """score_batch output as Arrow columns; levels and names are dictionary-encoded."""
+    levels = pa.array(LEVELS)
+    arrays = {"row": pa.array(rows, pa.int64())}
+    for d, names in DOMAINS:
+        arrays[f"{d}_level"] = pa.DictionaryArray.from_arrays(pa.array(result[f"{d}_level"], pa.int8()), levels)
+        arrays[f"{d}_points"] = pa.array(result[f"{d}_points"], pa.int16())
+        arrays[f"{d}_mask"] = pa.array(result[f"{d}_mask"], pa.int32())
+        arrays[f"{d}_reasons"] = _dictionary_list(result[f"{d}_reasons"], names)
+    arrays["actions"] = _dictionary_list(result["actions"], _ACTION_TITLES)
+    return pa.RecordBatch.from_pydict(arrays)
+
+
+def score_batches(
+    batches: Iterator["pa.RecordBatch"], scorer=score_batch,
+) -> Iterator[Tuple["pa.RecordBatch", List[Reject]]]:
+    """(result batch, rejects) per input batch.
+
+    Rejects are numbered from 1 like the CSV/JSONL record numbers; "row" in
+    the results is the 0-based source position.
+    """
+    start = 0
+    for batch in batches:
+        cols, problems = batch_columns(batch)
+        rows = np.arange(start, start + batch.num_rows)
+        rejects = [Reject(start + i + 1, None, tuple(p)) for i, p in sorted(problems.items())]
+        start += batch.num_rows
+        if problems:
+            valid = np.ones(len(rows), dtype=bool)
+            valid[list(problems)] = False
+            cols = {f: c[valid] for f, c in cols.items()}
+            rows = rows[valid]
+        yield result_batch(scorer(cols), rows), rejects
+
+
+def result_schema() -> "pa.Schema":
+    return result_batch(unpack_results(np.empty(0, dtype=np.uint64)), np.empty(0, dtype=np.int64)).schema
+
+
+class _Writer:
+    def __init__(self, path: str):
+        self.path = path
+        self.writer = None
+
+    def _open(self, schema: "pa.Schema") -> None:
+        if self.path.lower().endswith(".parquet"):
+            self.writer = pq.ParquetWriter(self.path, schema)
+        else:
+            self.writer = pa.ipc.new_file(self.path, schema)
+
+    def write(self, batch: "pa.RecordBatch") -> None:
+        if self.writer is None:
+            self._open(batch.schema)
+        self.writer.write_batch(batch)
+
+    def close(self) -> None:
+        if self.writer is None:
+            self._open(result_schema())  # no input rows: still leave a readable, empty file
+        self.writer.close()
+
+
+def score_file(
+    src: str, dst: str, scorer=score_batch, on_reject: Optional[Callable[[Reject], None]] = None,
+) -> Tuple[int, int]:
+    """Score src into dst (Parquet or Arrow IPC by extension); returns (scored, rejected)."""
+    _require_pyarrow()
+    scored = rejected = 0
+    out = _Writer(dst)
+    try:
+        for batch, rejects in score_batches(read_batches(src), scorer):
+            out.write(batch)
+            scored += batch.num_rows
+            rejected += len(rejects)
+            if on_reject:
+                for r in rejects:
+                    on_reject(r)
+    finally:
+        out.close()
+    return scored, rejected
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from healthsignal import format_reject, load_scorer
+
+    ap = argparse.ArgumentParser(description="Score a Parquet or Arrow IPC intake file into Arrow columns.")
+    ap.add_argument("input", help=".parquet, or an Arrow IPC file (.arrow/.feather)")
+    ap.add_argument("output", help=".parquet, or an Arrow IPC file")
+    ap.add_argument("--table", help="score through a prebuilt score table (see score_table.py)")
+    ap.add_argument("--rejects", help="write rejected rows as JSONL with reason codes (default: stderr)")
+    args = ap.parse_args(argv)
+    if args.rejects:
+        err, reject_fmt = open(args.rejects, "w", encoding="utf-8"), "jsonl"
+    else:
+        err, reject_fmt = sys.stderr, "text"
+    try:
+        scored, rejected = score_file(args.input, args.output, load_scorer(args.table),
+                                      lambda r: err.write(format_reject(r, reject_fmt)))
+    except ArrowInputError as e:
+        print(f"arrow_io: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if err is not sys.stderr:
+            err.close()
+    print(f"scored {scored}, rejected {rejected}", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+# artifact.py
+#
+# The whole scoring behavior as one portable file, for clients that score
+# locally without a round trip to Python:
+#
+#   python artifact.py build healthsignal-v1.hsa [--table score_table.hst]
+#   python artifact.py check healthsignal-v1.hsa [--scalar]
+#   python artifact.py info healthsignal-v1.hsa
+#   python artifact.py score healthsignal-v1.hsa '{"age": 38, ...}'
+#
+# The artifact is the score table (see score_table.py) with its entries
+# dictionary-encoded: the distinct result codes, then one small index per
+# key. It is deflated and written after a JSON header. The header holds
+# everything needed to compute a key and to expand a result code: key fields
+# and their values, the excess-weight cutoff, result bit layout, reason
+# lists and the action catalog. File layout:
+#
+#   MAGIC (8) | sha256 of the rest (32) | header length (u32 LE) | header JSON | zlib payload
+#   payload:   distinct result codes (u64 LE) | per-key index (u16 or u32 LE)
+#
+# The reference loader below uses only the standard library; a client port
+# needs the same four steps: check the digest, inflate, compute the key,
+# expand the code. The build and check steps import the engine lazily.
+import argparse
+import hashlib
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+MAGIC = b"HSART\x00\x01\x00"
+FORMAT_VERSION = 1
+_LEN = struct.Struct("<I")
+_DIGEST_BYTES = 32
+_INDEX_TYPES = {2: "H", 4: "I"}
+
+DomainResult = Tuple[str, int, List[str]]
+
+
+class ArtifactError(ValueError):
+    pass
+
+
+# ---- Reference loader ----
+
+class Artifact:
+    def __init__(self, header: Dict[str, Any], entries: array, index: array, checksum: str):
+        self.header = header
+        self.entries = entries
+        self.index = index
+        self.checksum = checksum
+        self.rules_version: str = header["rules_version"]
+        self._levels = header["levels"]
+        self._layout = {name: (shift, (1 << bits) - 1) for name, shift, bits in header["result_layout"]}
+        self._domains = [(d["name"], d["reasons"]) for d in header["domains"]]
+        self._top = header["top_reasons"]
+        self._actions = header["actions"]
+        self._bmi = header["excess_weight_bmi"]
+        # (field, stride, value -> key offset or None for booleans)
+        self._key: List[Tuple[str, int, Optional[Dict[Any, int]]]] = []
+        stride = 1
+        for spec in reversed(header["key"]):
+            values = spec.get("values")
+            offsets = {v: i * stride for i, v in enumerate(values)} if values else None
+            self._key.append((spec["field"], stride, offsets))
+            stride *= len(values) if values else 2
+        if stride != len(index):
+            raise ArtifactError(f"key space {stride} does not match index length {len(index)}")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Artifact":
+        if data[:len(MAGIC)] != MAGIC:
+            raise ArtifactError("not a HealthSignal score artifact")
+        start = len(MAGIC) + _DIGEST_BYTES
+        digest, body = data[len(MAGIC):start], data[start:]
+        if hashlib.sha256(body).digest() != digest:
+            raise ArtifactError("checksum mismatch")
+        (n,) = _LEN.unpack_from(body)
+        header = json.loads(body[_LEN.size:_LEN.size + n].decode("utf-8"))
+        if header.get("format_version") != FORMAT_VERSION:
+            raise ArtifactError(f"format version {header.get('format_version')!r}, expected {FORMAT_VERSION}")
+        payload = zlib.decompress(body[_LEN.size + n:])
+        p = header["payload"]
+        entries = array("Q")
+        index = array(_INDEX_TYPES[p["index_width"]])
+        split = p["entries"] * entries.itemsize
+        entries.frombytes(payload[:split])
+        index.frombytes(payload[split:])
+        if sys.byteorder == "big":
+            entries.byteswap()
+            index.byteswap()
+        return cls(header, entries, index, digest.hex())
+
+    @classmethod
+    def load(cls, path: str) -> "Artifact":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def key(self, record: Mapping[str, Any]) -> int:
+        """Table key for a record of canonical intake values (as Inputs holds them)."""
+        k = 0
+        for field, stride, offsets in self._key:
+            if field == "excess_weight":
+                h_m = record["height_cm"] / 100.0
+                if h_m > 0 and record["weight_kg"] / (h_m ** 2) >= self._bmi:
+                    k += stride
+            elif offsets is None:
+                if record[field]:
+                    k += stride
+            else:
+                try:
+                    k += offsets[record[field]]
+                except KeyError:
+                    raise ArtifactError(f"unknown value {record[field]!r} for {field}") from None
+        return k
+
+    def result_code(self, record: Mapping[str, Any]) -> int:
+        return self.entries[self.index[self.key(record)]]
+
+    def _field(self, code: int, name: str) -> int:
+        shift, mask = self._layout[name]
+        return code >> shift & mask
+
+    def expand(self, code: int) -> Tuple[DomainResult, DomainResult, DomainResult, List[Dict[str, str]]]:
+        # Same shapes as score_cardiometabolic/score_sleep_stress/score_msk_energy/pick_actions.
+        out = []
+        for d, reasons in self._domains:
+            mask = self._field(code, f"{d}_mask")
+            top = [r for i, r in enumerate(reasons) if mask >> i & 1][:self._top]
+            out.append((self._levels[self._field(code, f"{d}_level")], self._field(code, f"{d}_points"), top))
+        actions = [dict(self._actions[self._field(code, f"action{i}")]) for i in (1, 2)]
+        return out[0], out[1], out[2], actions
+
+    def score(self, record: Mapping[str, Any]) -> Tuple[DomainResult, DomainResult, DomainResult, List[Dict[str, str]]]:
+        return self.expand(self.result_code(record))
+
+
+# ---- Build ----
+
+def _header(n_entries: int, index_width: int, n_keys: int) -> Dict[str, Any]:
+    from compact import RESULT_DOMAINS, RESULT_LAYOUT, RESULT_SHIFTS
+    from risk_engine import ACTIONS, CATEGORIES, EXCESS_WEIGHT_BMI, LEVELS, RULES_VERSION, TOP_REASONS
+    from score_table import KEY_FIELDS
+
+    return {
+        "format": "healthsignal-score-artifact",
+        "format_version": FORMAT_VERSION,
+        "rules_version": RULES_VERSION,
+        "levels": list(LEVELS),
+        "key": [{"field": f, "values": list(CATEGORIES[f])} if f in CATEGORIES else {"field": f}
+                for f in KEY_FIELDS],
+        "excess_weight_bmi": EXCESS_WEIGHT_BMI,
+        "result_layout": [[name, RESULT_SHIFTS[name][0], bits] for name, bits in RESULT_LAYOUT],
+        "domains": [{"name": d, "reasons": list(reasons)} for d, reasons in RESULT_DOMAINS],
+        "top_reasons": TOP_REASONS,
+        "actions": [dict(a) for a in ACTIONS],
+        "payload": {"compression": "zlib", "entries": n_entries, "index_width": index_width, "keys": n_keys},
+    }
+
+
+def build(table=None) -> bytes:
+    """Artifact bytes for a ScoreTable (built from the engine when not given)."""
+    import numpy as np
+    from score_table import ScoreTable
+
+    entries = np.asarray((table or ScoreTable.build()).entries)
+    distinct, index = np.unique(entries, return_inverse=True)
+    width = 2 if len(distinct) <= 1 << 16 else 4
+    payload = distinct.astype("<u8").tobytes() + index.astype(f"<u{width}").tobytes()
+    header = json.dumps(_header(len(distinct), width, len(entries)), ensure_ascii=False).encode("utf-8")
+    body = _LEN.pack(len(header)) + header + zlib.compress(payload, 9)
+    return MAGIC + hashlib.sha256(body).digest() + body
+
+
+# ---- Equivalence check ----
+
+def check(art: Artifact, scalar: bool = False, sample: int = 100_000, seed: int = 0) -> List[str]:
+    """Compare an artifact with the Python engine; returns problems (empty when equivalent).
+
+    Every key's result code is checked against score_batch, and every
+    distinct result is expanded by the loader and checked against the scalar
+    scorers at a key that maps to it. Key computation is checked on sampled
+    synthetic records. scalar=True also runs the scalar scorers on every key
+    (slow).
+    """
+    import numpy as np
+    from compact import pack_results
+    from risk_engine import Inputs, pick_actions, score_batch, score_cardiometabolic, score_msk_energy, score_sleep_stress
+    from score_table import TABLE_SIZE, key_columns, key_inputs, key_of
+    from synthetic import population, records
+
+    def scalar_result(x: Inputs):
+        cardio, sleep, msk = score_cardiometabolic(x), score_sleep_stress(x), score_msk_energy(x)
+        return cardio, sleep, msk, pick_actions(cardio[0], sleep[0], msk[0], x)
+
+    problems: List[str] = []
+    expected_header = _header(len(art.entries), art.header["payload"]["index_width"], TABLE_SIZE)
+    for name, value in expected_header.items():
+        if art.header.get(name) != value:
+            problems.append(f"header {name!r} differs from the engine")
+    if problems:
+        return problems
+
+    entries = np.frombuffer(art.entries, dtype=np.uint64)
+    index = np.frombuffer(art.index, dtype=np.uint16 if art.index.itemsize == 2 else np.uint32)
+    chunk = 1 << 18
+    for start in range(0, TABLE_SIZE, chunk):
+        keys = np.arange(start, min(start + chunk, TABLE_SIZE), dtype=np.int64)
+        bad = np.flatnonzero(entries[index[keys]] != pack_results(score_batch(key_columns(keys))))
+        problems += [f"key {k}: result code differs from score_batch" for k in (keys[bad][:10]).tolist()]
+
+    _, first = np.unique(index, return_index=True)
+    for k in first.tolist():
+        x = key_inputs(k)
+        if art.score(vars(x)) != scalar_result(x):
+            problems.append(f"key {k}: expanded result differs from the scalar scorers")
+
+    people = records(population(sample, seed))
+    for x in people:
+        if art.key(vars(x)) != key_of(x):
+            problems.append(f"{x}: key differs from score_table.key_of")
+            break
+
+    if scalar:
+        for k in range(TABLE_SIZE):
+            x = key_inputs(k)
+            if art.score(vars(x)) != scalar_result(x):
+                problems.append(f"key {k}: differs from the scalar scorers")
+    return problems
+
+
+# ---- CLI ----
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Build, check or use a portable HealthSignal score artifact.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="export the engine's scoring behavior")
+    b.add_argument("path")
+    b.add_argument("--table", help="export a prebuilt score table instead of building one")
+    c = sub.add_parser("check", help="check an artifact against the engine over every key")
+    c.add_argument("path")
+    c.add_argument("--scalar", action="store_true", help="also run the scalar scorers on every key (slow)")
+    i = sub.add_parser("info", help="print the header summary and checksum")
+    i.add_argument("path")
+    s = sub.add_parser("score", help="score one record with the reference loader")
+    s.add_argument("path")
+    s.add_argument("record", nargs="?", help="JSON object of canonical intake values (default: stdin)")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        table = None
+        if args.table:
+            from score_table import ScoreTable
+            table = ScoreTable.load(args.table)
+        data = build(table)
+        with open(args.path, "wb") as f:
+            f.write(data)
+        digest = data[len(MAGIC):len(MAGIC) + _DIGEST_BYTES].hex()
+        print(f"wrote {args.path} ({len(data):,} bytes, sha256 {digest})", file=sys.stderr)
+        return 0
+
+    try:
+        art = Artifact.load(args.path)
+        if args.cmd == "check":
+            problems = check(art, scalar=args.scalar)
+            for p in problems:
+                print(p, file=sys.stderr)
+            print("ok" if not problems else f"{len(problems)} problems", file=sys.stderr)
+            return 1 if problems else 0
+        if args.cmd == "info":
+            p = art.header["payload"]
+            print(f"rules {art.rules_version}, format {art.header['format_version']}, "
+                  f"{p['keys']:,} keys, {p['entries']:,} distinct results, sha256 {art.checksum}")
+            return 0
+        record = json.loads(args.record if args.record is not None else sys.stdin.read())
+        cardio, sleep, msk, actions = art.score(record)
+        row: Dict[str, Any] = {"rules_version": art.rules_version}
+        for d, (level, points, reasons) in zip(("cardio", "sleep", "msk"), (cardio, sleep, msk)):
+            row[f"{d}_level"], row[f"{d}_points"], row[f"{d}_reasons"] = level, points, reasons
+        row["actions"] = [a["title"] for a in actions]
+        print(json.dumps(row, ensure_ascii=False))
+        return 0
+    except (ArtifactError, KeyError, ValueError) as e:
+        print(f"artifact.py: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+# bench.py
+#
+# Benchmark suite for the scoring paths over a seeded synthetic population
+# (see synthetic.py):
+#
+#   python bench.py [-n 20000] [--batch-n 500000] [--table score_table.hst]
+#                   [-o results.json] [--compare baseline.json]
+#
+# Per path: per-record latency p50/p99 (single-record paths time every call;
+# batch paths time each chunk and divide by its size), records/s from untimed
+# best-of-N passes, and peak traced memory of one pass. -o writes the results
+# as JSON; --compare reports paths whose throughput, p50, p99 or peak memory
+# regressed beyond --tolerance against an earlier file and exits 1 if any
+# did. Each scoring entry point also runs with output projections (see
+# PROJECTIONS), and the time each projection saves against the full path is
+# reported, as is how many times faster score_all runs than the separate
+# per-domain calls it replaces (see SPEEDUPS).
+#
+# The report paths run over simulated app traffic (see app_traffic) rather
+# than the population, because the report cache only helps when intakes
+# repeat; the cache is cleared before every pass and its hit rate reported.
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from dataclasses import replace
+from functools import partial
+from time import perf_counter, perf_counter_ns
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from risk_engine import (
+    RULES_VERSION,
+    pick_actions,
+    score_all,
+    score_batch,
+    score_cardiometabolic,
+    score_msk_energy,
+    score_sleep_stress,
+)
+from synthetic import population, records
+from test_cases import persona_a, persona_b, persona_c
+
+PERSONAS = [persona_a, persona_b, persona_c]
+
+# Output projections benchmarked next to the full path; a projected path is
+# named "<path>[<output>+...]" and reported against <path>.
+PROJECTIONS: Tuple[Tuple[str, ...], ...] = (
+    ("levels",),
+    ("levels", "points"),
+    ("levels", "points", "reasons"),
+)
+
+# (path, baseline path): reported as the path's records/s over the baseline's
+SPEEDUPS: Tuple[Tuple[str, str], ...] = (
+    ("scalar_score_all", "scalar_separate"),
+)
+
+# (name, kind, fn): "record" paths take one Inputs, "visit" paths one Inputs
+# from app_traffic, "batch" paths take columns
+Path = Tuple[str, str, Callable[[Any], Any]]
+
+# App traffic shape: concurrent sessions, script reruns per session (Streamlit
+# reruns on every widget change), chance a rerun follows an edit to one
+# field, chance a session starts from a preset.
+SESSIONS = 50
+RERUNS = 8.0
+EDIT_P = 0.15
+PRESET_P = 0.2
+
+
+def separate_calls(x):
+    cardio = score_cardiometabolic(x)
+    sleep = score_sleep_stress(x)
+    msk = score_msk_energy(x)
+    return cardio, sleep, msk, pick_actions(cardio[0], sleep[0], msk[0], x)
+
+
+def _slices(cols: Mapping[str, np.ndarray], n: int, size: int) -> List[Dict[str, np.ndarray]]:
+    return [{f: c[s:s + size] for f, c in cols.items()} for s in range(0, n, size)]
+
+
+def app_traffic(people: List[Any], n: int, seed: int = 0) -> List[Any]:
+    """n report requests from interleaved app sessions over `people`."""
+    rng = np.random.default_rng(seed)
+    fields = [f for f in vars(people[0]) if f not in ("age", "sex")]
+
+    def start() -> Any:
+        if rng.random() < PRESET_P:
+            return PERSONAS[rng.integers(len(PERSONAS))]
+        return people[rng.integers(len(people))]
+
+    active = [start() for _ in range(SESSIONS)]
+    out = []
+    for _ in range(n):
+        i = rng.integers(SESSIONS)
+        if rng.random() < EDIT_P:
+            f = fields[rng.integers(len(fields))]
+            active[i] = replace(active[i], **{f: getattr(people[rng.integers(len(people))], f)})
+        out.append(active[i])
+        if rng.random() < 1 / RERUNS:
+            active[i] = start()
+    return out
+
+
+def report_cache_hits(work: List[Any]) -> Dict[str, float]:
+    """Hit rate of the shared report cache over one cold pass of `work`."""
+    import report
+
+    report.build_report.cache_clear()
+    for x in work:
+        report.get_report(x)
+    stats = report.cache_stats()
+    report.build_report.cache_clear()
+    return {
+        "requests": len(work),
+        "distinct": len({report.report_key(x) for x in work}),
+        "hit_rate": round(stats["hits"] / len(work), 4),
+    }
+
+
+def _one_pass(fn: Callable[[Any], Any], work: List[Any]) -> None:
+    for item in work:
+        fn(item)
+
+
+def _latencies_us(kind: str, fn: Callable[[Any], Any], work: List[Any]) -> np.ndarray:
+    out = np.empty(len(work))
+    for i, item in enumerate(work):
+        t0 = perf_counter_ns()
+        fn(item)
+        out[i] = perf_counter_ns() - t0
+    if kind == "batch":
+        out /= np.array([len(next(iter(c.values()))) for c in work])
+    return out / 1000.0
+
+
+def run_path(kind: str, fn: Callable[[Any], Any], work: List[Any], n: int, rounds: int,
+             setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    # setup runs before every pass, e.g. to start each one with a cold cache
+    setup = setup or (lambda: None)
+    _one_pass(fn, work[:3])  # warm caches and lazy imports
+    best = float("inf")
+    for _ in range(rounds):
+        setup()
+        t0 = perf_counter()
+        _one_pass(fn, work)
+        best = min(best, perf_counter() - t0)
+    setup()
+    lat = _latencies_us(kind, fn, work)
+
+    setup()
+    tracemalloc.start()
+    _one_pass(fn, work)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "records": n,
+        "p50_us": round(float(np.percentile(lat, 50)), 3),
+        "p99_us": round(float(np.percentile(lat, 99)), 3),
+        "records_per_s": round(n / best, 1),
+        "peak_mem_kib": round(peak / 1024, 1),
+    }
+
+
+def build_paths(table_path: Optional[str]) -> List[Path]:
+    import report
+
+    paths: List[Path] = [
+        ("scalar_separate", "record", separate_calls),
+        ("scalar_score_all", "record", score_all),
+        # the app's report path over app traffic: the shared LRU, and a bare build
+        ("report_lru", "visit", report.get_report),
+        ("report_build", "visit", lambda x: report.build_report.__wrapped__(report.report_key(x))),
+        ("batch_score", "batch", score_batch),
+    ]
+    if table_path:
+        from score_table import ScoreTable
+        table = ScoreTable.load(table_path)
+        paths[2:2] = [("table_lookup", "record", table.lookup)]
+        paths.append(("table_batch", "batch", table.score_batch))
+    for base, fn in (("scalar_score_all", score_all), ("batch_score", score_batch),
+                     ("table_batch", table.score_batch if table_path else None)):
+        if fn is not None:
+            kind = "record" if base.startswith("scalar") else "batch"
+            paths += [(f"{base}[{'+'.join(p)}]", kind, partial(fn, outputs=p)) for p in PROJECTIONS]
+    return paths
+
+
+def projection_savings(results: Mapping[str, Mapping[str, float]]) -> Dict[str, float]:
+    """Per projected path, the fraction of its full path's time per record saved."""
+    out = {}
+    for name, r in results.items():
+        base = results.get(name.split("[")[0])
+        if "[" in name and base is not None:
+            out[name] = 1 - base["records_per_s"] / r["records_per_s"]
+    return out
+
+
+def speedups(results: Mapping[str, Mapping[str, float]]) -> Dict[str, float]:
+    """records/s of each SPEEDUPS path over its baseline's, for pairs that both ran."""
+    return {
+        f"{name} vs {base}": results[name]["records_per_s"] / results[base]["records_per_s"]
+        for name, base in SPEEDUPS if name in results and base in results
+    }
+
+
+# (result key, label, unit, higher is better) checked by compare()
+COMPARED: Tuple[Tuple[str, str, str, bool], ...] = (
+    ("records_per_s", "records/s", "", True),
+    ("p50_us", "p50", "us", False),
+    ("p99_us", "p99", "us", False),
+    ("peak_mem_kib", "peak memory", "KiB", False),
+)
+
+
+def compare(results: Mapping[str, Mapping[str, float]], baseline: Mapping[str, Mapping[str, float]],
+            tolerance: float) -> List[str]:
+    """Human-readable regressions of `results` against `baseline`."""
+    out = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            continue
+        for key, label, unit, higher in COMPARED:
+            if key not in b or key not in r:
+                continue  # baseline from before the metric was recorded
+            worse = r[key] < b[key] * (1 - tolerance) if higher else r[key] > b[key] * (1 + tolerance)
+            if worse:
+                digits = 0 if higher else 3 if unit == "us" else 1
+                out.append(f"{name}: {label} {b[key]:.{digits}f}{unit} -> {r[key]:.{digits}f}{unit}")
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the scoring paths.")
+    ap.add_argument("-n", type=int, default=20000, help="records for single-record paths")
+    ap.add_argument("--batch-n", type=int, default=500000, help="records for batch paths")
+    ap.add_argument("--batch-size", type=int, default=4096)
+    ap.add_argument("--rounds", type=int, default=3, help="throughput passes; the best one counts")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--table", help="also benchmark a prebuilt score table")
+    ap.add_argument("--paths", help="comma-separated subset of path names")
+    ap.add_argument("-o", "--output", help="write results as JSON")
+    ap.add_argument("--compare", help="earlier JSON results to check for regressions")
+    ap.add_argument("--tolerance", type=float, default=0.15)
+    args = ap.parse_args(argv)
+
+    for x in PERSONAS:
+        r = score_all(x)
+        if (r.cardio, r.sleep, r.msk, r.actions) != separate_calls(x):
+            raise RuntimeError(f"score_all disagrees with the separate scorers for {x}")
+
+    cols = population(max(args.n, args.batch_n), args.seed)
+    inputs = records({f: c[:args.n] for f, c in cols.items()})
+    chunks = _slices(cols, args.batch_n, args.batch_size)
+
+    visits = app_traffic(inputs, args.n, args.seed)
+    paths = build_paths(args.table)
+    if args.paths:
+        wanted = set(args.paths.split(","))
+        paths = [p for p in paths if p[0] in wanted]
+
+    results: Dict[str, Dict[str, float]] = {}
+    w = max([18, *(len(p[0]) for p in paths)])
+    print(f"{'path':<{w}} {'p50 us':>9} {'p99 us':>9} {'records/s':>12} {'peak KiB':>10}")
+    for name, kind, fn in paths:
+        if kind == "record":
+            r = run_path(kind, fn, inputs, args.n, args.rounds)
+        elif kind == "visit":
+            import report
+            r = run_path(kind, fn, visits, args.n, args.rounds, report.build_report.cache_clear)
+        else:
+            r = run_path(kind, fn, chunks, args.batch_n, args.rounds)
+            r["batch_size"] = args.batch_size
+        results[name] = r
+        print(f"{name:<{w}} {r['p50_us']:9.3f} {r['p99_us']:9.3f} {r['records_per_s']:12,.0f} {r['peak_mem_kib']:10,.1f}")
+    savings = projection_savings(results)
+    if savings:
+        print("\ntime saved by projection")
+        for name, saved in savings.items():
+            print(f"{name:<{w}} {saved:8.1%}")
+    faster = speedups(results)
+    if faster:
+        print("\nrecords/s speedup")
+        for name, x in faster.items():
+            print(f"{name:<{w}} {x:8.2f}x")
+    cache = report_cache_hits(visits) if any(kind == "visit" for _, kind, _ in paths) else None
+    if cache:
+        print(f"\nreport cache on app traffic: {cache['hit_rate']:.1%} hits "
+              f"({cache['distinct']:,} distinct intakes in {cache['requests']:,} requests)")
+
+    doc = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "rules_version": RULES_VERSION,
+            "seed": args.seed,
+        },
+        "results": results,
+        "projection_savings": {k: round(v, 4) for k, v in savings.items()},
+        "speedups": {k: round(v, 3) for k, v in faster.items()},
+    }
+    if cache:
+        doc["report_cache"] = cache
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+# calibration.py
+#
+# Sweep point weights, override toggles and level cutoffs over a population:
+#
+#   python calibration.py --grid grid.json [--population intake.jsonl | -n 100000] [--rules v1] [--json]
+#   python calibration.py --set cardio.mod_max=3,4 --set "cardio.w:family history of type 2 diabetes=1,2"
+#
+# The population is scored once and reduced to per-domain rule-mask counts:
+# the indicator matrix of every distinct combination of fired rules (one row
+# per mask, one column per rule) with how many people share it. A domain's
+# level is a function of its mask, weights, override and cutoffs alone, so
+# each configuration is one matrix product (points for every mask) plus
+# comparisons, and the level distribution and baseline->config transition
+# table are count-weighted sums. Domains are swept independently. Rules,
+# their overrides and the baseline weights and cutoffs come from one RuleSet
+# (--rules; default: the engine's).
+#
+# Grid file: per domain, lists of values to try; every combination is run.
+#   {"cardio": {"mod_max": [3, 4], "override": [true, false],
+#               "weights": {"family history of type 2 diabetes": [1, 2]}},
+#    "sleep": {"high_at": [4, 5]}}
+# Rules are named by reason text or index. Cutoffs follow level_from_points:
+# Low up to low_max, Moderate up to mod_max, High from high_at (or when an
+# override fires), as in the scorers.
+import argparse
+import itertools
+import json
+import sys
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, TextIO, Tuple
+
+import numpy as np
+
+from risk_engine import DOMAINS, LEVELS, RULES
+from rules import RuleError, RuleSet, load_rules
+
+CONFIG_CHUNK = 1024  # configurations evaluated per matrix product
+
+
+class CalibrationError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Config:
+    weights: Tuple[int, ...]
+    low_max: int
+    mod_max: int
+    high_at: Optional[int]
+    override: bool = True
+
+    def diff(self, base: "Config", reasons: Tuple[str, ...]) -> Dict[str, Any]:
+        """Parameters that differ from base, for labels and JSON."""
+        out: Dict[str, Any] = {
+            reasons[i]: w for i, (w, b) in enumerate(zip(self.weights, base.weights)) if w != b
+        }
+        for name in ("low_max", "mod_max", "high_at", "override"):
+            if getattr(self, name) != getattr(base, name):
+                out[name] = getattr(self, name)
+        return out
+
+
+def baseline(rules: RuleSet = RULES) -> Dict[str, Config]:
+    """Per-domain weights and cutoffs of a RuleSet."""
+    out = {}
+    for d in DOMAINS:
+        low_max, mod_max, high_at = rules.cutoffs[d]
+        out[d] = Config(weights=rules.weights[d], low_max=low_max, mod_max=mod_max, high_at=high_at)
+    return out
+
+
+@lru_cache(maxsize=None)
+def _bits(n_rules: int) -> np.ndarray:
+    # (masks, rules) indicator matrix
+    return np.arange(1 << n_rules)[:, None] >> np.arange(n_rules) & 1
+
+
+@lru_cache(maxsize=16)
+def _overrides(rules: RuleSet, domain: str) -> np.ndarray:
+    # per mask, whether one of the domain's overrides fires
+    return np.array([rules.overrides[domain](m) for m in range(1 << len(rules.reasons[domain]))])
+
+
+# ---- Population ----
+
+def mask_counts(
+    chunks: Iterable[Mapping[str, np.ndarray]], scorer=None, rules: RuleSet = RULES,
+) -> Dict[str, np.ndarray]:
+    """Score column chunks once (default scorer: rules.score_batch); returns, per domain, people per rule mask."""
+    scorer = scorer or rules.score_batch
+    counts = {d: np.zeros(1 << len(rules.reasons[d]), dtype=np.int64) for d in DOMAINS}
+    for cols in chunks:
+        res = scorer(cols)
+        for d in DOMAINS:
+            counts[d] += np.bincount(res[f"{d}_mask"], minlength=len(counts[d]))
+    return counts
+
+
+# ---- Sweep ----
+
+@dataclass
+class Sweep:
+    domain: str
+    reasons: Tuple[str, ...]   # the domain's rules, in mask bit order
+    configs: List[Config]      # configs[0] is the baseline
+    distribution: np.ndarray   # (configs, levels) people per level
+    transitions: np.ndarray    # (configs, baseline level, level) people
+
+    def moved(self) -> np.ndarray:
+        """People whose level differs from the baseline, per configuration."""
+        return self.transitions.sum(axis=(1, 2)) - np.trace(self.transitions, axis1=1, axis2=2)
+
+
+def levels_for(domain: str, configs: List[Config], rules: RuleSet = RULES) -> np.ndarray:
+    """(masks, configs) level codes into LEVELS."""
+    w = np.array([c.weights for c in configs], dtype=np.int64)
+    points = _bits(len(rules.reasons[domain])) @ w.T
+    low = np.array([c.low_max for c in configs])
+    mod = np.array([c.mod_max for c in configs])
+    high_at = np.array([np.iinfo(np.int64).max if c.high_at is None else c.high_at for c in configs])
+    override = np.array([c.override for c in configs])
+    high = (points >= high_at) | (_overrides(rules, domain)[:, None] & override)
+    return np.where(high, 2, np.where(points <= low, 0, np.where(points <= mod, 1, 2)))
+
+
+def evaluate(domain: str, counts: np.ndarray, configs: List[Config], rules: RuleSet = RULES) -> Sweep:
+    """Level distribution and transitions from configs[0] for every configuration."""
+    base = levels_for(domain, configs[:1], rules)[:, 0]
+    by_base = np.stack([counts * (base == b) for b in range(len(LEVELS))])  # (levels, masks)
+    trans = np.empty((len(configs), len(LEVELS), len(LEVELS)), dtype=np.int64)
+    for start in range(0, len(configs), CONFIG_CHUNK):
+        lv = levels_for(domain, configs[start:start + CONFIG_CHUNK], rules)
+        for level in range(len(LEVELS)):
+            trans[start:start + lv.shape[1], :, level] = (by_base @ (lv == level)).T
+    return Sweep(domain, rules.reasons[domain], configs, trans.sum(axis=1), trans)
+
+
+def _rule_index(domain: str, rule: Any, reasons: Tuple[str, ...]) -> int:
+    if isinstance(rule, int) or (isinstance(rule, str) and rule.isdigit()):
+        i = int(rule)
+        if 0 <= i < len(reasons):
+            return i
+    elif rule in reasons:
+        return reasons.index(rule)
+    raise CalibrationError(f"{domain}: unknown rule {rule!r}")
+
+
+def expand_grid(domain: str, spec: Mapping[str, Any], base: Config, rules: RuleSet = RULES) -> List[Config]:
+    """Every combination of the listed values; the baseline comes first."""
+    axes: List[Tuple[Tuple[str, Any], List[Any]]] = []
+    for name, values in spec.items():
+        if name == "weights":
+            for rule, ws in values.items():
+                axes.append((("weight", _rule_index(domain, rule, rules.reasons[domain])), [int(w) for w in ws]))
+        elif name in ("low_max", "mod_max", "high_at"):
+            axes.append(((name, None), [None if v is None else int(v) for v in values]))
+        elif name == "override":
+            axes.append(((name, None), [bool(v) for v in values]))
+        else:
+            raise CalibrationError(f"{domain}: unknown parameter {name!r}")
+    configs = [base]
+    for combo in itertools.product(*(vals for _, vals in axes)):
+        weights = list(base.weights)
+        fields: Dict[str, Any] = {}
+        for ((name, i), _), v in zip(axes, combo):
+            if name == "weight":
+                weights[i] = v
+            else:
+                fields[name] = v
+        c = replace(base, weights=tuple(weights), **fields)
+        if c != base:
+            configs.append(c)
+    return configs
+
+
+def sweep(counts: Mapping[str, np.ndarray], grid: Mapping[str, Mapping[str, Any]],
+          base: Optional[Mapping[str, Config]] = None, rules: RuleSet = RULES) -> Dict[str, Sweep]:
+    """Evaluate every grid configuration on mask counts from mask_counts(..., rules)."""
+    base = base or baseline(rules)
+    unknown = set(grid) - set(DOMAINS)
+    if unknown:
+        raise CalibrationError(f"unknown domains: {', '.join(sorted(unknown))}")
+    return {d: evaluate(d, counts[d], expand_grid(d, grid[d], base[d], rules), rules) for d in grid}
+
+
+# ---- Output ----
+
+def to_dict(result: Mapping[str, Sweep]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for d, s in result.items():
+        base = s.configs[0]
+        out[d] = {
+            "baseline": {"weights": dict(zip(s.reasons, base.weights)), "low_max": base.low_max,
+                         "mod_max": base.mod_max, "high_at": base.high_at, "override": base.override},
+            "configs": [
+                {
+                    "changes": c.diff(base, s.reasons),
+                    "levels": dict(zip(LEVELS, s.distribution[i].tolist())),
+                    "transitions": {
+                        LEVELS[b]: dict(zip(LEVELS, s.transitions[i, b].tolist())) for b in range(len(LEVELS))
+                    },
+                    "moved": int(s.moved()[i]),
+                }
+                for i, c in enumerate(s.configs)
+            ],
+        }
+    return out
+
+
+def format_sweep(result: Mapping[str, Sweep]) -> str:
+    lines = []
+    for d, s in result.items():
+        total = max(int(s.distribution[0].sum()), 1)
+        lines.append(f"{d}: {len(s.configs)} configurations, {total} people")
+        lines.append(f"  {'Low':>7} {'Mod':>7} {'High':>7} {'moved':>7}  changes")
+        moved = s.moved()
+        for i, c in enumerate(s.configs):
+            shares = " ".join(f"{v / total:>7.1%}" for v in s.distribution[i])
+            label = ", ".join(f"{k}={v}" for k, v in c.diff(s.configs[0], s.reasons).items()) or "(baseline)"
+            lines.append(f"  {shares} {moved[i] / total:>7.1%}  {label}")
+    return "\n".join(lines)
+
+
+def _parse_set(items: List[str]) -> Dict[str, Dict[str, Any]]:
+    # "cardio.mod_max=3,4", "cardio.w:<reason or index>=1,2", "sleep.override=true,false"
+    grid: Dict[str, Dict[str, Any]] = {}
+    for item in items:
+        try:
+            target, values = item.split("=", 1)
+            d, name = target.split(".", 1)
+        except ValueError:
+            raise CalibrationError(f"expected DOMAIN.PARAM=V1,V2, got {item!r}") from None
+        vals = [v.strip() for v in values.split(",")]
+        spec = grid.setdefault(d, {})
+        if name.startswith("w:"):
+            spec.setdefault("weights", {})[name[2:]] = [int(v) for v in vals]
+        elif name == "override":
+            spec[name] = [v.lower() in ("1", "true", "yes", "on") for v in vals]
+        else:
+            spec[name] = [None if v.lower() == "none" else int(v) for v in vals]
+    return grid
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import healthsignal as hs
+
+    def columns(inp: TextIO, fmt: str) -> Iterator[Dict[str, np.ndarray]]:
+        # as `healthsignal.py score`: rejects go to stderr and are counted
+        nonlocal rejected
+        for chunk in hs.chunked(hs.read_records(inp, fmt), hs.DEFAULT_CHUNK):
+            ids, cols, rejects = hs.parse_chunk(chunk)
+            for r in rejects:
+                sys.stderr.write(hs.format_reject(r, "text"))
+            rejected += len(rejects)
+            if ids:
+                yield cols
+
+    ap = argparse.ArgumentParser(description="Sweep rule weights, overrides and cutoffs over a population.")
+    ap.add_argument("--grid", help="JSON grid file (see the module header)")
+    ap.add_argument("--set", action="append", default=[], metavar="DOMAIN.PARAM=V1,V2",
+                    help="add a grid axis; PARAM is low_max, mod_max, high_at, override or w:<rule>")
+    ap.add_argument("--population", help="intake CSV/JSONL to sweep over (default: synthetic)")
+    ap.add_argument("-n", type=int, default=100_000, help="synthetic population size")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--rules", metavar="VERSION",
+                    help="rule version under rules/, or a rule file, to sweep around (default: the engine's)")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    rejected = 0
+    try:
+        grid: Dict[str, Dict[str, Any]] = {}
+        if args.grid:
+            with open(args.grid, encoding="utf-8") as f:
+                grid = json.load(f)
+        for d, spec in _parse_set(args.set).items():
+            merged = grid.setdefault(d, {})
+            merged.setdefault("weights", {}).update(spec.pop("weights", {}))
+            merged.update(spec)
+        if not grid:
+            grid = {d: {} for d in DOMAINS}
+        rules = load_rules(args.rules) if args.rules else RULES
+
+        if args.population:
+            fmt = "csv" if args.population.lower().endswith(".csv") else "jsonl"
+            inp = hs.open_input(args.population)
+            try:
+                counts = mask_counts(columns(inp, fmt), rules=rules)
+            finally:
+                inp.close()
+        else:
+            from synthetic import population
+            counts = mask_counts([population(args.n, args.seed)], rules=rules)
+        result = sweep(counts, grid, rules=rules)
+    except (CalibrationError, RuleError) as e:
+        print(f"calibration.py: {e}", file=sys.stderr)
+        return 2
+    if args.json:
+        print(json.dumps(to_dict(result), indent=2, ensure_ascii=False))
+    else:
+        print(format_sweep(result))
+    if args.population:
+        print(f"swept {int(next(iter(counts.values())).sum())}, rejected {rejected}", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
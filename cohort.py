@@ -0,0 +1,162 @@
+# cohort.py
+#
+# Streaming cohort aggregation over batch-scored results:
+#
+#   python healthsignal.py cohort intake.jsonl [--json]
+#
+# CohortStats.add() takes one score_batch result plus the age and sex columns
+# and folds it into fixed-size count arrays with bincount over integer-coded
+# groups, so chunks of any cohort aggregate in one pass and bounded memory.
+# Stats from separate chunks or processes combine with merge(). Reason and
+# action names come from the RuleSet the results were scored with.
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from risk_engine import CATEGORIES, LEVELS, RULES
+from rules import RuleSet
+
+DOMAINS: Tuple[Tuple[str, Tuple[str, ...]], ...] = tuple(RULES.reasons.items())
+AGE_EDGES: Tuple[int, ...] = (30, 35, 40, 45)  # bands: <30, 30-34, 35-39, 40-44, 45+
+SEXES = CATEGORIES["sex"]
+
+
+def age_band_labels(edges: Sequence[int]) -> List[str]:
+    labels = [f"<{edges[0]}"]
+    labels += [f"{lo}-{hi - 1}" for lo, hi in zip(edges, edges[1:])]
+    return labels + [f"{edges[-1]}+"]
+
+
+class CohortStats:
+    """Level counts by age band x sex, rule-mask (driver set) counts and action counts."""
+
+    def __init__(self, age_edges: Sequence[int] = AGE_EDGES, rules: RuleSet = RULES):
+        self.rules = rules
+        self.domains: Tuple[Tuple[str, Tuple[str, ...]], ...] = tuple(rules.reasons.items())
+        self.age_edges = np.asarray(age_edges)
+        self.age_bands = age_band_labels(age_edges)
+        self.n = 0
+        shape = (len(self.age_bands), len(SEXES), len(LEVELS))
+        self.levels: Dict[str, np.ndarray] = {d: np.zeros(shape, dtype=np.int64) for d, _ in self.domains}
+        self.masks: Dict[str, np.ndarray] = {d: np.zeros(1 << len(r), dtype=np.int64) for d, r in self.domains}
+        n_actions = len(rules.actions)
+        self.action_totals = np.zeros(n_actions, dtype=np.int64)
+        # first and second action; the extra slot counts "none" (-1)
+        self.action_pairs = np.zeros((n_actions + 1, n_actions + 1), dtype=np.int64)
+
+    def add(self, result: Mapping[str, np.ndarray], age: np.ndarray, sex: np.ndarray) -> None:
+        sex = np.asarray(sex)
+        if sex.dtype.kind not in "iu":
+            sex = (sex == SEXES[1]).astype(np.int64)
+        group = np.searchsorted(self.age_edges, np.asarray(age), side="right") * len(SEXES) + sex
+        n_groups = len(self.age_bands) * len(SEXES)
+        for d, _ in self.domains:
+            idx = group * len(LEVELS) + result[f"{d}_level"]
+            self.levels[d] += np.bincount(idx, minlength=n_groups * len(LEVELS)).reshape(self.levels[d].shape)
+            self.masks[d] += np.bincount(result[f"{d}_mask"], minlength=len(self.masks[d]))
+        a = result["actions"].astype(np.int64)
+        n_actions = len(self.action_totals)
+        self.action_totals += np.bincount(a[a >= 0], minlength=n_actions)
+        first, second = (np.where(a[:, j] >= 0, a[:, j], n_actions) if j < a.shape[1] else n_actions for j in (0, 1))
+        self.action_pairs += np.bincount(
+            first * (n_actions + 1) + second, minlength=(n_actions + 1) ** 2,
+        ).reshape(self.action_pairs.shape)
+        self.n += len(a)
+
+    def merge(self, other: "CohortStats") -> None:
+        if not np.array_equal(self.age_edges, other.age_edges):
+            raise ValueError("cannot merge stats with different age bands")
+        if self.rules.version != other.rules.version:
+            raise ValueError(f"cannot merge stats of rules {self.rules.version} and {other.rules.version}")
+        for d, _ in self.domains:
+            self.levels[d] += other.levels[d]
+            self.masks[d] += other.masks[d]
+        self.action_totals += other.action_totals
+        self.action_pairs += other.action_pairs
+        self.n += other.n
+
+    # ---- Views ----
+
+    def level_share(self, domain: str, level: str = "High") -> Dict[str, Dict[str, float]]:
+        """Share of `level` in `domain` per age band and sex."""
+        counts = self.levels[domain]
+        totals = counts.sum(axis=2)
+        hit = counts[:, :, LEVELS.index(level)]
+        share = np.divide(hit, totals, out=np.zeros(hit.shape), where=totals > 0)
+        return {
+            band: {s: round(float(share[i, j]), 4) for j, s in enumerate(SEXES)}
+            for i, band in enumerate(self.age_bands)
+        }
+
+    def level_counts(self, domain: str) -> Dict[str, int]:
+        return dict(zip(LEVELS, self.levels[domain].sum(axis=(0, 1)).tolist()))
+
+    def top_driver_sets(self, domain: str, k: int = 10) -> List[Tuple[Tuple[str, ...], int]]:
+        """Most common combinations of rules that fired together (all drivers, not just the top 3)."""
+        reasons = dict(self.domains)[domain]
+        counts = self.masks[domain]
+        order = np.argsort(-counts, kind="stable")[:k]
+        return [
+            (tuple(r for i, r in enumerate(reasons) if m >> i & 1), int(counts[m]))
+            for m in order.tolist() if counts[m]
+        ]
+
+    def action_counts(self) -> Dict[str, int]:
+        return {a["title"]: int(c) for a, c in zip(self.rules.actions, self.action_totals)}
+
+    def action_pair_counts(self) -> List[Tuple[Tuple[str, str], int]]:
+        actions = self.rules.actions
+        n = len(actions)
+        pairs = [
+            ((actions[i]["title"], actions[j]["title"]), int(self.action_pairs[i, j]))
+            for i, j in zip(*np.nonzero(self.action_pairs[:n, :n]))
+        ]
+        return sorted(pairs, key=lambda p: -p[1])
+
+    def to_dict(self, top: int = 10) -> Dict[str, Any]:
+        return {
+            "records": self.n,
+            "domains": {
+                d: {
+                    "levels": self.level_counts(d),
+                    "high_share_by_age_sex": self.level_share(d, "High"),
+                    "top_driver_sets": [{"drivers": list(r), "count": c} for r, c in self.top_driver_sets(d, top)],
+                }
+                for d, _ in self.domains
+            },
+            "actions": self.action_counts(),
+            "action_pairs": [{"actions": list(p), "count": c} for p, c in self.action_pair_counts()],
+        }
+
+
+def aggregate(
+    chunks: Iterable[Mapping[str, np.ndarray]],
+    scorer=None,
+    age_edges: Sequence[int] = AGE_EDGES,
+    stats: Optional[CohortStats] = None,
+    rules: RuleSet = RULES,
+) -> CohortStats:
+    """Score and aggregate column chunks (one call per chunk of `scorer`, default rules.score_batch)."""
+    stats = stats or CohortStats(age_edges, rules)
+    scorer = scorer or rules.score_batch
+    for cols in chunks:
+        stats.add(scorer(cols), cols["age"], cols["sex"])
+    return stats
+
+
+def format_summary(stats: CohortStats, top: int = 5) -> str:
+    lines = [f"records: {stats.n}"]
+    for d, _ in stats.domains:
+        counts = stats.level_counts(d)
+        total = max(stats.n, 1)
+        lines.append(f"\n{d}: " + ", ".join(f"{lvl} {c} ({c / total:.1%})" for lvl, c in counts.items()))
+        lines.append("  High by age band: " + "  ".join(
+            f"{band} " + "/".join(f"{v:.0%}" for v in by_sex.values())
+            for band, by_sex in stats.level_share(d, "High").items()
+        ) + f"  ({'/'.join(SEXES)})")
+        for reasons, c in stats.top_driver_sets(d, top):
+            lines.append(f"  {c:>9}  {', '.join(reasons) or '(none)'}")
+    lines.append("\nactions:")
+    for title, c in stats.action_counts().items():
+        lines.append(f"  {c:>9}  {title}")
+    return "\n".join(lines)
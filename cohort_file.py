@@ -0,0 +1,438 @@
+# cohort_file.py
+#
+# Append-only longitudinal cohort file: fixed-width assessment records viewed
+# in place as a NumPy structured array over mmap.
+#
+#   python cohort_file.py append cohort.hsc intake.jsonl [--at 2026-01-31T09:00] [--table score_table.hst]
+#   python cohort_file.py synth cohort.hsc -n 10000000 [--visits 4]
+#   python cohort_file.py index cohort.hsc
+#   python cohort_file.py history cohort.hsc SUBJECT [--json]
+#   python cohort_file.py summary cohort.hsc [--json]
+#
+# Layout: a 64-byte header (magic, format version, record size, rules
+# version), then RECORD_DTYPE records. The record count is the file size, so
+# appending is a plain write; a torn trailing record is dropped on the next
+# append. Record fields carry score_batch's result names, so a slice is a
+# result mapping as it is: pack_results(), cohort.CohortStats.add() and
+# compact.columns() (which feeds score_batch) take it without copying.
+#
+# Subjects are unsigned integer ids; append takes them from the records' "id"
+# and stops at a record without one. The subject index is a sidecar
+# (<file>.idx.npy): row 0 subject ids sorted, row 1 record numbers, ordered by
+# (subject, record). Records appended after the index was built are scanned
+# on lookup until update_index() merges them in.
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from compact import (
+    decode,
+    decode_assessment,
+    encode_columns,
+    pack_results,
+    result_fields,
+    unpack_results,
+)
+from risk_engine import RULES_VERSION, Assessment, Inputs
+
+MAGIC = b"HSCOHORT"
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<8sII16s")  # magic, format version, record size, rules version
+INDEX_SUFFIX = ".idx.npy"
+DEFAULT_CHUNK = 1 << 20
+
+RECORD_DTYPE = np.dtype([
+    ("subject", "<u8"),
+    ("assessed_at", "<i8"),      # Unix time, seconds UTC
+    ("code", "<u4"),             # compact.encode(): every input except height and weight
+    ("height_cm", "<f8"),
+    ("weight_kg", "<f8"),
+    ("cardio_level", "u1"),
+    ("cardio_points", "u1"),
+    ("cardio_mask", "<u2"),
+    ("sleep_level", "u1"),
+    ("sleep_points", "u1"),
+    ("sleep_mask", "u1"),
+    ("msk_level", "u1"),
+    ("msk_points", "u1"),
+    ("msk_mask", "u1"),
+    ("actions", "u1", (2,)),     # codes into ACTIONS
+])
+_RESULT_FIELDS = [f for f in RECORD_DTYPE.names if f.startswith(("cardio_", "sleep_", "msk_"))]
+
+
+class CohortFileError(ValueError):
+    pass
+
+
+def _header(rules_version: str) -> bytes:
+    packed = _HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_DTYPE.itemsize, rules_version.encode("ascii"))
+    return packed.ljust(HEADER_SIZE, b"\0")
+
+
+def _read_header(path: str, f) -> str:
+    raw = f.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE or raw[:len(MAGIC)] != MAGIC:
+        raise CohortFileError(f"{path}: not a cohort file")
+    _, version, size, rules = _HEADER.unpack_from(raw)
+    if version != FORMAT_VERSION or size != RECORD_DTYPE.itemsize:
+        raise CohortFileError(f"{path}: format {version} with {size}-byte records, "
+                              f"expected {FORMAT_VERSION} with {RECORD_DTYPE.itemsize}")
+    return rules.rstrip(b"\0").decode("ascii")
+
+
+def timestamp(value: Any) -> int:
+    """Unix seconds for an int or an ISO date/datetime (naive means UTC)."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    try:
+        dt = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise CohortFileError(f"not an ISO date or time: {value!r}") from None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def to_records(
+    subjects: Sequence[int], assessed_at: Any, cols: Mapping[str, np.ndarray], result: Mapping[str, np.ndarray],
+) -> np.ndarray:
+    """RECORD_DTYPE rows for integer-coded input columns and their score_batch result.
+
+    assessed_at is one timestamp for every row or an array of Unix seconds.
+    """
+    n = len(subjects)
+    rec = np.empty(n, dtype=RECORD_DTYPE)
+    rec["subject"] = np.asarray(subjects, dtype=np.uint64)
+    rec["assessed_at"] = timestamp(assessed_at) if np.ndim(assessed_at) == 0 else assessed_at
+    rec["code"] = encode_columns(cols)
+    rec["height_cm"] = cols["height_cm"]
+    rec["weight_kg"] = cols["weight_kg"]
+    codes = pack_results(result)
+    for f in _RESULT_FIELDS:
+        rec[f] = result_fields(codes, f)
+    rec["actions"][:, 0] = result_fields(codes, "action1")
+    rec["actions"][:, 1] = result_fields(codes, "action2")
+    return rec
+
+
+def results(view: np.ndarray, outputs: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """The score_batch result for a slice of records, reasons included."""
+    return unpack_results(pack_results(view), outputs)
+
+
+# ---- Writer ----
+
+class CohortWriter:
+    def __init__(self, path: str, rules_version: str = RULES_VERSION):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as f:
+                f.write(_header(rules_version))
+        self.f = open(path, "r+b")
+        stored = _read_header(path, self.f)
+        if stored != rules_version:
+            self.f.close()
+            raise CohortFileError(f"{path}: holds rules {stored} results, not {rules_version}")
+        size = os.fstat(self.f.fileno()).st_size
+        self.count = (size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        self.f.truncate(HEADER_SIZE + self.count * RECORD_DTYPE.itemsize)
+        self.f.seek(0, os.SEEK_END)
+
+    def append(self, records: np.ndarray) -> int:
+        """Append RECORD_DTYPE rows; returns the record number of the first."""
+        if records.dtype != RECORD_DTYPE:
+            raise CohortFileError(f"expected RECORD_DTYPE records, got {records.dtype}")
+        first = self.count
+        self.f.write(np.ascontiguousarray(records).data)
+        self.count += len(records)
+        return first
+
+    def append_scored(
+        self, subjects: Sequence[int], assessed_at: Any, cols: Mapping[str, np.ndarray],
+        result: Mapping[str, np.ndarray],
+    ) -> int:
+        return self.append(to_records(subjects, assessed_at, cols, result))
+
+    def close(self) -> None:
+        self.f.close()
+
+    def __enter__(self) -> "CohortWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ---- Reader ----
+
+class CohortFile:
+    """Read-only mmap view of a cohort file; cf.records is the structured array."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mm: Optional[mmap.mmap] = None
+        self._index: Optional[np.ndarray] = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Remap to include records appended since opening."""
+        self.close()
+        with open(self.path, "rb") as f:
+            self.rules_version = _read_header(self.path, f)
+            size = os.fstat(f.fileno()).st_size
+            n = (size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+            if n:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.records = np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=n, offset=HEADER_SIZE)
+            else:
+                self.records = np.empty(0, dtype=RECORD_DTYPE)
+
+    def close(self) -> None:
+        self.records = np.empty(0, dtype=RECORD_DTYPE)
+        self._index = None
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                # views handed out still point into the map; it closes when they go
+                pass
+            self._mm = None
+
+    def __enter__(self) -> "CohortFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, i):
+        # ints give one record, slices a zero-copy view
+        return self.records[i]
+
+    def inputs(self, i: int) -> Inputs:
+        r = self.records[i]
+        return decode(int(r["code"]), float(r["height_cm"]), float(r["weight_kg"]))
+
+    def assessment(self, i: int) -> Assessment:
+        return decode_assessment(int(pack_results(self.records[i:i + 1])[0]))
+
+    def slices(self, size: int = DEFAULT_CHUNK, start: int = 0, stop: Optional[int] = None) -> Iterator[np.ndarray]:
+        """Zero-copy chunks of records."""
+        stop = len(self.records) if stop is None else stop
+        for lo in range(start, stop, size):
+            yield self.records[lo:min(lo + size, stop)]
+
+    # ---- Subject index ----
+
+    def index(self) -> np.ndarray:
+        """The (2, m) subject index as saved; m may trail len(self)."""
+        if self._index is None:
+            path = self.path + INDEX_SUFFIX
+            idx = np.load(path, mmap_mode="r") if os.path.exists(path) else np.empty((2, 0), dtype=np.uint64)
+            self._index = idx if idx.shape[1] <= len(self.records) else np.empty((2, 0), dtype=np.uint64)
+        return self._index
+
+    def update_index(self) -> int:
+        """Merge records appended since the index was saved; returns records added."""
+        idx = self.index()
+        m = idx.shape[1]
+        tail = self.records["subject"][m:]
+        order = np.argsort(tail, kind="stable")
+        subjects = tail[order]
+        rows = (order + m).astype(np.uint64)
+        if m:
+            # new rows come after every indexed row, so they go last among equal subjects
+            at = np.searchsorted(idx[0], subjects, side="right")
+            subjects = np.insert(idx[0], at, subjects)
+            rows = np.insert(idx[1], at, rows)
+        tmp = self.path + ".idx.tmp.npy"
+        np.save(tmp, np.stack([subjects, rows]))
+        os.replace(tmp, self.path + INDEX_SUFFIX)
+        self._index = None
+        return len(tail)
+
+    def history(self, subject: int) -> np.ndarray:
+        """A subject's records, oldest first."""
+        idx = self.index()
+        m = idx.shape[1]
+        lo = np.searchsorted(idx[0], subject, side="left")
+        hi = np.searchsorted(idx[0], subject, side="right")
+        rows = np.asarray(idx[1, lo:hi], dtype=np.int64)
+        if m < len(self.records):
+            rows = np.concatenate([rows, m + np.flatnonzero(self.records["subject"][m:] == subject)])
+        found = self.records[rows]
+        return found[np.argsort(found["assessed_at"], kind="stable")]
+
+
+def aggregate(cf: CohortFile, chunk: int = DEFAULT_CHUNK, stats=None):
+    """cohort.CohortStats over the stored results, chunk by chunk without copies or rescoring."""
+    import cohort
+    from compact import SHIFTS
+
+    stats = stats or cohort.CohortStats()
+    (age_shift, age_mask), (sex_shift, sex_mask) = SHIFTS["age"], SHIFTS["sex"]
+    for view in cf.slices(chunk):
+        code = view["code"]
+        stats.add(view, code >> age_shift & age_mask, code >> sex_shift & sex_mask)
+    return stats
+
+
+# ---- CLI ----
+
+def _record_dict(rows: np.ndarray, i: int) -> Dict[str, Any]:
+    r = rows[i]
+    x = decode(int(r["code"]), float(r["height_cm"]), float(r["weight_kg"]))
+    a = decode_assessment(int(pack_results(rows[i:i + 1])[0]))
+    return {
+        "assessed_at": datetime.fromtimestamp(int(r["assessed_at"]), timezone.utc).isoformat(),
+        "inputs": vars(x),
+        "levels": {"cardio": a.cardio[0], "sleep": a.sleep[0], "msk": a.msk[0]},
+        "actions": [act["title"] for act in a.actions],
+    }
+
+
+def _subject_id(rid: Any) -> int:
+    if isinstance(rid, str) and rid.strip().isascii() and rid.strip().isdigit():
+        rid = int(rid)
+    if isinstance(rid, int) and not isinstance(rid, bool) and 0 <= rid < 1 << 64:
+        return rid
+    raise CohortFileError(f"subject id {rid!r} is not an unsigned 64-bit integer")
+
+
+def cmd_append(args: argparse.Namespace) -> int:
+    import healthsignal as hs
+
+    at = timestamp(args.at) if args.at else int(datetime.now(timezone.utc).timestamp())
+    scorer = hs.load_scorer(args.table)
+    written = rejected = 0
+    inp = hs.open_input(args.input)
+    try:
+        with CohortWriter(args.file) as w:
+            for chunk in hs.chunked(hs.read_records(inp, hs._infer_format(args.input, args.input_format)),
+                                    args.chunk_size):
+                ids, cols, rejects = hs.parse_chunk(chunk, require_id=True)
+                for r in rejects:
+                    if r.problems[0].field == "id":
+                        raise CohortFileError(f"record {r.record}: no \"id\"; subjects must be integer ids "
+                                              f"({written} records appended before it)")
+                    sys.stderr.write(hs.format_reject(r, "text"))
+                rejected += len(rejects)
+                if not ids:
+                    continue
+                w.append_scored([_subject_id(i) for i in ids], at, cols, scorer(cols))
+                written += len(ids)
+    finally:
+        inp.close()
+    print(f"appended {written}, rejected {rejected}", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+def cmd_synth(args: argparse.Namespace) -> int:
+    from risk_engine import score_batch
+    from synthetic import population
+
+    subjects = max(1, args.n // args.visits)
+    start = timestamp("2026-01-01")
+    with CohortWriter(args.file) as w:
+        for v in range(args.visits):
+            for lo in range(0, subjects, args.chunk_size):
+                hi = min(lo + args.chunk_size, subjects)
+                cols = population(hi - lo, args.seed + v * 100003 + lo)
+                w.append_scored(np.arange(lo, hi), start + v * 30 * 86400, cols, score_batch(cols))
+        total = w.count
+    print(f"{args.file}: {total:,} records", file=sys.stderr)
+    return 0
+
+
+def cmd_index(args: argparse.Namespace) -> int:
+    with CohortFile(args.file) as cf:
+        added = cf.update_index()
+        print(f"indexed {added:,} new records ({len(cf):,} total)", file=sys.stderr)
+    return 0
+
+
+def cmd_history(args: argparse.Namespace) -> int:
+    with CohortFile(args.file) as cf:
+        found = cf.history(args.subject)
+        rows = [_record_dict(found, i) for i in range(len(found))]
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+    else:
+        for r in rows:
+            print(f"{r['assessed_at']}  {'/'.join(r['levels'].values())}")
+    return 0 if rows else 1
+
+
+def cmd_summary(args: argparse.Namespace) -> int:
+    import cohort
+
+    with CohortFile(args.file) as cf:
+        stats = aggregate(cf)
+    if args.json:
+        print(json.dumps(stats.to_dict(args.top), indent=2, ensure_ascii=False))
+    else:
+        print(cohort.format_summary(stats, args.top))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description="Append-only, memory-mapped cohort file of scored assessments.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    a = sub.add_parser("append", help="score intake records and append them")
+    a.add_argument("file")
+    a.add_argument("input", help="CSV or JSONL file with integer ids, or - for stdin")
+    a.add_argument("--input-format", choices=["csv", "jsonl"])
+    a.add_argument("--at", help="assessment date or time, ISO 8601 (default: now)")
+    a.add_argument("--table", help="score through a prebuilt score table (see score_table.py)")
+    a.add_argument("--chunk-size", type=int, default=65536)
+    a.set_defaults(func=cmd_append)
+
+    s = sub.add_parser("synth", help="append synthetic assessments (see synthetic.py)")
+    s.add_argument("file")
+    s.add_argument("-n", type=int, default=1_000_000, help="records to append")
+    s.add_argument("--visits", type=int, default=4, help="assessments per subject, 30 days apart")
+    s.add_argument("--seed", type=int, default=0)
+    s.add_argument("--chunk-size", type=int, default=1 << 18)
+    s.set_defaults(func=cmd_synth)
+
+    i = sub.add_parser("index", help="build or update the subject index")
+    i.add_argument("file")
+    i.set_defaults(func=cmd_index)
+
+    h = sub.add_parser("history", help="one subject's assessments, oldest first")
+    h.add_argument("file")
+    h.add_argument("subject", type=int)
+    h.add_argument("--json", action="store_true")
+    h.set_defaults(func=cmd_history)
+
+    m = sub.add_parser("summary", help="cohort breakdown of the stored results")
+    m.add_argument("file")
+    m.add_argument("--top", type=int, default=5)
+    m.add_argument("--json", action="store_true")
+    m.set_defaults(func=cmd_summary)
+    return ap
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except CohortFileError as e:
+        print(f"cohort_file.py: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
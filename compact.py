@@ -0,0 +1,357 @@
+# compact.py
+#
+# Compact, lossless encodings of Inputs for holding large cohorts in memory.
+#
+# Every field except height and weight fits in one 32-bit code (categoricals
+# as their CATEGORIES position, booleans as single bits, age in 7 bits).
+# Height and weight stay float64 so round trips are exact. Forms:
+#   pack()/unpack()            one Python int (code | height bits | weight bits)
+#   RECORD / to_bytes()        fixed-width 20-byte struct
+#   PackedInputs               slotted record; the scalar scorers accept it as-is
+#   PACKED_DTYPE / pack_array  NumPy structured array; columns() feeds score_batch
+#
+# Results have a compact form too (see "Results" below): one integer holding
+# level codes, points and rule masks per domain plus two action codes.
+import struct
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from risk_engine import (
+    ACTIONS,
+    BOOL_FIELDS,
+    CARDIO_REASONS,
+    CARDIO_WEIGHTS,
+    CATEGORIES,
+    LEVELS,
+    MASK_RESULTS,
+    MSK_REASONS,
+    MSK_WEIGHTS,
+    SLEEP_REASONS,
+    SLEEP_WEIGHTS,
+    TOP_REASONS,
+    Assessment,
+    Inputs,
+    Likelihood,
+    pick_action_codes,
+    projection,
+    rule_masks,
+)
+
+# (field, bit width), low bits first
+LAYOUT: Tuple[Tuple[str, int], ...] = (
+    ("age", 7),
+    ("sex", 1),
+    ("family_cvd", 1),
+    ("family_t2d", 1),
+    ("known_htn", 1),
+    ("known_prediabetes", 1),
+    ("known_sleep_apnea", 1),
+    ("exercise_bucket", 2),
+    ("sleep_quality", 2),
+    ("sleep_duration_bucket", 2),
+    ("alcohol_bucket", 2),
+    ("smoking_vaping", 2),
+    ("bp_bucket", 3),
+    ("ldl_bucket", 2),
+    ("a1c_bucket", 2),
+    ("rhr_bucket", 2),
+)
+CODE_BITS = sum(w for _, w in LAYOUT)
+MAX_AGE = (1 << 7) - 1
+
+SHIFTS: Dict[str, Tuple[int, int]] = {}
+_shift = 0
+for _f, _w in LAYOUT:
+    assert _f not in CATEGORIES or len(CATEGORIES[_f]) <= 1 << _w, _f
+    SHIFTS[_f] = (_shift, (1 << _w) - 1)
+    _shift += _w
+
+# value -> code per categorical field
+CODES: Dict[str, Dict[str, int]] = {f: {v: i for i, v in enumerate(vs)} for f, vs in CATEGORIES.items()}
+
+RECORD = struct.Struct("<Idd")  # code, height_cm, weight_kg
+PACKED_DTYPE = np.dtype([("code", "<u4"), ("height_cm", "<f8"), ("weight_kg", "<f8")])
+
+_F64 = struct.Struct("<d")
+
+
+def encode(x: Inputs) -> int:
+    """32-bit code for every field except height and weight."""
+    if not 0 <= x.age <= MAX_AGE or int(x.age) != x.age:
+        raise ValueError(f"age {x.age!r} out of range 0..{MAX_AGE}")
+    code = int(x.age)
+    for f, (shift, _) in SHIFTS.items():
+        if f in CODES:
+            try:
+                code |= CODES[f][getattr(x, f)] << shift
+            except KeyError:
+                raise ValueError(f"unknown value {getattr(x, f)!r} for {f}") from None
+        elif f in BOOL_FIELDS and getattr(x, f):
+            code |= 1 << shift
+    return code
+
+
+def decode(code: int, height_cm: float, weight_kg: float) -> Inputs:
+    values = {}
+    for f, (shift, mask) in SHIFTS.items():
+        v = code >> shift & mask
+        if f in CATEGORIES:
+            values[f] = CATEGORIES[f][v]
+        elif f in BOOL_FIELDS:
+            values[f] = bool(v)
+        else:
+            values[f] = v
+    return Inputs(height_cm=height_cm, weight_kg=weight_kg, **values)
+
+
+def _f64_bits(v: float) -> int:
+    return int.from_bytes(_F64.pack(v), "little")
+
+
+def _bits_f64(n: int) -> float:
+    return _F64.unpack(n.to_bytes(8, "little"))[0]
+
+
+def pack(x: Inputs) -> int:
+    return encode(x) | _f64_bits(x.height_cm) << 32 | _f64_bits(x.weight_kg) << 96
+
+
+def unpack(n: int) -> Inputs:
+    mask64 = (1 << 64) - 1
+    return decode(n & 0xFFFFFFFF, _bits_f64(n >> 32 & mask64), _bits_f64(n >> 96 & mask64))
+
+
+def to_bytes(x: Inputs) -> bytes:
+    return RECORD.pack(encode(x), x.height_cm, x.weight_kg)
+
+
+def from_bytes(b: bytes) -> Inputs:
+    return decode(*RECORD.unpack(b))
+
+
+class PackedInputs:
+    """Slotted, read-only Inputs stand-in backed by the 32-bit code.
+
+    Field attributes decode on access, so score_cardiometabolic and friends
+    take a PackedInputs wherever they take an Inputs.
+    """
+    __slots__ = ("code", "height_cm", "weight_kg")
+
+    def __init__(self, code: int, height_cm: float, weight_kg: float):
+        self.code = code
+        self.height_cm = height_cm
+        self.weight_kg = weight_kg
+
+    @classmethod
+    def from_inputs(cls, x: Inputs) -> "PackedInputs":
+        return cls(encode(x), x.height_cm, x.weight_kg)
+
+    def to_inputs(self) -> Inputs:
+        return decode(self.code, self.height_cm, self.weight_kg)
+
+    def __int__(self) -> int:
+        return self.code | _f64_bits(self.height_cm) << 32 | _f64_bits(self.weight_kg) << 96
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PackedInputs):
+            return NotImplemented
+        return (self.code, self.height_cm, self.weight_kg) == (other.code, other.height_cm, other.weight_kg)
+
+    def __hash__(self) -> int:
+        return hash((self.code, self.height_cm, self.weight_kg))
+
+    def __repr__(self) -> str:
+        return f"PackedInputs({self.to_inputs()!r})"
+
+
+def _field_property(field: str) -> property:
+    shift, mask = SHIFTS[field]
+    if field in CATEGORIES:
+        values = CATEGORIES[field]
+        return property(lambda self: values[self.code >> shift & mask])
+    if field in BOOL_FIELDS:
+        return property(lambda self: bool(self.code >> shift & 1))
+    return property(lambda self: self.code >> shift & mask)
+
+
+for _f, _ in LAYOUT:
+    setattr(PackedInputs, _f, _field_property(_f))
+
+
+def pack_array(records: Iterable[Inputs]) -> np.ndarray:
+    rows: List[Tuple[int, float, float]] = [(encode(x), x.height_cm, x.weight_kg) for x in records]
+    return np.array(rows, dtype=PACKED_DTYPE)
+
+
+def unpack_array(arr: np.ndarray) -> List[Inputs]:
+    return [decode(int(c), float(h), float(w)) for c, h, w in arr.tolist()]
+
+
+def columns(arr: np.ndarray) -> Dict[str, np.ndarray]:
+    """Integer-coded columns of a PACKED_DTYPE array, accepted by score_batch."""
+    code = arr["code"]
+    cols: Dict[str, np.ndarray] = {"height_cm": arr["height_cm"], "weight_kg": arr["weight_kg"]}
+    for f, (shift, mask) in SHIFTS.items():
+        v = (code >> np.uint32(shift)) & np.uint32(mask)
+        cols[f] = v.astype(bool) if f in BOOL_FIELDS else v.astype(np.uint8)
+    return cols
+
+
+def encode_columns(cols: Mapping[str, np.ndarray]) -> np.ndarray:
+    """uint32 codes for integer-coded columns; the inverse of columns()."""
+    age = np.asarray(cols["age"])
+    if age.size and (age.min() < 0 or age.max() > MAX_AGE):
+        raise ValueError(f"age out of range 0..{MAX_AGE}")
+    code = np.zeros(len(age), dtype=np.uint32)
+    for f, (shift, mask) in SHIFTS.items():
+        col = np.asarray(cols[f])
+        top = len(CATEGORIES[f]) - 1 if f in CODES else mask
+        if col.size and (col.min() < 0 or col.max() > top):
+            bad = col.min() if col.min() < 0 else col.max()
+            raise ValueError(f"code {bad} out of range 0..{top} for {f}")
+        code |= col.astype(np.uint32) << np.uint32(shift)
+    return code
+
+
+# ---- Results ----
+#
+# A scored record as one integer (46 bits, fits uint64), low bits first:
+#   cardio level:2 points:4 mask:11 | sleep level:2 points:4 mask:7
+#   | msk level:2 points:4 mask:4 | action 1:3 action 2:3
+# Masks keep every rule that fired in reason order, so the top-3 reasons are
+# rebuilt on decode; actions are codes into the shared ACTIONS catalog.
+
+RESULT_DOMAINS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("cardio", CARDIO_REASONS),
+    ("sleep", SLEEP_REASONS),
+    ("msk", MSK_REASONS),
+)
+RESULT_LAYOUT: Tuple[Tuple[str, int], ...] = tuple(
+    (f"{d}_{name}", width)
+    for d, reasons in RESULT_DOMAINS
+    for name, width in (("level", 2), ("points", 4), ("mask", len(reasons)))
+) + (("action1", 3), ("action2", 3))
+
+RESULT_SHIFTS: Dict[str, Tuple[int, int]] = {}
+_shift = 0
+for _f, _w in RESULT_LAYOUT:
+    RESULT_SHIFTS[_f] = (_shift, (1 << _w) - 1)
+    _shift += _w
+RESULT_BITS = _shift
+assert len(ACTIONS) <= 8 and max(sum(w) for w in (CARDIO_WEIGHTS, SLEEP_WEIGHTS, MSK_WEIGHTS)) < 16
+
+_LEVEL_CODE = {v: i for i, v in enumerate(LEVELS)}
+
+
+def _domain_parts(d: str) -> List[int]:
+    # Encoded level/points/mask bits of domain d for every rule mask.
+    (ls, _), (ps, _), (ms, _) = (RESULT_SHIFTS[f"{d}_{n}"] for n in ("level", "points", "mask"))
+    return [
+        _LEVEL_CODE[level] << ls | points << ps | mask << ms
+        for mask, (level, points, _) in enumerate(MASK_RESULTS[d])
+    ]
+
+
+_CARDIO_PART, _SLEEP_PART, _MSK_PART = (_domain_parts(d) for d, _ in RESULT_DOMAINS)
+_CARDIO_LEVEL, _SLEEP_LEVEL, _MSK_LEVEL = ([r[0] for r in MASK_RESULTS[d]] for d, _ in RESULT_DOMAINS)
+_A1_SHIFT, _A2_SHIFT = RESULT_SHIFTS["action1"][0], RESULT_SHIFTS["action2"][0]
+
+
+def result_from_masks(cardio_mask: int, sleep_mask: int, msk_mask: int) -> int:
+    a1, a2 = pick_action_codes(
+        _CARDIO_LEVEL[cardio_mask], _SLEEP_LEVEL[sleep_mask], _MSK_LEVEL[msk_mask], cardio_mask, sleep_mask, msk_mask,
+    )
+    return (_CARDIO_PART[cardio_mask] | _SLEEP_PART[sleep_mask] | _MSK_PART[msk_mask]
+            | a1 << _A1_SHIFT | a2 << _A2_SHIFT)
+
+
+def score_compact(x: Inputs) -> int:
+    """score_all(x) as a result code; no reason lists or action dicts are built."""
+    return result_from_masks(*rule_masks(x))
+
+
+def result_field(code: int, name: str) -> int:
+    shift, mask = RESULT_SHIFTS[name]
+    return code >> shift & mask
+
+
+def result_levels(code: int) -> Tuple[Likelihood, Likelihood, Likelihood]:
+    return (
+        LEVELS[result_field(code, "cardio_level")],
+        LEVELS[result_field(code, "sleep_level")],
+        LEVELS[result_field(code, "msk_level")],
+    )
+
+
+def result_actions(code: int) -> Tuple[Mapping[str, str], Mapping[str, str]]:
+    """The two picked actions as shared, read-only catalog entries."""
+    return ACTIONS[result_field(code, "action1")], ACTIONS[result_field(code, "action2")]
+
+
+def decode_result(code: int) -> Tuple[
+    Tuple[Likelihood, int, List[str]],
+    Tuple[Likelihood, int, List[str]],
+    Tuple[Likelihood, int, List[str]],
+    List[Dict[str, str]],
+]:
+    """Expand a result code into the scalar functions' shapes (tuples, reason lists, action dicts)."""
+    out = []
+    for d, reasons in RESULT_DOMAINS:
+        mask = result_field(code, f"{d}_mask")
+        top = [r for i, r in enumerate(reasons) if mask >> i & 1][:TOP_REASONS]
+        out.append((LEVELS[result_field(code, f"{d}_level")], result_field(code, f"{d}_points"), top))
+    return out[0], out[1], out[2], [dict(a) for a in result_actions(code)]
+
+
+def decode_assessment(code: int) -> Assessment:
+    cardio, sleep, msk, actions = decode_result(code)
+    return Assessment(cardio=cardio, sleep=sleep, msk=msk, actions=actions)
+
+
+def pack_results(result: Mapping[str, np.ndarray]) -> np.ndarray:
+    """uint64 result codes for a score_batch result."""
+    codes = np.zeros(len(result["actions"]), dtype=np.uint64)
+    for name, (shift, _) in RESULT_SHIFTS.items():
+        if name.startswith("action"):
+            values = result["actions"][:, int(name[-1]) - 1]
+        else:
+            values = result[name]
+        codes |= values.astype(np.uint64) << np.uint64(shift)
+    return codes
+
+
+def result_fields(codes: np.ndarray, name: str) -> np.ndarray:
+    shift, mask = RESULT_SHIFTS[name]
+    return (codes >> np.uint64(shift)) & np.uint64(mask)
+
+
+def _first_bits(masks: np.ndarray, nbits: int, k: int) -> np.ndarray:
+    hits = ((masks[:, None] >> np.arange(nbits, dtype=np.uint64)) & np.uint64(1)).astype(bool)
+    rank = np.cumsum(hits, axis=1) * hits
+    out = np.empty((len(masks), k), dtype=np.int8)
+    for j in range(k):
+        sel = rank == j + 1
+        out[:, j] = np.where(sel.any(axis=1), sel.argmax(axis=1), -1)
+    return out
+
+
+def unpack_results(codes: np.ndarray, outputs: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """Inverse of pack_results: the score_batch result arrays, projected like score_batch."""
+    want = projection(outputs)
+    codes = np.asarray(codes, dtype=np.uint64)
+    out: Dict[str, np.ndarray] = {}
+    for d, reasons in RESULT_DOMAINS:
+        if "levels" in want:
+            out[f"{d}_level"] = result_fields(codes, f"{d}_level").astype(np.int8)
+        if "points" in want:
+            out[f"{d}_points"] = result_fields(codes, f"{d}_points").astype(np.int16)
+        if "reasons" in want:
+            mask = result_fields(codes, f"{d}_mask")
+            out[f"{d}_reasons"] = _first_bits(mask, len(reasons), TOP_REASONS)
+            out[f"{d}_mask"] = mask.astype(np.int32)
+    if "actions" in want:
+        out["actions"] = np.column_stack([
+            result_fields(codes, "action1"), result_fields(codes, "action2"),
+        ]).astype(np.int8)
+    return out
@@ -0,0 +1,277 @@
+# counterfactual.py
+#
+# "What would change my level": every single-field and two-field change to a
+# person's modifiable inputs, scored as one batch.
+#
+#   python counterfactual.py '{"age": 38, ...}' [--json]
+#
+# Work happens in score-table key space (see score_table.py): a change is a
+# key delta, so all candidates are one array of keys and one score_batch call
+# (or one table gather). A change is reported for a domain when it lowers
+# that domain's level. A two-field change is kept only when it gets lower
+# than either of its single changes does alone. Results are ranked by
+# number of fields changed, then resulting level and points, then how
+# little the other domains move. Results are cached per key, like reports,
+# and come from the same score table and rules as reports when
+# report.use_score_table() / report.use_rules() set them.
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from risk_engine import CATEGORIES, LEVELS, RULES, RULES_VERSION, Inputs
+from rules import RuleError, RuleSet, load_rules
+from score_table import KEY_INPUTS, ScoreTable, key_columns, key_delta, key_field, key_of
+
+CACHE_SIZE = 4096
+DOMAINS: Tuple[str, ...] = ("cardio", "sleep", "msk")
+
+# Fields a person can act on; diagnoses, family history and the fields that
+# never reach the scorers are left alone.
+MODIFIABLE: Tuple[str, ...] = (
+    "exercise_bucket",
+    "sleep_quality",
+    "sleep_duration_bucket",
+    "alcohol_bucket",
+    "bp_bucket",
+    "ldl_bucket",
+    "a1c_bucket",
+    "rhr_bucket",
+    "excess_weight",
+)
+# Never proposed as a target, and a field holding one is not changed.
+NOT_TARGETS = frozenset({"UNKNOWN", "DIAGNOSED"})
+EXCESS_WEIGHT_VALUES = ("no excess weight signal", "excess weight signal")
+FIELD_LABELS: Dict[str, str] = {
+    "exercise_bucket": "Exercise",
+    "sleep_quality": "Sleep quality",
+    "sleep_duration_bucket": "Sleep duration",
+    "alcohol_bucket": "Alcohol (drinks/week)",
+    "bp_bucket": "Blood pressure trend",
+    "ldl_bucket": "LDL",
+    "a1c_bucket": "A1C/glucose",
+    "rhr_bucket": "Resting HR",
+    "excess_weight": "Weight",
+}
+
+Scorer = Callable[[Mapping[str, np.ndarray]], Dict[str, np.ndarray]]
+
+
+@dataclass(frozen=True)
+class Counterfactual:
+    changes: Tuple[Tuple[str, str, str], ...]  # (field, from, to)
+    levels: Tuple[str, str, str]               # cardio, sleep, msk after the change
+    points: Tuple[int, int, int]
+    actions: Tuple[str, str]
+
+    def describe(self) -> str:
+        return " and ".join(f"{FIELD_LABELS.get(f, f)} {a} → {b}" for f, a, b in self.changes)
+
+
+def _value(field: str, code: int) -> str:
+    if field == "excess_weight":
+        return EXCESS_WEIGHT_VALUES[code]
+    return CATEGORIES[field][code]
+
+
+def _alternatives(key: int, fields: Tuple[str, ...]) -> List[Tuple[str, int, List[int]]]:
+    # (field, current code, alternative codes) for every field that may change
+    out = []
+    for f in fields:
+        r = len(EXCESS_WEIGHT_VALUES) if f == "excess_weight" else len(CATEGORIES[f])
+        code = key_field(key, f)
+        if f != "excess_weight" and CATEGORIES[f][code] in NOT_TARGETS:
+            continue
+        alts = [a for a in range(r) if a != code and (f == "excess_weight" or CATEGORIES[f][a] not in NOT_TARGETS)]
+        if alts:
+            out.append((f, code, alts))
+    return out
+
+
+def candidates(key: int, fields: Tuple[str, ...] = MODIFIABLE, pairs: bool = True) -> Tuple[np.ndarray, List[tuple]]:
+    """Keys of the person and of every single (and two-field) change; row 0 is the person.
+
+    Returns (keys, changes) with changes[i] a tuple of (field, from code, to code).
+    """
+    alts = _alternatives(key, fields)
+    deltas = [[key_delta(f, code, a) for a in codes] for f, code, codes in alts]
+    keys = [key]
+    changes: List[tuple] = [()]
+    for (f, code, codes), ds in zip(alts, deltas):
+        keys += [key + d for d in ds]
+        changes += [((f, code, a),) for a in codes]
+    if pairs:
+        for (i, (f, c, fa)), (j, (g, d, ga)) in combinations(enumerate(alts), 2):
+            for a, da in zip(fa, deltas[i]):
+                for b, db in zip(ga, deltas[j]):
+                    keys.append(key + da + db)
+                    changes.append(((f, c, a), (g, d, b)))
+    return np.array(keys, dtype=np.int64), changes
+
+
+def _score_keys(
+    keys: np.ndarray, scorer: Optional[Scorer], table: Optional[ScoreTable], rules: RuleSet,
+) -> Dict[str, np.ndarray]:
+    if table is not None:
+        from compact import unpack_results
+        return unpack_results(np.asarray(table.entries)[keys])
+    return (scorer or rules.score_batch)(key_columns(keys))
+
+
+def check_rules(rules: RuleSet, table: Optional[ScoreTable] = None) -> None:
+    """Raise RuleError unless `rules` can score in key space (with `table`, if given)."""
+    outside = rules.fields - KEY_INPUTS
+    if outside:
+        raise RuleError(f"rules {rules.version} read {', '.join(sorted(outside))}, which score-table keys do not hold")
+    if table is not None and rules.version != RULES_VERSION:
+        raise RuleError(f"score tables hold rules {RULES_VERSION} results; cannot use one with rules {rules.version}")
+
+
+def evaluate(
+    key: int,
+    fields: Tuple[str, ...] = MODIFIABLE,
+    pairs: bool = True,
+    scorer: Optional[Scorer] = None,
+    table: Optional[ScoreTable] = None,
+    limit: Optional[int] = 5,
+    rules: RuleSet = RULES,
+) -> Dict[str, List[Counterfactual]]:
+    """Per domain, the changes that lower its level for the person with this key, best first.
+
+    Candidates are scored by `scorer`, looked up in `table`, or scored with
+    `rules` (default: the engine's), which also name the actions.
+    """
+    keys, changes = candidates(key, fields, pairs)
+    res = _score_keys(keys, scorer, table, rules)
+    level = np.stack([res[f"{d}_level"] for d in DOMAINS], axis=1).astype(np.int64)
+    points = np.stack([res[f"{d}_points"] for d in DOMAINS], axis=1).astype(np.int64)
+    n_changed = np.array([len(c) for c in changes])
+    # how far the other domains move up, summed over levels and points
+    worse = np.maximum(level - level[0], 0) * 100 + np.maximum(points - points[0], 0)
+
+    single_best: Dict[Tuple[str, int], np.ndarray] = {}
+    for i in np.flatnonzero(n_changed == 1).tolist():
+        f, _, a = changes[i][0]
+        single_best[(f, a)] = level[i]
+
+    out: Dict[str, List[Counterfactual]] = {}
+    for di, d in enumerate(DOMAINS):
+        lowered = level[:, di] < level[0, di]
+        for i in np.flatnonzero(lowered & (n_changed == 2)).tolist():
+            (f, _, a), (g, _, b) = changes[i]
+            if level[i, di] >= min(single_best[(f, a)][di], single_best[(g, b)][di]):
+                lowered[i] = False
+        rows = np.flatnonzero(lowered)
+        others = worse[rows].sum(axis=1) - worse[rows, di]
+        order = np.lexsort((others, points[rows, di], level[rows, di], n_changed[rows]))
+        picked = rows[order][:limit] if limit else rows[order]
+        out[d] = [_counterfactual(changes[i], level[i], points[i], res["actions"][i], rules) for i in picked.tolist()]
+    return out
+
+
+def _counterfactual(
+    change: tuple, level: np.ndarray, points: np.ndarray, actions: np.ndarray, rules: RuleSet,
+) -> Counterfactual:
+    return Counterfactual(
+        changes=tuple((f, _value(f, c), _value(f, a)) for f, c, a in change),
+        levels=tuple(LEVELS[v] for v in level.tolist()),
+        points=tuple(points.tolist()),
+        actions=tuple(rules.actions[a]["title"] for a in actions.tolist() if a >= 0),
+    )
+
+
+_table: Optional[ScoreTable] = None
+_rules: RuleSet = RULES
+
+
+def use_score_table(table: Optional[ScoreTable]) -> None:
+    """Look for_key() candidates up in `table` (None: score them). Safe to call on every rerun."""
+    global _table
+    if table is _table:
+        return
+    check_rules(_rules, table)
+    _table = table
+    for_key.cache_clear()
+
+
+def use_rules(rules: RuleSet) -> None:
+    """Score for_key() candidates with `rules` (see check_rules). Safe to call on every rerun."""
+    global _rules
+    if rules is _rules:
+        return
+    check_rules(rules, _table)
+    _rules = rules
+    for_key.cache_clear()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def for_key(key: int) -> Dict[str, Tuple[Counterfactual, ...]]:
+    """Cached evaluate() with the defaults and the table and rules set above; what the app calls."""
+    return {d: tuple(cfs) for d, cfs in evaluate(key, table=_table, rules=_rules).items()}
+
+
+def for_inputs(x: Inputs) -> Dict[str, Tuple[Counterfactual, ...]]:
+    return for_key(key_of(x))
+
+
+def to_dict(result: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        d: [
+            {
+                "changes": [{"field": f, "from": a, "to": b} for f, a, b in cf.changes],
+                "levels": dict(zip(DOMAINS, cf.levels)),
+                "points": dict(zip(DOMAINS, cf.points)),
+                "actions": list(cf.actions),
+            }
+            for cf in cfs
+        ]
+        for d, cfs in result.items()
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import healthsignal as hs
+
+    ap = argparse.ArgumentParser(description="List the input changes that would lower each risk level.")
+    ap.add_argument("record", nargs="?", help="intake JSON object (default: read from stdin)")
+    ap.add_argument("--single", action="store_true", help="single-field changes only")
+    ap.add_argument("--limit", type=int, default=5, help="changes listed per domain (0: all)")
+    ap.add_argument("--table", help="look candidates up in a prebuilt score table (see score_table.py)")
+    ap.add_argument("--rules", default=RULES_VERSION, metavar="VERSION",
+                    help=f"rule version under rules/, or a rule file, to score with (default: {RULES_VERSION})")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+    try:
+        _, values = hs.parse_record(args.record if args.record is not None else sys.stdin.read())
+    except hs.RecordError as e:
+        print(f"counterfactual.py: {e}", file=sys.stderr)
+        return 2
+    table = ScoreTable.load(args.table) if args.table else None
+    try:
+        rules = load_rules(args.rules)
+        check_rules(rules, table)
+    except RuleError as e:
+        print(f"counterfactual.py: {e}", file=sys.stderr)
+        return 2
+    result = evaluate(
+        key_of(Inputs(**values)), pairs=not args.single, table=table, limit=args.limit or None, rules=rules,
+    )
+    if args.json:
+        print(json.dumps(to_dict(result), indent=2, ensure_ascii=False))
+        return 0
+    for d, cfs in result.items():
+        print(f"{d}:")
+        for cf in cfs:
+            print(f"  {cf.describe()}  ->  {'/'.join(cf.levels)}")
+        if not cfs:
+            print("  (no change lowers this level)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+# daemon.py
+#
+# Warm local scoring daemon on a Unix domain socket, for pipelines that score
+# one person at a time and cannot afford a cold Python start per call:
+#
+#   python daemon.py serve [--socket PATH] [--workers 4] [--table score_table.hst] [--rules v1]
+#   echo '{"age": 38, ...}' | python daemon.py score [--socket PATH]
+#
+# Protocol: each message is a 4-byte big-endian length followed by that many
+# bytes of UTF-8 JSON. A request is one intake object (reply: one result row,
+# same shape as `healthsignal.py score` JSONL) or an array of them (reply:
+# {"results": [row | {"index": i, "error": ...}]}); {"op": "ping"} answers
+# {"ok": true, "pid": ..., "rules_version": ...}. Invalid requests get {"error": ...}. A connection may carry
+# any number of requests.
+#
+# The parent imports the engine and binds the socket, then forks --workers
+# processes that accept() on it directly. Backpressure is the listen backlog:
+# each worker serves one connection at a time, idle connections are dropped
+# after --idle-timeout, and oversized frames close the connection. SIGTERM or
+# SIGINT stops accepting, lets in-flight requests finish, and removes the
+# socket file; crashed workers are replaced.
+#
+# Only the stdlib is imported at module level, so the client starts fast.
+import argparse
+import json
+import os
+import select
+import signal
+import socket
+import stat
+import struct
+import sys
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_SOCKET = os.path.join(os.environ.get("XDG_RUNTIME_DIR") or "/tmp", "healthsignal.sock")
+MAX_FRAME = 16 << 20
+BATCH_MIN = 32  # smaller requests are scored record by record, skipping NumPy overhead
+HEADER = struct.Struct(">I")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < n:
+        part = sock.recv(n - len(buf))
+        if not part:
+            if buf:
+                raise ProtocolError("connection closed mid-frame")
+            return None
+        buf += part
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket) -> Optional[bytes]:
+    """Next message payload, or None at a clean end of stream."""
+    head = _recv_exact(sock, HEADER.size)
+    if head is None:
+        return None
+    (n,) = HEADER.unpack(head)
+    if n > MAX_FRAME:
+        raise ProtocolError(f"frame of {n} bytes exceeds {MAX_FRAME}")
+    body = _recv_exact(sock, n)
+    if body is None and n:
+        raise ProtocolError("connection closed mid-frame")
+    return body or b""
+
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+# ---- Client ----
+
+class Client:
+    def __init__(self, path: str = DEFAULT_SOCKET, timeout: Optional[float] = 30.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+
+    def request(self, message: Any) -> Any:
+        send_frame(self.sock, json.dumps(message).encode("utf-8"))
+        reply = recv_frame(self.sock)
+        if reply is None:
+            raise ProtocolError("daemon closed the connection")
+        return json.loads(reply)
+
+    def score(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        return self.request(record)
+
+    def score_many(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self.request(records)["results"]
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# ---- Server ----
+
+class Engine:
+    """Scalar and batch scorers, from a rule file (default: the engine's) or a score table."""
+
+    def __init__(self, table_path: Optional[str] = None, rules_path: Optional[str] = None):
+        from risk_engine import RULES, Inputs
+        from rules import load_rules
+
+        self.Inputs = Inputs
+        self.rules = load_rules(rules_path) if rules_path else RULES
+        if table_path:
+            from score_table import ScoreTable, TableError
+            if self.rules.version != RULES.version:
+                raise TableError(f"score tables hold rules {RULES.version} results; cannot score rules {self.rules.version} with one")
+            table = ScoreTable.load(table_path)
+            self.one = table.lookup
+            self.batch = table.score_batch
+        else:
+            score = self.rules.score
+
+            def one(x: Any) -> tuple:
+                a = score(x)
+                return a.cardio, a.sleep, a.msk, a.actions
+            self.one = one
+            self.batch = self.rules.score_batch
+
+
+class Worker:
+    # SIGTERM only sets `stopping`. Blocking waits go through _wait(), which
+    # also watches the signal wakeup fd, so an idle worker stops at once while
+    # a request that has started arriving is still read, answered and sent.
+
+    def __init__(self, listener: socket.socket, engine: "Engine", idle_timeout: float):
+        import healthsignal as hs
+
+        self.hs = hs
+        self.listener = listener
+        self.engine = engine
+        self.idle_timeout = idle_timeout
+        self.stopping = False
+        self._wakeup: Optional[int] = None
+
+    def _on_term(self, signum: int, frame: Any) -> None:
+        self.stopping = True
+
+    def _wait(self, sock: socket.socket, timeout: Optional[float]) -> bool:
+        """True once sock is readable; False on timeout, or when stopping with nothing to read."""
+        watch: List[Any] = [sock] if self._wakeup is None else [sock, self._wakeup]
+        while True:
+            ready, _, _ = select.select(watch, [], [], 0 if self.stopping else timeout)
+            if sock in ready:
+                return True
+            if self.stopping or not ready:
+                return False
+            os.read(self._wakeup, 512)  # a signal arrived; look again
+
+    def _score(self, ids: List[Any], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        hs = self.hs
+        if len(rows) < BATCH_MIN:
+            return [hs.record_row(rid, *self.engine.one(self.engine.Inputs(**v))) for rid, v in zip(ids, rows)]
+        return list(hs.result_rows(ids, self.engine.batch(hs.to_columns(rows)), rules=self.engine.rules))
+
+    def handle(self, payload: bytes) -> Any:
+        hs = self.hs
+        try:
+            msg = json.loads(payload)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            return {"error": f"invalid JSON: {e}"}
+        if isinstance(msg, dict):
+            if msg.get("op") == "ping":
+                return {"ok": True, "pid": os.getpid(), "rules_version": self.engine.rules.version}
+            try:
+                rid, values = hs.parse_record(msg)
+            except hs.RecordError as e:
+                return {"error": str(e), "codes": e.codes}
+            return self._score([rid], [values])[0]
+        if not isinstance(msg, list):
+            return {"error": "expected an intake object or an array of them"}
+        results: List[Any] = [None] * len(msg)
+        ok, ids, rows = [], [], []
+        for i, item in enumerate(msg):
+            try:
+                if not isinstance(item, dict):
+                    raise hs.RecordError("expected a JSON object", [hs.normalize.NOT_AN_OBJECT])
+                rid, values = hs.parse_record(item)
+            except hs.RecordError as e:
+                results[i] = {"index": i, "error": str(e), "codes": e.codes}
+                continue
+            ok.append(i)
+            ids.append(i if rid is None else rid)
+            rows.append(values)
+        if rows:
+            for i, row in zip(ok, self._score(ids, rows)):
+                results[i] = row
+        return {"results": results}
+
+    def reply(self, payload: bytes) -> bytes:
+        try:
+            return json.dumps(self.handle(payload), ensure_ascii=False).encode("utf-8")
+        except Exception as e:  # a failing request must not take the worker down
+            return json.dumps({"error": f"internal error: {type(e).__name__}: {e}"}).encode("utf-8")
+
+    def serve_connection(self, conn: socket.socket) -> None:
+        conn.settimeout(self.idle_timeout)
+        with conn:
+            while self._wait(conn, self.idle_timeout):
+                try:
+                    payload = recv_frame(conn)
+                    if payload is None:
+                        return
+                    send_frame(conn, self.reply(payload))
+                except (ProtocolError, OSError):
+                    return
+
+    def run(self) -> None:
+        r, w = os.pipe()
+        os.set_blocking(w, False)
+        self._wakeup = r
+        signal.set_wakeup_fd(w)
+        signal.signal(signal.SIGTERM, self._on_term)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent coordinates shutdown
+        self.listener.setblocking(False)  # workers race for each connection
+        while not self.stopping and self._wait(self.listener, None):
+            try:
+                conn, _ = self.listener.accept()
+            except BlockingIOError:
+                continue  # another worker took it
+            conn.setblocking(True)
+            self.serve_connection(conn)
+
+
+def clear_stale_socket(path: str) -> None:
+    """Remove a socket left by a dead daemon; refuse a live daemon or anything that is not a socket."""
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise SystemExit(f"{path}: path exists and is not a socket")
+    try:
+        Client(path, timeout=1.0).close()
+    except OSError:
+        os.unlink(path)
+    else:
+        raise SystemExit(f"a daemon is already listening on {path}")
+
+
+def serve(path: str, workers: int, table_path: Optional[str] = None,
+          backlog: int = 128, idle_timeout: float = 30.0, rules_path: Optional[str] = None) -> None:
+    import healthsignal as hs
+
+    clear_stale_socket(path)
+    try:
+        engine = Engine(table_path, rules_path)
+    except ValueError as e:  # RuleError, TableError
+        raise SystemExit(f"daemon.py: {e}") from None
+    warm = hs.parse_record(_WARMUP)[1]  # pay first-call costs before forking
+    engine.one(engine.Inputs(**warm))
+    engine.batch(hs.to_columns([warm] * BATCH_MIN))
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(backlog)
+
+    stopping = False
+    children: Dict[int, int] = {}  # pid -> slot
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                Worker(listener, engine, idle_timeout).run()
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = slot
+
+    def on_signal(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    for slot in range(workers):
+        spawn(slot)
+    print(f"healthsignal daemon on {path} ({workers} workers)", file=sys.stderr, flush=True)
+    try:
+        while children:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            slot = children.pop(pid, None)
+            if slot is not None and not stopping:
+                spawn(slot)
+    finally:
+        listener.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+_WARMUP = {
+    "age": 40, "sex": "Male", "height_cm": 175, "weight_kg": 75,
+    "family_cvd": False, "family_t2d": False, "exercise_bucket": "MID",
+    "sleep_quality": "RESTFUL", "sleep_duration_bucket": "7+", "alcohol_bucket": "0-3",
+    "smoking_vaping": "NO", "known_htn": False, "known_prediabetes": False,
+    "known_sleep_apnea": False, "bp_bucket": "NORMAL", "ldl_bucket": "NORMAL",
+    "a1c_bucket": "NORMAL", "rhr_bucket": "NORMAL",
+}
+
+
+def _client_lines(records: Iterable[str], path: str) -> int:
+    failed = 0
+    with Client(path) as c:
+        for line in records:
+            if not line.strip():
+                continue
+            try:
+                msg = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(json.dumps({"error": f"invalid JSON: {e.msg}"}))
+                failed += 1
+                continue
+            reply = c.request(msg)
+            failed += "error" in reply
+            print(json.dumps(reply, ensure_ascii=False), flush=True)
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Warm HealthSignal scoring daemon on a Unix socket.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("serve", help="run the daemon")
+    s.add_argument("--socket", default=DEFAULT_SOCKET)
+    s.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    s.add_argument("--table", help="score through a prebuilt score table (see score_table.py)")
+    s.add_argument("--backlog", type=int, default=128, help="pending connections before clients block")
+    s.add_argument("--idle-timeout", type=float, default=30.0, help="seconds before an idle connection is dropped")
+    s.add_argument("--rules", metavar="VERSION",
+                   help="rule version under rules/, or a rule file, to score with (default: the engine's)")
+    c = sub.add_parser("score", help="score JSON records (arguments, or one per stdin line)")
+    c.add_argument("records", nargs="*")
+    c.add_argument("--socket", default=DEFAULT_SOCKET)
+    p = sub.add_parser("ping", help="check that the daemon answers")
+    p.add_argument("--socket", default=DEFAULT_SOCKET)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        serve(args.socket, max(1, args.workers), args.table, args.backlog, args.idle_timeout, args.rules)
+        return 0
+    try:
+        if args.cmd == "ping":
+            with Client(args.socket) as c:
+                print(json.dumps(c.request({"op": "ping"})))
+            return 0
+        return _client_lines(args.records or sys.stdin, args.socket)
+    except (OSError, ProtocolError) as e:
+        print(f"daemon.py: cannot reach daemon on {args.socket}: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+# exhaustive.py
+#
+# Every scoring case at once: sweep the full input space of the heuristics
+# and summarize what they can produce.
+#
+#   python exhaustive.py [--workers N] [-o golden.json] [--diff golden.json] [--json]
+#
+# The space is the score-table key space (see score_table.py): every
+# combination of the categorical and boolean fields that reach the scorers,
+# with the excess-weight signal as a boolean. Age, sex and smoking reach none
+# of them. Key ranges are scored with score_batch across worker processes and
+# reduced to rule-mask counts per domain, a joint level histogram and
+# action-pair counts; the per-domain level histograms, reason-set
+# frequencies (the top-3 reasons shown) and override hits follow from those.
+#
+# -o writes a golden snapshot: the summaries plus a digest of every key's
+# result code in key order. --diff compares this run with a snapshot. Equal
+# digests mean no result changed anywhere; otherwise the summaries that moved
+# are listed and the exit status is 1.
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from compact import pack_results
+from risk_engine import (
+    ACTIONS,
+    CARDIO_REASONS,
+    LEVELS,
+    MASK_OVERRIDES,
+    MASK_RESULTS,
+    MSK_REASONS,
+    RULES_VERSION,
+    SLEEP_REASONS,
+    score_batch,
+)
+from score_table import TABLE_SIZE, key_columns
+
+SNAPSHOT_FORMAT = 1
+DEFAULT_CHUNK = 1 << 17
+DOMAINS = (("cardio", CARDIO_REASONS), ("sleep", SLEEP_REASONS), ("msk", MSK_REASONS))
+
+
+@dataclass
+class Sweep:
+    keys: int
+    masks: Dict[str, np.ndarray]  # domain -> count per rule mask
+    levels: np.ndarray            # (3, 3, 3) counts by cardio, sleep, msk level code
+    action_pairs: np.ndarray      # (len(ACTIONS), len(ACTIONS)) counts by first, second action
+    digest: str                   # sha256 over every key's result code, in key order
+
+    def level_counts(self, domain: str) -> Dict[str, int]:
+        axis = tuple(i for i, (d, _) in enumerate(DOMAINS) if d != domain)
+        return dict(zip(LEVELS, self.levels.sum(axis=axis).tolist()))
+
+    def reason_sets(self, domain: str) -> Dict[Tuple[str, ...], int]:
+        """Counts per top-3 reason set, most frequent first."""
+        out: Dict[Tuple[str, ...], int] = {}
+        for mask, n in enumerate(self.masks[domain].tolist()):
+            if n:
+                reasons = MASK_RESULTS[domain][mask][2]
+                out[reasons] = out.get(reasons, 0) + n
+        return dict(sorted(out.items(), key=lambda kv: (-kv[1], kv[0])))
+
+    def override_hits(self, domain: str) -> int:
+        hit = MASK_OVERRIDES[domain]
+        return sum(n for mask, n in enumerate(self.masks[domain].tolist()) if n and hit(mask))
+
+    def action_counts(self) -> Dict[Tuple[str, str], int]:
+        titles = [a["title"] for a in ACTIONS]
+        pairs = {(titles[i], titles[j]): int(n) for (i, j), n in np.ndenumerate(self.action_pairs) if n}
+        return dict(sorted(pairs.items(), key=lambda kv: (-kv[1], kv[0])))
+
+
+def _sweep_range(bounds: Tuple[int, int]) -> Tuple[Dict[str, np.ndarray], bytes]:
+    keys = np.arange(*bounds, dtype=np.int64)
+    res = score_batch(key_columns(keys))
+    counts = {d: np.bincount(res[f"{d}_mask"], minlength=1 << len(reasons)) for d, reasons in DOMAINS}
+    combo = (res["cardio_level"].astype(np.int64) * 3 + res["sleep_level"]) * 3 + res["msk_level"]
+    counts["levels"] = np.bincount(combo, minlength=27)
+    n = len(ACTIONS)
+    counts["actions"] = np.bincount(res["actions"][:, 0].astype(np.int64) * n + res["actions"][:, 1], minlength=n * n)
+    return counts, hashlib.sha256(pack_results(res).astype("<u8").tobytes()).digest()
+
+
+def sweep(workers: int = 1, chunk: int = DEFAULT_CHUNK) -> Sweep:
+    """Score every key; key ranges run in `workers` processes (1: in this process)."""
+    ranges = [(s, min(s + chunk, TABLE_SIZE)) for s in range(0, TABLE_SIZE, chunk)]
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_sweep_range, ranges))
+    else:
+        parts = [_sweep_range(r) for r in ranges]
+    total = {name: sum(c[name] for c, _ in parts) for name in parts[0][0]}
+    digest = hashlib.sha256(b"".join(d for _, d in parts)).hexdigest()
+    n = len(ACTIONS)
+    return Sweep(
+        keys=TABLE_SIZE,
+        masks={d: total[d] for d, _ in DOMAINS},
+        levels=total["levels"].reshape(3, 3, 3),
+        action_pairs=total["actions"].reshape(n, n),
+        digest=digest,
+    )
+
+
+# ---- Snapshot ----
+
+def snapshot(s: Sweep) -> Dict[str, Any]:
+    """The golden snapshot: JSON-ready summaries and the result digest."""
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "rules_version": RULES_VERSION,
+        "keys": s.keys,
+        "digest": s.digest,
+        "domains": {
+            d: {
+                "levels": s.level_counts(d),
+                "overrides": s.override_hits(d),
+                "reason_sets": {"; ".join(r) or "(none)": n for r, n in s.reason_sets(d).items()},
+            }
+            for d, _ in DOMAINS
+        },
+        "level_combos": {
+            "/".join(LEVELS[i] for i in idx): int(n) for idx, n in np.ndenumerate(s.levels) if n
+        },
+        "action_pairs": {" | ".join(pair): n for pair, n in s.action_counts().items()},
+    }
+
+
+def _diff_counts(name: str, old: Mapping[str, int], new: Mapping[str, int]) -> List[str]:
+    out = []
+    for k in sorted(set(old) | set(new)):
+        a, b = old.get(k, 0), new.get(k, 0)
+        if a == b:
+            continue
+        if not a:
+            out.append(f"{name}: {k}: new ({b:,})")
+        elif not b:
+            out.append(f"{name}: {k}: gone (was {a:,})")
+        else:
+            out.append(f"{name}: {k}: {a:,} -> {b:,}")
+    return out
+
+
+def diff_snapshots(old: Mapping[str, Any], new: Mapping[str, Any]) -> List[str]:
+    """What changed between two snapshots; empty when every result is the same."""
+    if old.get("format") != new.get("format"):
+        return [f"snapshot format {old.get('format')} -> {new.get('format')}"]
+    if old["digest"] == new["digest"] and old["keys"] == new["keys"]:
+        return []
+    out = [f"results differ (rules {old['rules_version']} -> {new['rules_version']})"]
+    if old["keys"] != new["keys"]:
+        out.append(f"input space: {old['keys']:,} -> {new['keys']:,} combinations")
+    for d, cur in new["domains"].items():
+        prev = old["domains"].get(d, {})
+        out += _diff_counts(f"{d} levels", prev.get("levels", {}), cur["levels"])
+        if prev.get("overrides") != cur["overrides"]:
+            out.append(f"{d} overrides: {prev.get('overrides', 0):,} -> {cur['overrides']:,}")
+        out += _diff_counts(f"{d} reasons", prev.get("reason_sets", {}), cur["reason_sets"])
+    out += _diff_counts("levels", old["level_combos"], new["level_combos"])
+    out += _diff_counts("actions", old["action_pairs"], new["action_pairs"])
+    if len(out) == 1:
+        out.append("summaries unchanged; some combinations moved between equal-sized groups")
+    return out
+
+
+def format_report(s: Sweep, top: int = 10) -> str:
+    lines = [f"rules {RULES_VERSION}: {s.keys:,} input combinations, digest {s.digest[:16]}"]
+    for d, _ in DOMAINS:
+        lines.append(f"\n{d}: " + ", ".join(
+            f"{lvl} {c:,} ({c / s.keys:.1%})" for lvl, c in s.level_counts(d).items()
+        ))
+        sets = s.reason_sets(d)
+        lines.append(f"  overrides {s.override_hits(d):,}; {len(sets)} reason sets, most frequent:")
+        for reasons, c in list(sets.items())[:top]:
+            lines.append(f"  {c:>9,}  {', '.join(reasons) or '(none)'}")
+    high = int(s.levels.sum() - s.levels[:2, :2, :2].sum())
+    lines.append(f"\nHigh in any domain: {high:,} ({high / s.keys:.1%}); in all three: {int(s.levels[2, 2, 2]):,}")
+    pairs = s.action_counts()
+    lines.append(f"\naction pairs ({len(pairs)}):")
+    for (a, b), c in list(pairs.items())[:top]:
+        lines.append(f"  {c:>9,}  {a} | {b}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Score the whole input space and summarize the results.")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="keys per job")
+    ap.add_argument("--top", type=int, default=10, help="reason sets and action pairs listed")
+    ap.add_argument("-o", "--output", help="write the golden snapshot to this file")
+    ap.add_argument("--diff", metavar="SNAPSHOT", help="compare with an earlier snapshot; exit 1 on changes")
+    ap.add_argument("--json", action="store_true", help="print the snapshot instead of the report")
+    args = ap.parse_args(argv)
+
+    s = sweep(args.workers, args.chunk)
+    snap = snapshot(s)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(snap, f, indent=1, ensure_ascii=False)
+            f.write("\n")
+    if args.json:
+        print(json.dumps(snap, indent=2, ensure_ascii=False))
+    elif not args.diff:
+        print(format_report(s, args.top))
+    if args.diff:
+        with open(args.diff, encoding="utf-8") as f:
+            changes = diff_snapshots(json.load(f), snap)
+        for line in changes:
+            print(line)
+        if not changes:
+            print(f"no changes against {args.diff}")
+        return 1 if changes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,576 @@
+# healthsignal.py
+#
+# Headless entry point for bulk scoring (no Streamlit import):
+#
+#   python healthsignal.py score intake.csv -o results.jsonl
+#   cat intake.jsonl | python healthsignal.py score - --input-format jsonl
+#   python healthsignal.py cohort intake.jsonl [--json]
+#   python healthsignal.py render intake.jsonl -o reports/ [--format html] [--workers 4]
+#
+# Records stream through read -> normalize -> score -> write in chunks, so
+# memory stays flat regardless of input size. Records that fail normalization
+# go to a reject stream (stderr, or JSONL with reason codes via --rejects).
+import argparse
+import csv
+import functools
+import io
+import json
+import os
+import re
+import sys
+from dataclasses import fields
+from itertools import islice
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Set, TextIO, Tuple
+
+import numpy as np
+
+import instrumentation
+import normalize
+from normalize import Reject
+from risk_engine import DOMAINS, LEVELS, RULES, RULES_VERSION, Inputs, projection, score_batch
+from rules import RuleError, RuleSet, load_rules
+
+IO_BUFFER = 1 << 20
+DEFAULT_CHUNK = 4096
+
+INPUT_FIELDS: Tuple[str, ...] = tuple(f.name for f in fields(Inputs))
+OUTPUT_FIELDS: Tuple[str, ...] = (
+    "id",
+    "cardio_level", "cardio_points", "cardio_reasons",
+    "sleep_level", "sleep_points", "sleep_reasons",
+    "msk_level", "msk_points", "msk_reasons",
+    "actions",
+)
+# per-domain output field suffix -> the OUTPUTS entry it needs
+_FIELD_PARTS = (("level", "levels"), ("points", "points"), ("reasons", "reasons"))
+
+Scorer = Callable[[Mapping[str, np.ndarray]], Dict[str, np.ndarray]]
+
+
+class RecordError(ValueError):
+    def __init__(self, message: str, codes: Iterable[str] = ()):
+        super().__init__(message)
+        self.codes = list(codes)
+
+
+# ---- Read ----
+
+def read_records(
+    lines: Iterable[str], fmt: str, fieldnames: Optional[List[str]] = None,
+) -> Iterator[Tuple[int, Any]]:
+    # Yields (record number, raw record). JSONL lines are decoded in the parse
+    # stage so one bad line is rejected instead of aborting the run.
+    if fmt == "csv":
+        for n, row in enumerate(csv.DictReader(lines, fieldnames=fieldnames), 1):
+            yield n, row
+    else:
+        n = 0
+        for line in lines:
+            if line.strip():
+                n += 1
+                yield n, line
+
+
+# ---- Parse / validate ----
+
+def parse_record(raw: Any) -> Tuple[Any, Dict[str, Any]]:
+    """Validate one raw record; returns (id, Inputs field values)."""
+    rid, values, problems = normalize.normalize_record(raw)
+    if problems:
+        raise RecordError("; ".join(p.describe() for p in problems), [p.code for p in problems])
+    return rid, values
+
+
+def _has_id(rid: Any) -> bool:
+    return rid is not None and not (isinstance(rid, str) and not rid.strip())
+
+
+def parse_chunk(
+    chunk: List[Tuple[int, Any]], require_id: bool = False,
+) -> Tuple[List[Any], Dict[str, np.ndarray], List[Reject]]:
+    """Normalize one chunk of (record number, raw record); returns (ids, columns, rejects).
+
+    Records without an "id" are labelled with their record number, or rejected
+    (id: missing) under require_id, where a record number is no subject id.
+    """
+    batch = normalize.normalize_records([raw for _, raw in chunk])
+    ns = [n for n, _ in chunk]
+    rows, cols, problems = batch.rows.tolist(), batch.cols, dict(batch.rejects)
+    if require_id:
+        keep = np.array([_has_id(batch.ids[i]) for i in rows], dtype=bool)
+        if not keep.all():
+            for j in np.flatnonzero(~keep).tolist():
+                problems[rows[j]] = (normalize.Problem("id", normalize.MISSING),)
+            rows = [i for i, k in zip(rows, keep.tolist()) if k]
+            cols = {f: c[keep] for f, c in cols.items()}
+    ids = [ns[i] if batch.ids[i] is None else batch.ids[i] for i in rows]
+    rejects = [Reject(ns[i], batch.ids[i], p) for i, p in sorted(problems.items())]
+    return ids, cols, rejects
+
+
+# ---- Score / format ----
+
+def chunked(it: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(it)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    return {f: np.asarray([r[f] for r in rows]) for f in INPUT_FIELDS}
+
+
+def output_fields(outputs: Optional[Iterable[str]] = None) -> Tuple[str, ...]:
+    """OUTPUT_FIELDS narrowed to a projection of risk_engine.OUTPUTS."""
+    want = projection(outputs)
+    keep = {"id"}
+    for d in DOMAINS:
+        keep.update(f"{d}_{part}" for part, out in _FIELD_PARTS if out in want)
+    if "actions" in want:
+        keep.add("actions")
+    return tuple(f for f in OUTPUT_FIELDS if f in keep)
+
+
+def result_rows(
+    ids: List[Any], res: Mapping[str, np.ndarray], out_fields: Tuple[str, ...] = OUTPUT_FIELDS,
+    rules: RuleSet = RULES,
+) -> Iterator[Dict[str, Any]]:
+    # res must hold the arrays behind out_fields (see output_fields), scored with `rules`
+    keep = set(out_fields)
+    parts = [
+        (d, part, rules.reasons[d], res[f"{d}_{part}"].tolist())
+        for d in DOMAINS for part, _ in _FIELD_PARTS if f"{d}_{part}" in keep
+    ]
+    actions = res["actions"].tolist() if "actions" in keep else None
+    for i, rid in enumerate(ids):
+        row: Dict[str, Any] = {"id": rid}
+        for d, part, names, values in parts:
+            v = values[i]
+            if part == "level":
+                row[f"{d}_level"] = LEVELS[v]
+            elif part == "points":
+                row[f"{d}_points"] = v
+            else:
+                row[f"{d}_reasons"] = [names[c] for c in v if c >= 0]
+        if actions is not None:
+            row["actions"] = [rules.actions[c]["title"] for c in actions[i] if c >= 0]
+        yield row
+
+
+def record_row(rid: Any, cardio: tuple, sleep: tuple, msk: tuple, actions: List[Mapping[str, str]]) -> Dict[str, Any]:
+    # One row from the scalar scorers' shapes; same fields as result_rows.
+    row: Dict[str, Any] = {"id": rid}
+    for d, (level, points, reasons) in zip(("cardio", "sleep", "msk"), (cardio, sleep, msk)):
+        row[f"{d}_level"] = level
+        row[f"{d}_points"] = points
+        row[f"{d}_reasons"] = list(reasons)
+    row["actions"] = [a["title"] for a in actions]
+    return row
+
+
+def format_rows(rows: Iterable[Dict[str, Any]], fmt: str, out_fields: Tuple[str, ...] = OUTPUT_FIELDS) -> str:
+    if fmt == "jsonl":
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+    buf = io.StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+    for r in rows:
+        w.writerow([
+            "; ".join(v) if isinstance(v, list) else v
+            for v in (r[f] for f in out_fields)
+        ])
+    return buf.getvalue()
+
+
+def csv_header(out_fields: Tuple[str, ...] = OUTPUT_FIELDS) -> str:
+    return ",".join(out_fields) + "\n"
+
+
+def score_chunk(
+    chunk: List[Tuple[int, Any]], out_fmt: str, scorer: Scorer = score_batch,
+    out_fields: Tuple[str, ...] = OUTPUT_FIELDS, rules: RuleSet = RULES,
+) -> Tuple[str, List[Reject]]:
+    """Parse and score one chunk; returns (formatted output, rejected records).
+
+    `rules` names the reasons and actions in the scorer's results.
+    """
+    with instrumentation.stage("parse"):
+        ids, cols, rejects = parse_chunk(chunk)
+    if not ids:
+        return "", rejects
+    res = scorer(cols)
+    with instrumentation.stage("format"):
+        return format_rows(result_rows(ids, res, out_fields, rules), out_fmt, out_fields), rejects
+
+
+def format_reject(r: Reject, fmt: str) -> str:
+    # "text": the stderr line; "jsonl": one object with reason codes
+    if fmt == "jsonl":
+        return json.dumps(r.to_dict(), ensure_ascii=False, default=str) + "\n"
+    return f"record {r.record}: {r.message()}\n"
+
+
+def report_stem(rid: Any) -> str:
+    # never contains "~", which ReportFiles uses to tell colliding reports apart
+    return re.sub(r"[^\w.-]", "_", str(rid)).lstrip(".") or "_"
+
+
+def report_path(out_dir: str, rid: Any, fmt: str) -> str:
+    return os.path.join(out_dir, f"{report_stem(rid)}.{fmt}")
+
+
+Rendered = Tuple[int, str, str]  # record number, file stem, path written
+
+
+class ReportFiles:
+    """Final names for one render run, assigned in input order.
+
+    The first record with a file stem gets <stem>.<fmt>; a later one (a
+    duplicate id, or an id that sanitizes to the same stem) gets
+    <stem>~<record number>.<fmt> instead of overwriting it.
+    """
+
+    def __init__(self, out_dir: str, fmt: str):
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.taken: Set[str] = set()  # casefolded, for case-insensitive file systems
+        self.renamed = 0
+
+    def claim(self, n: int, stem: str) -> str:
+        """The path for record n's report."""
+        key = stem.casefold()
+        if key in self.taken:
+            stem = f"{stem}~{n}"
+            self.renamed += 1
+        self.taken.add(key)
+        return os.path.join(self.out_dir, f"{stem}.{self.fmt}")
+
+    def place(self, rendered: Iterable[Rendered]) -> None:
+        """Move reports rendered to temporary files to their final names."""
+        for n, stem, tmp in rendered:
+            os.replace(tmp, self.claim(n, stem))
+
+
+def render_chunk(
+    chunk: List[Tuple[int, Any]], out_dir: str, fmt: str, scorer: Scorer = score_batch,
+    files: Optional[ReportFiles] = None, rules: RuleSet = RULES,
+) -> Tuple[List[Rendered], List[Reject]]:
+    """Parse, score and render one chunk, one file per record; returns (rendered, rejects).
+
+    With `files`, reports go straight to their final names. Without (in
+    worker processes), they go to temporary files for ReportFiles.place().
+    """
+    import report
+
+    with instrumentation.stage("parse"):
+        ids, cols, rejects = parse_chunk(chunk)
+    if not ids:
+        return [], rejects
+    res = scorer(cols)
+    with instrumentation.stage("render"):
+        docs = report.render_results(res, fmt, rules)
+    bad = {r.record for r in rejects}
+    rendered = []
+    with instrumentation.stage("write"):
+        for n, rid, doc in zip((n for n, _ in chunk if n not in bad), ids, docs):
+            stem = report_stem(rid)
+            path = files.claim(n, stem) if files else os.path.join(out_dir, f".{n}.{fmt}.part")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(doc)
+            rendered.append((n, stem, path))
+    return rendered, rejects
+
+
+def score_stream(
+    inp: TextIO,
+    out: TextIO,
+    in_fmt: str,
+    out_fmt: str,
+    chunk_size: int = DEFAULT_CHUNK,
+    scorer: Scorer = score_batch,
+    err: TextIO = sys.stderr,
+    reject_fmt: str = "text",
+    out_fields: Tuple[str, ...] = OUTPUT_FIELDS,
+    rules: RuleSet = RULES,
+) -> Tuple[int, int]:
+    """Score every record of inp into out, rejects into err; returns (scored, rejected)."""
+    scored = rejected = 0
+    if out_fmt == "csv":
+        out.write(csv_header(out_fields))
+    for chunk in chunked(read_records(inp, in_fmt), chunk_size):
+        text, rejects = score_chunk(chunk, out_fmt, scorer, out_fields, rules)
+        out.write(text)
+        for r in rejects:
+            err.write(format_reject(r, reject_fmt))
+        rejected += len(rejects)
+        scored += len(chunk) - len(rejects)
+    out.flush()
+    return scored, rejected
+
+
+# ---- CLI ----
+
+def _infer_format(path: str, given: Optional[str]) -> str:
+    if given:
+        return given
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def open_input(path: str) -> TextIO:
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="", buffering=IO_BUFFER)
+
+
+def open_output(path: str) -> TextIO:
+    if path == "-":
+        return io.TextIOWrapper(
+            io.BufferedWriter(sys.stdout.buffer, IO_BUFFER), encoding="utf-8", newline="",
+        )
+    return open(path, "w", encoding="utf-8", newline="", buffering=IO_BUFFER)
+
+
+def load_scorer(
+    table_path: Optional[str], outputs: Optional[Iterable[str]] = None, rules: RuleSet = RULES,
+) -> Scorer:
+    """score_batch under `rules`, or through the score table at table_path (built from the same rules)."""
+    if table_path:
+        from score_table import ScoreTable, TableError
+        if rules.version != RULES_VERSION:
+            raise TableError(f"score tables hold rules {RULES_VERSION} results; cannot score rules {rules.version} with one")
+        scorer = ScoreTable.load(table_path).score_batch
+    else:
+        scorer = rules.score_batch
+    if outputs is None:
+        return scorer
+    return functools.partial(scorer, outputs=projection(outputs))
+
+
+def scorer_outputs(outputs: Optional[Iterable[str]], instrument: bool) -> Optional[FrozenSet[str]]:
+    # Instrumentation counts rule masks and actions, so it needs them computed.
+    if outputs is None:
+        return None
+    want = projection(outputs)
+    return want | {"reasons", "actions"} if instrument else want
+
+
+def dump_instrumentation(path: str) -> None:
+    text = json.dumps(instrumentation.snapshot(), indent=2, ensure_ascii=False) + "\n"
+    if path == "-":
+        sys.stderr.write(text)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def cmd_score(args: argparse.Namespace) -> int:
+    in_fmt = _infer_format(args.input, args.input_format)
+    out_fmt = _infer_format(args.output, args.output_format)
+    if args.instrument:
+        instrumentation.enable()
+    if args.rejects:
+        err, reject_fmt = open(args.rejects, "w", encoding="utf-8"), "jsonl"
+    else:
+        err, reject_fmt = sys.stderr, "text"
+    out = open_output(args.output)
+    try:
+        if args.workers > 1:
+            import parallel_score
+            scored, rejected = parallel_score.score_parallel(
+                args.input, out, in_fmt, out_fmt,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                shard_bytes=args.shard_bytes,
+                ordered=not args.unordered,
+                table_path=args.table,
+                instrument=bool(args.instrument),
+                err=err,
+                reject_fmt=reject_fmt,
+                outputs=args.outputs,
+                rules_path=args.rules.path,
+            )
+        else:
+            inp = open_input(args.input)
+            try:
+                scorer = load_scorer(args.table, scorer_outputs(args.outputs, bool(args.instrument)), args.rules)
+                scored, rejected = score_stream(
+                    inp, out, in_fmt, out_fmt, args.chunk_size,
+                    instrumentation.instrumented(scorer),
+                    err, reject_fmt, output_fields(args.outputs), args.rules,
+                )
+            finally:
+                inp.close()
+    finally:
+        out.close()
+        if err is not sys.stderr:
+            err.close()
+    print(f"scored {scored}, rejected {rejected}", file=sys.stderr)
+    if args.instrument:
+        dump_instrumentation(args.instrument)
+    return 1 if rejected else 0
+
+
+def cmd_cohort(args: argparse.Namespace) -> int:
+    import cohort
+
+    def columns(inp: TextIO) -> Iterator[Dict[str, np.ndarray]]:
+        nonlocal rejected
+        for chunk in chunked(read_records(inp, _infer_format(args.input, args.input_format)), args.chunk_size):
+            ids, cols, rejects = parse_chunk(chunk)
+            for r in rejects:
+                sys.stderr.write(format_reject(r, "text"))
+            rejected += len(rejects)
+            if ids:
+                yield cols
+
+    rejected = 0
+    inp = open_input(args.input)
+    try:
+        stats = cohort.aggregate(columns(inp), load_scorer(args.table, rules=args.rules), rules=args.rules)
+    finally:
+        inp.close()
+    if args.json:
+        print(json.dumps(stats.to_dict(args.top), indent=2, ensure_ascii=False))
+    else:
+        print(cohort.format_summary(stats, args.top))
+    print(f"aggregated {stats.n}, rejected {rejected}", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+def cmd_render(args: argparse.Namespace) -> int:
+    in_fmt = _infer_format(args.input, args.input_format)
+    os.makedirs(args.output, exist_ok=True)
+    if args.rejects:
+        err, reject_fmt = open(args.rejects, "w", encoding="utf-8"), "jsonl"
+    else:
+        err, reject_fmt = sys.stderr, "text"
+    files = ReportFiles(args.output, args.format)
+    try:
+        if args.workers > 1:
+            import parallel_score
+            written, rejected = parallel_score.render_parallel(
+                args.input, files, in_fmt,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                table_path=args.table,
+                err=err,
+                reject_fmt=reject_fmt,
+                rules_path=args.rules.path,
+            )
+        else:
+            written = rejected = 0
+            scorer = load_scorer(args.table, rules=args.rules)
+            inp = open_input(args.input)
+            try:
+                for chunk in chunked(read_records(inp, in_fmt), args.chunk_size):
+                    rendered, rejects = render_chunk(chunk, args.output, args.format, scorer, files, args.rules)
+                    for r in rejects:
+                        err.write(format_reject(r, reject_fmt))
+                    written += len(rendered)
+                    rejected += len(rejects)
+            finally:
+                inp.close()
+    finally:
+        if err is not sys.stderr:
+            err.close()
+    if files.renamed:
+        print(f"{files.renamed} reports share a file name with an earlier record; "
+              f"written as <name>~<record number>.{args.format}", file=sys.stderr)
+    print(f"rendered {written}, rejected {rejected}", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+def _positive_int(v: str) -> int:
+    n = int(v)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {v}")
+    return n
+
+
+def _outputs(v: str) -> FrozenSet[str]:
+    try:
+        return projection(p.strip() for p in v.split(",") if p.strip())
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def rules_option(v: str) -> RuleSet:
+    # argparse type for --rules, shared with server.py and daemon.py
+    try:
+        return load_rules(v)
+    except RuleError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="healthsignal", description="HealthSignal headless tools.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("score", help="score intake records from CSV or JSONL")
+    s.add_argument("input", nargs="?", default="-", help="input file, or - for stdin (default)")
+    s.add_argument("-o", "--output", default="-", help="output file, or - for stdout (default)")
+    s.add_argument("--input-format", choices=("csv", "jsonl"),
+                   help="default: from the file extension, else jsonl")
+    s.add_argument("--output-format", choices=("csv", "jsonl"),
+                   help="default: from the file extension, else jsonl")
+    s.add_argument("--chunk-size", type=_positive_int, default=DEFAULT_CHUNK, help="records scored per batch")
+    s.add_argument("--table", help="score through a prebuilt score table (see score_table.py)")
+    s.add_argument("--rules", type=rules_option, default=RULES, metavar="VERSION",
+                   help=f"rule version under rules/, or a rule file, to score with (default: {RULES_VERSION})")
+    s.add_argument("--workers", type=_positive_int, default=1,
+                   help="worker processes; files are split into byte-range shards (default 1)")
+    s.add_argument("--shard-bytes", type=_positive_int, default=8 << 20,
+                   help="approximate input bytes per shard with --workers (default 8 MiB)")
+    s.add_argument("--unordered", action="store_true",
+                   help="with --workers, write shards as they finish instead of in input order")
+    s.add_argument("--rejects", metavar="FILE",
+                   help="write rejected records as JSONL with reason codes to FILE instead of stderr")
+    s.add_argument("--instrument", metavar="FILE",
+                   help="collect rule-hit counters and stage timings; write them as JSON to FILE (- for stderr)")
+    s.add_argument("--outputs", type=_outputs, metavar="LIST",
+                   help="comma-separated subset of levels,points,reasons,actions to compute and write (default: all)")
+    s.set_defaults(func=cmd_score)
+
+    c = sub.add_parser("cohort", help="score intake records and print cohort breakdowns")
+    c.add_argument("input", nargs="?", default="-", help="input file, or - for stdin (default)")
+    c.add_argument("--input-format", choices=("csv", "jsonl"),
+                   help="default: from the file extension, else jsonl")
+    c.add_argument("--chunk-size", type=_positive_int, default=DEFAULT_CHUNK, help="records scored per batch")
+    c.add_argument("--table", help="score through a prebuilt score table (see score_table.py)")
+    c.add_argument("--rules", type=rules_option, default=RULES, metavar="VERSION",
+                   help=f"rule version under rules/, or a rule file, to score with (default: {RULES_VERSION})")
+    c.add_argument("--top", type=_positive_int, default=5, help="driver combinations to list per domain")
+    c.add_argument("--json", action="store_true", help="print the full breakdown as JSON")
+    c.set_defaults(func=cmd_cohort)
+
+    r = sub.add_parser("render", help="render one Markdown or HTML report file per intake record")
+    r.add_argument("input", nargs="?", default="-", help="input file, or - for stdin (default)")
+    r.add_argument("-o", "--output", required=True, help="directory for the reports (<id>.md or <id>.html)")
+    r.add_argument("--format", choices=("md", "html"), default="md")
+    r.add_argument("--input-format", choices=("csv", "jsonl"),
+                   help="default: from the file extension, else jsonl")
+    r.add_argument("--chunk-size", type=_positive_int, default=DEFAULT_CHUNK, help="records rendered per batch")
+    r.add_argument("--table", help="score through a prebuilt score table (see score_table.py)")
+    r.add_argument("--rules", type=rules_option, default=RULES, metavar="VERSION",
+                   help=f"rule version under rules/, or a rule file, to score with (default: {RULES_VERSION})")
+    r.add_argument("--workers", type=_positive_int, default=1, help="worker processes (default 1)")
+    r.add_argument("--rejects", metavar="FILE",
+                   help="write rejected records as JSONL with reason codes to FILE instead of stderr")
+    r.set_defaults(func=cmd_render)
+    return ap
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = build_parser()
+    args = ap.parse_args(argv)
+    if args.table and args.rules.version != RULES_VERSION:
+        ap.error(f"score tables hold rules {RULES_VERSION} results; --table cannot score rules {args.rules.version}")
+    if getattr(args, "instrument", None) and args.rules.version != RULES_VERSION:
+        ap.error(f"--instrument counts rules {RULES_VERSION} only")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+# instrumentation.py
+#
+# Optional rule-hit counters and stage timings.
+#
+# Off by default: until enable() is called, current() is None, stage() hands
+# back a shared no-op context and instrumented()/score_all() go straight to
+# the engine. When on, counting works on rule masks (bit i = reason i of a
+# domain), so a batch costs one bincount per domain and a record a few list
+# increments; per-rule hits, override triggers and fallback actions are all
+# derived from the mask counts when a snapshot is taken. Stage timings go
+# into log2 nanosecond histograms.
+#
+# Exposed through snapshot(), `healthsignal.py score --instrument FILE`, the
+# service's GET /instrumentation and the app's Debug tab.
+from contextlib import contextmanager, nullcontext
+from time import perf_counter_ns
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Mapping, Optional
+
+import numpy as np
+
+from risk_engine import (
+    ACTION_IDS,
+    ACTIONS,
+    CARDIO_REASONS,
+    MASK_OVERRIDES,
+    MASK_RESULTS,
+    MAINTAIN_ACTIVITY,
+    MAINTAIN_SLEEP,
+    MSK_REASONS,
+    SLEEP_REASONS,
+    Assessment,
+    Inputs,
+    pick_action_codes,
+    rule_masks,
+)
+from risk_engine import score_all as _engine_score_all
+
+DOMAINS = (("cardio", CARDIO_REASONS), ("sleep", SLEEP_REASONS), ("msk", MSK_REASONS))
+HIST_BUCKETS = 64  # bucket b holds durations in [2**(b-1), 2**b) ns
+
+# mask -> rule bits, and mask -> override fired, per domain
+_BITS = {d: (np.arange(1 << len(r))[:, None] >> np.arange(len(r)) & 1) for d, r in DOMAINS}
+_OVERRIDE = {d: np.array([MASK_OVERRIDES[d](m) for m in range(1 << len(r))]) for d, r in DOMAINS}
+_NOOP = nullcontext()
+
+
+class Instrumentation:
+    def __init__(self) -> None:
+        self.records = 0
+        self.masks: Dict[str, List[int]] = {d: [0] * (1 << len(r)) for d, r in DOMAINS}
+        self.action_slots = [[0] * len(ACTIONS) for _ in range(2)]
+        self.stage_hist: Dict[str, List[int]] = {}
+        self.stage_ns: Dict[str, int] = {}
+
+    def count(self, cardio_mask: int, sleep_mask: int, msk_mask: int, action1: int, action2: int) -> None:
+        self.records += 1
+        self.masks["cardio"][cardio_mask] += 1
+        self.masks["sleep"][sleep_mask] += 1
+        self.masks["msk"][msk_mask] += 1
+        self.action_slots[0][action1] += 1
+        self.action_slots[1][action2] += 1
+
+    def count_batch(self, result: Mapping[str, np.ndarray]) -> None:
+        for d, _ in DOMAINS:
+            counts = self.masks[d]
+            for m, c in enumerate(np.bincount(result[f"{d}_mask"], minlength=len(counts)).tolist()):
+                counts[m] += c
+        for slot in range(2):
+            counts = np.bincount(result["actions"][:, slot], minlength=len(ACTIONS)).tolist()
+            self.action_slots[slot] = [a + b for a, b in zip(self.action_slots[slot], counts)]
+        self.records += len(result["actions"])
+
+    def time_ns(self, stage: str, ns: int) -> None:
+        hist = self.stage_hist.get(stage)
+        if hist is None:
+            hist = self.stage_hist[stage] = [0] * HIST_BUCKETS
+            self.stage_ns[stage] = 0
+        hist[min(ns.bit_length(), HIST_BUCKETS - 1)] += 1
+        self.stage_ns[stage] += ns
+
+    def merge(self, other: "Instrumentation") -> None:
+        self.records += other.records
+        for d, counts in other.masks.items():
+            self.masks[d] = [a + b for a, b in zip(self.masks[d], counts)]
+        for slot in range(2):
+            self.action_slots[slot] = [a + b for a, b in zip(self.action_slots[slot], other.action_slots[slot])]
+        for stage, hist in other.stage_hist.items():
+            mine = self.stage_hist.setdefault(stage, [0] * HIST_BUCKETS)
+            self.stage_hist[stage] = [a + b for a, b in zip(mine, hist)]
+            self.stage_ns[stage] = self.stage_ns.get(stage, 0) + other.stage_ns[stage]
+
+    def snapshot(self) -> Dict[str, Any]:
+        rules: Dict[str, Dict[str, int]] = {}
+        overrides: Dict[str, int] = {}
+        for d, reasons in DOMAINS:
+            counts = np.array(self.masks[d], dtype=np.int64)
+            rules[d] = dict(zip(reasons, (counts @ _BITS[d]).tolist()))
+            if _OVERRIDE[d].any():
+                overrides[d] = int(counts[_OVERRIDE[d]].sum())
+        slots = self.action_slots
+        return {
+            "records": self.records,
+            "rule_hits": rules,
+            "override_triggers": overrides,
+            "actions": {ACTION_IDS[a]: slots[0][a] + slots[1][a] for a in range(len(ACTIONS))},
+            "fallback_actions": {
+                ACTION_IDS[MAINTAIN_SLEEP]: slots[0][MAINTAIN_SLEEP] + slots[1][MAINTAIN_SLEEP],
+                ACTION_IDS[MAINTAIN_ACTIVITY]: slots[0][MAINTAIN_ACTIVITY] + slots[1][MAINTAIN_ACTIVITY],
+            },
+            "stages": {s: _stage_summary(h, self.stage_ns[s]) for s, h in self.stage_hist.items()},
+        }
+
+
+def _stage_summary(hist: List[int], total_ns: int) -> Dict[str, Any]:
+    # Percentiles are bucket upper bounds, i.e. within 2x of the true value.
+    n = sum(hist)
+    cum = np.cumsum(hist)
+
+    def pct(p: float) -> float:
+        b = int(np.searchsorted(cum, p * n))
+        return round((1 << b) / 1000, 3)
+
+    return {
+        "count": n,
+        "total_ms": round(total_ns / 1e6, 3),
+        "mean_us": round(total_ns / n / 1000, 3) if n else 0.0,
+        "p50_us_le": pct(0.50) if n else 0.0,
+        "p99_us_le": pct(0.99) if n else 0.0,
+    }
+
+
+_current: Optional[Instrumentation] = None
+
+
+def enable() -> Instrumentation:
+    """Start collecting (idempotent); returns the live instance."""
+    global _current
+    if _current is None:
+        _current = Instrumentation()
+    return _current
+
+
+def disable() -> None:
+    global _current
+    _current = None
+
+
+def current() -> Optional[Instrumentation]:
+    return _current
+
+
+def take() -> Optional[Instrumentation]:
+    """Detach the collected data and keep collecting into a fresh instance (None when off)."""
+    global _current
+    if _current is None:
+        return None
+    taken, _current = _current, Instrumentation()
+    return taken
+
+
+def snapshot() -> Optional[Dict[str, Any]]:
+    return None if _current is None else _current.snapshot()
+
+
+@contextmanager
+def _timed(inst: Instrumentation, name: str) -> Iterator[None]:
+    t0 = perf_counter_ns()
+    try:
+        yield
+    finally:
+        inst.time_ns(name, perf_counter_ns() - t0)
+
+
+def stage(name: str) -> ContextManager[None]:
+    inst = _current
+    return _NOOP if inst is None else _timed(inst, name)
+
+
+def instrumented(scorer: Callable[[Mapping[str, np.ndarray]], Dict[str, np.ndarray]]):
+    """Wrap a batch scorer (score_batch signature) to time it and count its rule hits."""
+    def score(cols: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        inst = _current
+        if inst is None:
+            return scorer(cols)
+        t0 = perf_counter_ns()
+        result = scorer(cols)
+        inst.time_ns("score", perf_counter_ns() - t0)
+        inst.count_batch(result)
+        return result
+    return score
+
+
+_CARDIO, _SLEEP, _MSK = (MASK_RESULTS[d] for d, _ in DOMAINS)
+
+
+def score_all(x: Inputs) -> Assessment:
+    """risk_engine.score_all, with rules/levels/actions timings and counts when enabled."""
+    inst = _current
+    if inst is None:
+        return _engine_score_all(x)
+    t0 = perf_counter_ns()
+    c, s, m = rule_masks(x)
+    t1 = perf_counter_ns()
+    cardio, sleep, msk = _CARDIO[c], _SLEEP[s], _MSK[m]
+    t2 = perf_counter_ns()
+    a1, a2 = pick_action_codes(cardio[0], sleep[0], msk[0], c, s, m)
+    t3 = perf_counter_ns()
+    inst.time_ns("rules", t1 - t0)
+    inst.time_ns("levels", t2 - t1)
+    inst.time_ns("actions", t3 - t2)
+    inst.count(c, s, m, a1, a2)
+    return Assessment(
+        cardio=(cardio[0], cardio[1], list(cardio[2])),
+        sleep=(sleep[0], sleep[1], list(sleep[2])),
+        msk=(msk[0], msk[1], list(msk[2])),
+        actions=[dict(ACTIONS[a1]), dict(ACTIONS[a2])],
+    )
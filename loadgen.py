@@ -0,0 +1,100 @@
+# loadgen.py
+#
+# Load generator for server.py: N keep-alive connections each send requests
+# back to back, then per-request latency and throughput are reported.
+#
+#   python loadgen.py --port 8080 --connections 32 --requests 20000 [--batch 10]
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import asdict
+from typing import List, Optional
+
+from test_cases import persona_a, persona_b, persona_c
+
+PERSONAS = [asdict(p) for p in (persona_a, persona_b, persona_c)]
+
+
+def _request(host: str, path: str, body: bytes) -> bytes:
+    return (
+        f"POST {path} HTTP/1.1\r\n"
+        f"Host: {host}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode("latin-1") + body
+
+
+async def _read_response(reader: asyncio.StreamReader) -> int:
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        if k.strip().lower() == "content-length":
+            length = int(v)
+    await reader.readexactly(length)
+    return status
+
+
+async def _connection(host: str, port: int, payloads: List[bytes], latencies: List[float], errors: List[int]) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for req in payloads:
+            t0 = time.perf_counter()
+            writer.write(req)
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - t0)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(host: str, port: int, connections: int, requests: int, batch: int) -> dict:
+    if batch > 1:
+        body = json.dumps([PERSONAS[i % len(PERSONAS)] for i in range(batch)]).encode()
+        bodies = [_request(host, "/score/batch", body)]
+    else:
+        bodies = [_request(host, "/score", json.dumps(p).encode()) for p in PERSONAS]
+    per_conn = [
+        [bodies[i % len(bodies)] for i in range(c, requests, connections)]
+        for c in range(connections)
+    ]
+    latencies: List[float] = []
+    errors: List[int] = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_connection(host, port, p, latencies, errors) for p in per_conn))
+    elapsed = time.perf_counter() - t0
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "records": len(latencies) * batch,
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "records_per_s": round(len(latencies) * batch / elapsed, 1),
+        "latency_ms": {"p50": pct(0.50), "p99": pct(0.99), "max": pct(1.0)},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Load generator for server.py.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--connections", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=20000)
+    ap.add_argument("--batch", type=int, default=1, help="records per request; >1 uses /score/batch")
+    args = ap.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args.host, args.port, args.connections, args.requests, args.batch)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
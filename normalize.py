@@ -0,0 +1,320 @@
+# normalize.py
+#
+# Bulk validation and normalization of raw intake values, one pass per column:
+#
+#   batch = normalize_records(raw_records)   # JSON strings or dicts
+#   score_batch(batch.cols)                   # valid rows only
+#
+# Bucket values and their aliases ("mid", "MID (2–3x/week)", "6–7", "sometimes
+# high", "n/a") map to CATEGORIES codes through a per-field lookup. A value not
+# seen before is normalized once and cached, so a column costs one dict lookup
+# per row. Numbers are converted with one NumPy call per column and
+# range-checked (age must also be a whole number: 38.9 is rejected, not
+# truncated to 38); only the failing rows are looked at again to name the
+# problem. Nothing raises: bad rows come back with reason codes and the rest
+# are scored as usual.
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from risk_engine import BOOL_FIELDS, CATEGORIES
+
+# Reason codes
+MISSING = "missing"
+NOT_A_NUMBER = "not_a_number"
+OUT_OF_RANGE = "out_of_range"
+NOT_AN_INTEGER = "not_an_integer"
+NOT_A_BOOLEAN = "not_a_boolean"
+UNKNOWN_VALUE = "unknown_value"
+INVALID_JSON = "invalid_json"
+NOT_AN_OBJECT = "not_an_object"
+REASON_CODES: Tuple[str, ...] = (
+    MISSING, NOT_A_NUMBER, OUT_OF_RANGE, NOT_AN_INTEGER, NOT_A_BOOLEAN, UNKNOWN_VALUE, INVALID_JSON,
+    NOT_AN_OBJECT,
+)
+
+# Plausible adult values; wider than the app's inputs so imported data is not
+# clipped to what the form allows.
+RANGES: Dict[str, Tuple[float, float]] = {
+    "age": (18, 120),
+    "height_cm": (100.0, 250.0),
+    "weight_kg": (25.0, 350.0),
+}
+NUMBER_FIELDS: Tuple[str, ...] = tuple(RANGES)
+INTEGER_FIELDS: Tuple[str, ...] = ("age",)  # whole numbers only
+
+# Extra spellings, keyed like _key() output. Canonical values need no entry.
+_UNKNOWN = {"UNK": "UNKNOWN", "N/A": "UNKNOWN", "NA": "UNKNOWN", "NOT_SURE": "UNKNOWN"}
+ALIASES: Dict[str, Dict[str, str]] = {
+    "sex": {"M": "Male", "F": "Female"},
+    "exercise_bucket": {"MEDIUM": "MID", "MODERATE": "MID"},
+    "smoking_vaping": {"Y": "YES", "N": "NO", **_UNKNOWN},
+    "sleep_duration_bucket": dict(_UNKNOWN),
+    "bp_bucket": dict(_UNKNOWN),
+    "ldl_bucket": dict(_UNKNOWN),
+    "a1c_bucket": dict(_UNKNOWN),
+    "rhr_bucket": dict(_UNKNOWN),
+}
+_TRUE = {"TRUE", "1", "YES", "Y"}
+_FALSE = {"FALSE", "0", "NO", "N"}
+
+_MISSING_CODE = -2
+_UNKNOWN_CODE = -1
+_CACHE_LIMIT = 4096  # per field; stops junk values from growing the caches
+
+
+@dataclass(frozen=True)
+class Problem:
+    field: str  # "" for problems with the record as a whole
+    code: str
+    value: Any = None
+
+    def describe(self) -> str:
+        v = self.value
+        if self.code == MISSING:
+            return f"{self.field}: missing"
+        if self.code == NOT_A_NUMBER:
+            return f"{self.field}: expected a number, got {v!r}"
+        if self.code == OUT_OF_RANGE:
+            lo, hi = RANGES[self.field]
+            return f"{self.field}: {v!r} is outside {lo}..{hi}"
+        if self.code == NOT_AN_INTEGER:
+            return f"{self.field}: expected a whole number, got {v!r}"
+        if self.code == NOT_A_BOOLEAN:
+            return f"{self.field}: expected a boolean, got {v!r}"
+        if self.code == UNKNOWN_VALUE:
+            return f"{self.field}: {v!r} is not one of {', '.join(CATEGORIES[self.field])}"
+        if self.code == INVALID_JSON:
+            return f"invalid JSON: {v}"
+        return "expected a JSON object"
+
+
+@dataclass(frozen=True)
+class Reject:
+    record: int
+    id: Any
+    problems: Tuple[Problem, ...]
+
+    def message(self) -> str:
+        return "; ".join(p.describe() for p in self.problems)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "record": self.record,
+            "id": self.id,
+            "reasons": [{"field": p.field, "code": p.code, "value": p.value} for p in self.problems],
+        }
+
+
+def _key(v: Any) -> str:
+    # "MID (2–3x/week)" -> "MID", " sometimes high" -> "SOMETIMES_HIGH", "6–7" -> "6-7"
+    s = str(v).split("(", 1)[0].upper().replace("–", "-").replace("—", "-")
+    return "_".join(s.split())
+
+
+def _is_blank(v: Any) -> bool:
+    return v is None or (isinstance(v, str) and not v.strip())
+
+
+class _Lookup(dict):
+    """raw value -> code, filling itself from `resolve` on first sight of a value."""
+
+    def __init__(self, resolve, seed: Mapping[Any, int]):
+        super().__init__(seed)
+        self.resolve = resolve
+
+    def __missing__(self, v: Any) -> int:
+        code = _MISSING_CODE if _is_blank(v) else self.resolve(v)
+        if len(self) < _CACHE_LIMIT:
+            self[v] = code
+        return code
+
+
+def _category_lookup(field: str) -> _Lookup:
+    keys = {_key(v): i for i, v in enumerate(CATEGORIES[field])}
+    keys.update({k: CATEGORIES[field].index(v) for k, v in ALIASES.get(field, {}).items()})
+    seed = {v: i for i, v in enumerate(CATEGORIES[field])}
+    return _Lookup(lambda v: keys.get(_key(v), _UNKNOWN_CODE), seed)
+
+
+def _bool_code(v: Any) -> int:
+    if isinstance(v, (int, float)) and v in (0, 1):
+        return int(v)
+    s = str(v).strip().upper()
+    return 1 if s in _TRUE else 0 if s in _FALSE else _UNKNOWN_CODE
+
+
+_LOOKUPS: Dict[str, _Lookup] = {f: _category_lookup(f) for f in CATEGORIES}
+_BOOL_LOOKUP = _Lookup(_bool_code, {True: 1, False: 0})
+
+
+def _codes(lookup: _Lookup, values: Sequence[Any]) -> np.ndarray:
+    try:
+        codes = list(map(lookup.__getitem__, values))
+    except TypeError:  # unhashable values (lists, dicts)
+        codes = [_lookup_one(lookup, v) for v in values]
+    return np.array(codes, dtype=np.int8)
+
+
+def _coded_problems(field: str, codes: np.ndarray, values: Sequence[Any], bad_code: str,
+                    problems: Dict[int, List[Problem]]) -> None:
+    for i in np.flatnonzero(codes < 0).tolist():
+        code = MISSING if codes[i] == _MISSING_CODE else bad_code
+        problems.setdefault(i, []).append(Problem(field, code, None if code == MISSING else values[i]))
+
+
+def _numbers(field: str, values: Sequence[Any], problems: Dict[int, List[Problem]]) -> np.ndarray:
+    lo, hi = RANGES[field]
+    try:
+        arr = np.array(values, dtype=np.float64)  # None -> nan; numeric strings parse
+    except (TypeError, ValueError):
+        arr = np.array([_to_float(v) for v in values], dtype=np.float64)
+    in_range = (arr >= lo) & (arr <= hi)  # also false for nan
+    ok = in_range & (arr == np.floor(arr)) if field in INTEGER_FIELDS else in_range
+    if not ok.all():
+        for i in np.flatnonzero(~ok).tolist():
+            v = values[i]
+            if _is_blank(v):
+                p = Problem(field, MISSING)
+            elif isinstance(v, bool) or np.isnan(_to_float(v)):
+                p = Problem(field, NOT_A_NUMBER, v)
+            elif in_range[i]:
+                p = Problem(field, NOT_AN_INTEGER, v)
+            else:
+                p = Problem(field, OUT_OF_RANGE, v)
+            problems.setdefault(i, []).append(p)
+    return arr
+
+
+def _to_float(v: Any) -> float:
+    if isinstance(v, bool):
+        return float("nan")
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def normalize_columns(raw: Mapping[str, Sequence[Any]], n: int) -> Tuple[Dict[str, np.ndarray], Dict[int, List[Problem]]]:
+    """Canonical columns for all n rows, and row -> problems for the rows to reject.
+
+    Categoricals come back as CATEGORIES codes, flags as bool, age as int64
+    and height/weight as float64 (score_batch accepts all of these). Values in
+    rejected rows are placeholders. Absent columns count as missing.
+    """
+    problems: Dict[int, List[Problem]] = {}
+    blank = [None] * n
+    cols: Dict[str, np.ndarray] = {}
+    for f in NUMBER_FIELDS:
+        cols[f] = _numbers(f, raw.get(f, blank), problems)
+    cols["age"] = np.nan_to_num(cols["age"]).astype(np.int64)
+    for f in BOOL_FIELDS:
+        values = raw.get(f, blank)
+        codes = _codes(_BOOL_LOOKUP, values)
+        _coded_problems(f, codes, values, NOT_A_BOOLEAN, problems)
+        cols[f] = codes > 0
+    for f in CATEGORIES:
+        values = raw.get(f, blank)
+        codes = _codes(_LOOKUPS[f], values)
+        _coded_problems(f, codes, values, UNKNOWN_VALUE, problems)
+        cols[f] = np.maximum(codes, 0).astype(np.uint8)
+    return cols, problems
+
+
+@dataclass
+class Batch:
+    cols: Dict[str, np.ndarray]  # usable rows only
+    rows: np.ndarray             # their positions in the input
+    ids: List[Any]               # "id" of every input record (None when absent)
+    rejects: Dict[int, Tuple[Problem, ...]]  # input position -> problems
+
+
+def _decode(raw: Any) -> Tuple[Optional[Mapping[str, Any]], Optional[Problem]]:
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except json.JSONDecodeError as e:
+            return None, Problem("", INVALID_JSON, e.msg)
+    if not isinstance(raw, Mapping):
+        return None, Problem("", NOT_AN_OBJECT)
+    return raw, None
+
+
+def normalize_records(records: Sequence[Any]) -> Batch:
+    """Normalize raw records (dicts, or JSON object strings) into score_batch columns."""
+    n = len(records)
+    decoded: List[Mapping[str, Any]] = []
+    early: Dict[int, List[Problem]] = {}
+    for i, raw in enumerate(records):
+        rec, problem = _decode(raw)
+        if problem is not None:
+            early[i] = [problem]
+            rec = {}
+        decoded.append(rec)
+    fields = (*NUMBER_FIELDS, *BOOL_FIELDS, *CATEGORIES)
+    raw_cols = {f: [r.get(f) for r in decoded] for f in fields}
+    cols, problems = normalize_columns(raw_cols, n)
+    problems.update(early)  # an undecodable record only reports that
+    ids = [r.get("id") for r in decoded]
+    if not problems:
+        return Batch(cols, np.arange(n), ids, {})
+    keep = np.ones(n, dtype=bool)
+    keep[list(problems)] = False
+    rows = np.flatnonzero(keep)
+    return Batch(
+        {f: c[keep] for f, c in cols.items()},
+        rows,
+        ids,
+        {i: tuple(p) for i, p in sorted(problems.items())},
+    )
+
+
+def normalize_record(raw: Any) -> Tuple[Any, Dict[str, Any], Tuple[Problem, ...]]:
+    """One record as (id, Inputs field values with canonical strings, problems)."""
+    rec, problem = _decode(raw)
+    if problem is not None:
+        return None, {}, (problem,)
+    problems: List[Problem] = []
+    values: Dict[str, Any] = {}
+    for f in NUMBER_FIELDS:
+        v = rec.get(f)
+        x = _to_float(v)
+        lo, hi = RANGES[f]
+        if lo <= x <= hi and f in INTEGER_FIELDS and x != int(x):
+            problems.append(Problem(f, NOT_AN_INTEGER, v))
+        elif lo <= x <= hi:
+            values[f] = int(x) if f in INTEGER_FIELDS else x
+        elif _is_blank(v):
+            problems.append(Problem(f, MISSING))
+        else:
+            problems.append(Problem(f, NOT_A_NUMBER if x != x else OUT_OF_RANGE, v))
+    for f in BOOL_FIELDS:
+        v = rec.get(f)
+        code = _lookup_one(_BOOL_LOOKUP, v)
+        if code >= 0:
+            values[f] = bool(code)
+        else:
+            problems.append(Problem(f, NOT_A_BOOLEAN, v) if code == _UNKNOWN_CODE else Problem(f, MISSING))
+    for f, allowed in CATEGORIES.items():
+        v = rec.get(f)
+        code = _lookup_one(_LOOKUPS[f], v)
+        if code >= 0:
+            values[f] = allowed[code]
+        else:
+            problems.append(Problem(f, UNKNOWN_VALUE, v) if code == _UNKNOWN_CODE else Problem(f, MISSING))
+    return rec.get("id"), values, tuple(problems)
+
+
+def _lookup_one(lookup: _Lookup, v: Any) -> int:
+    try:
+        return lookup[v]
+    except TypeError:
+        return _UNKNOWN_CODE
+
+
+def canonical(field: str, value: Any) -> Optional[str]:
+    """Canonical bucket value for a raw value or alias, or None if unknown."""
+    code = _lookup_one(_LOOKUPS[field], value)
+    return CATEGORIES[field][code] if code >= 0 else None
@@ -0,0 +1,264 @@
+# parallel_score.py
+#
+# Multi-process bulk scoring behind `healthsignal.py score --workers N`.
+#
+# Files are split into byte-range shards. A shard owns every line that starts
+# inside its range, so workers agree on boundaries without coordination. A
+# cheap counting pass gives each shard its first record number; the scoring
+# pass then runs the same parse/score/format code as the single-process path,
+# so ordered output is byte-identical to it. stdin cannot be sharded and is
+# dispatched to the pool in record chunks instead, as are report renders
+# (render_parallel), whose output goes to per-record files.
+#
+# A CSV record whose quoted field holds a line break spans several lines, so
+# a byte-range boundary could split it. The counting pass looks for such
+# fields (a line with an odd number of quote characters); if any shard has
+# one, the file is read in order and dispatched in record chunks like stdin.
+import csv
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import accumulate
+from typing import Any, Callable, FrozenSet, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+import healthsignal as hs
+import instrumentation
+from risk_engine import RULES
+from rules import RuleSet, load_rules
+
+Shard = Tuple[int, int]  # [start, end) byte offsets
+# output (formatted text, or rendered report files), rejects, records,
+# instrumentation collected by the job (None when off)
+ChunkResult = Tuple[Any, List[hs.Reject], int, Optional[instrumentation.Instrumentation]]
+
+_scorer: Optional[hs.Scorer] = None
+_out_fields: Tuple[str, ...] = hs.OUTPUT_FIELDS
+_rules: RuleSet = RULES
+
+
+def _init_worker(
+    table_path: Optional[str], instrument: bool, outputs: Optional[FrozenSet[str]] = None,
+    rules_path: Optional[str] = None,
+) -> None:
+    global _scorer, _out_fields, _rules
+    _rules = load_rules(rules_path) if rules_path else RULES
+    _scorer = hs.load_scorer(table_path, hs.scorer_outputs(outputs, instrument), _rules)
+    _out_fields = hs.output_fields(outputs)
+    if instrument:
+        instrumentation.enable()
+        _scorer = instrumentation.instrumented(_scorer)
+
+
+def plan_shards(path: str, in_fmt: str, shard_bytes: int) -> Tuple[Optional[List[str]], int, List[Shard]]:
+    """Returns (CSV header or None, offset of the first data byte, shards)."""
+    header = None
+    data_start = 0
+    if in_fmt == "csv":
+        with open(path, "rb") as f:
+            first = f.readline()
+        data_start = len(first)
+        header = next(csv.reader([first.decode("utf-8")]), [])
+    size = os.path.getsize(path)
+    shards = [(s, min(s + shard_bytes, size)) for s in range(data_start, size, shard_bytes)]
+    return header, data_start, shards
+
+
+def _shard_lines(path: str, shard: Shard, data_start: int) -> Iterator[str]:
+    start, end = shard
+    with open(path, "rb", buffering=hs.IO_BUFFER) as f:
+        if start > data_start:
+            # The line straddling `start` belongs to the previous shard.
+            f.seek(start - 1)
+            pos = start - 1 + len(f.readline())
+        else:
+            f.seek(start)
+            pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                return
+            pos += len(line)
+            yield line.decode("utf-8")
+
+
+def _shard_records(
+    path: str, shard: Shard, data_start: int, in_fmt: str, header: Optional[List[str]],
+) -> Iterator[Tuple[int, Any]]:
+    return hs.read_records(_shard_lines(path, shard, data_start), in_fmt, header)
+
+
+def _count_shard(
+    path: str, shard: Shard, data_start: int, in_fmt: str, header: Optional[List[str]],
+) -> Tuple[int, bool]:
+    """(records in the shard, whether a quoted CSV field spans a line break in it)."""
+    if in_fmt != "csv":
+        return sum(1 for _ in _shard_records(path, shard, data_start, in_fmt, header)), False
+    spans = False
+
+    def lines() -> Iterator[str]:
+        nonlocal spans
+        for line in _shard_lines(path, shard, data_start):
+            spans = spans or line.count('"') % 2 == 1
+            yield line
+
+    n = sum(1 for _ in hs.read_records(lines(), in_fmt, header))
+    return n, spans
+
+
+def _score_records(records: Iterable[Tuple[int, Any]], out_fmt: str, chunk_size: int) -> ChunkResult:
+    parts: List[str] = []
+    rejects: List[hs.Reject] = []
+    n = 0
+    for chunk in hs.chunked(records, chunk_size):
+        text, rej = hs.score_chunk(chunk, out_fmt, _scorer, _out_fields, _rules)
+        parts.append(text)
+        rejects.extend(rej)
+        n += len(chunk)
+    return "".join(parts), rejects, n, instrumentation.take()
+
+
+def _score_shard(
+    path: str, shard: Shard, data_start: int, in_fmt: str, header: Optional[List[str]],
+    base: int, out_fmt: str, chunk_size: int,
+) -> ChunkResult:
+    records = ((base + n, raw) for n, raw in _shard_records(path, shard, data_start, in_fmt, header))
+    return _score_records(records, out_fmt, chunk_size)
+
+
+def _score_chunk(chunk: List[Tuple[int, Any]], out_fmt: str) -> ChunkResult:
+    text, rejects = hs.score_chunk(chunk, out_fmt, _scorer, _out_fields, _rules)
+    return text, rejects, len(chunk), instrumentation.take()
+
+
+def _render_chunk(chunk: List[Tuple[int, Any]], out_dir: str, fmt: str) -> ChunkResult:
+    rendered, rejects = hs.render_chunk(chunk, out_dir, fmt, _scorer, rules=_rules)
+    return rendered, rejects, len(chunk), instrumentation.take()
+
+
+def _run(
+    pool: ProcessPoolExecutor,
+    jobs: Iterable[Tuple[Callable[..., ChunkResult], tuple]],
+    window: int,
+    ordered: bool,
+) -> Iterator[ChunkResult]:
+    # At most `window` jobs in flight, which bounds buffered output.
+    if ordered:
+        queue: "deque[Future]" = deque()
+        for fn, args in jobs:
+            queue.append(pool.submit(fn, *args))
+            if len(queue) >= window:
+                yield queue.popleft().result()
+        while queue:
+            yield queue.popleft().result()
+        return
+
+    pending: Set[Future] = set()
+    for fn, args in jobs:
+        pending.add(pool.submit(fn, *args))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                yield f.result()
+    for f in wait(pending).done:
+        yield f.result()
+
+
+def score_parallel(
+    path: str,
+    out: TextIO,
+    in_fmt: str,
+    out_fmt: str,
+    workers: int,
+    chunk_size: int = hs.DEFAULT_CHUNK,
+    shard_bytes: int = 8 << 20,
+    ordered: bool = True,
+    table_path: Optional[str] = None,
+    instrument: bool = False,
+    err: TextIO = sys.stderr,
+    reject_fmt: str = "text",
+    outputs: Optional[FrozenSet[str]] = None,
+    rules_path: Optional[str] = None,
+) -> Tuple[int, int]:
+    """Parallel counterpart of healthsignal.score_stream; returns (scored, rejected).
+
+    With ``instrument``, worker counters and timings are merged into this
+    process's instrumentation.current(). ``outputs`` projects the results
+    as healthsignal.py score --outputs does, and workers score with the
+    rule file at ``rules_path`` (default: the engine's rules).
+    """
+    scored = rejected = 0
+    if out_fmt == "csv":
+        out.write(hs.csv_header(hs.output_fields(outputs)))
+
+    initargs = (table_path, instrument, outputs, rules_path)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+        jobs: Optional[Iterable[Tuple[Callable[..., ChunkResult], tuple]]] = None
+        if path != "-":
+            header, data_start, shards = plan_shards(path, in_fmt, shard_bytes)
+            count = partial(_count_shard, path, data_start=data_start, in_fmt=in_fmt, header=header)
+            counted = list(pool.map(count, shards))
+            if not any(spans for _, spans in counted):
+                bases = [0, *accumulate(n for n, _ in counted)][:-1]
+                jobs = (
+                    (_score_shard, (path, s, data_start, in_fmt, header, base, out_fmt, chunk_size))
+                    for s, base in zip(shards, bases)
+                )
+        inp = None
+        if jobs is None:  # stdin, or records spanning lines
+            inp = hs.open_input(path)
+            records = hs.read_records(inp, in_fmt)
+            jobs = ((_score_chunk, (chunk, out_fmt)) for chunk in hs.chunked(records, chunk_size))
+
+        collected = instrumentation.enable() if instrument else None
+        try:
+            for text, rejects, n, inst in _run(pool, jobs, window=2 * workers, ordered=ordered):
+                out.write(text)
+                if collected is not None and inst is not None:
+                    collected.merge(inst)
+                for r in rejects:
+                    err.write(hs.format_reject(r, reject_fmt))
+                rejected += len(rejects)
+                scored += n - len(rejects)
+        finally:
+            if inp is not None and path != "-":
+                inp.close()
+
+    out.flush()
+    return scored, rejected
+
+
+def render_parallel(
+    path: str,
+    files: hs.ReportFiles,
+    in_fmt: str,
+    workers: int,
+    chunk_size: int = hs.DEFAULT_CHUNK,
+    table_path: Optional[str] = None,
+    err: TextIO = sys.stderr,
+    reject_fmt: str = "text",
+    rules_path: Optional[str] = None,
+) -> Tuple[int, int]:
+    """Parallel `healthsignal.py render`: record chunks go to the pool; returns (written, rejected).
+
+    Workers write reports to temporary files; they are named here, in input
+    order, so colliding ids resolve the same way as in a single process.
+    """
+    written = rejected = 0
+    inp = hs.open_input(path)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(table_path, False, None, rules_path)) as pool:
+            jobs = (
+                (_render_chunk, (chunk, files.out_dir, files.fmt))
+                for chunk in hs.chunked(hs.read_records(inp, in_fmt), chunk_size)
+            )
+            for rendered, rejects, _, _ in _run(pool, jobs, window=2 * workers, ordered=True):
+                files.place(rendered)
+                for r in rejects:
+                    err.write(hs.format_reject(r, reject_fmt))
+                rejected += len(rejects)
+                written += len(rendered)
+    finally:
+        inp.close()
+    return written, rejected
@@ -0,0 +1,259 @@
+# report.py
+#
+# Report content for the app and for bulk rendering, cached across sessions.
+#
+# A report depends only on the fields that reach the scorers, so it is keyed
+# by score_table.key_of(x) (height/weight collapse to the excess weight
+# signal). Reports and their rendered markdown are immutable and live in a
+# bounded LRU cache at module level: Streamlit imports this module once per
+# process, so identical intakes from different sessions share one entry.
+#
+# Bulk rendering (`healthsignal.py render`) turns score_batch results into
+# whole Markdown or HTML documents. Documents are cached per compact result
+# code and built from cached fragments (one per domain result and per action),
+# so people with the same levels, reasons and actions share one rendering.
+# Compact codes hold the engine's rules; results of other rules (`--rules`)
+# are grouped by their raw columns instead.
+# HTML is derived from the Markdown fragments by a small converter that only
+# knows the constructs used here, so the two formats cannot drift.
+import html
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+import counterfactual
+import instrumentation
+from compact import decode_result, pack_results
+from risk_engine import RULES, RULES_VERSION, Inputs, Likelihood, batch_row
+from rules import RuleSet
+from score_table import ScoreTable, key_inputs, key_of
+
+REPORT_CACHE_SIZE = 4096
+
+DomainResult = Tuple[Likelihood, int, Tuple[str, ...]]
+
+# Static sections, rendered once.
+WARNING_SIGNALS_MD: Tuple[str, ...] = (
+    "## Early Warning Signals",
+    "- Blood pressure trending up (esp. consistent >130/85 at home)",
+    "- Waist/weight trend increasing over 2–3 months",
+    "- Sleep <6 hours on multiple nights/week",
+    "- Resting HR trending upward (if tracked)",
+)
+DEPRIORITIZATION_MD: Tuple[str, ...] = (
+    "## What you do **NOT** need to worry about right now",
+    "- Continuous glucose monitors\n"
+    "- Advanced lipid panels\n"
+    "- VO₂ max testing\n"
+    "- Supplement stacks\n"
+    "- Extreme diets/biohacks",
+)
+DISCLAIMER = (
+    "Decision support only. Not diagnosis or treatment. Seek clinical care for concerning symptoms or major changes."
+)
+
+RISK_SUMMARY_HEADING = "## Risk Summary (5–10 year horizon)"
+PRIORITY_ACTIONS_HEADING = "## Priority Actions (next 90 days)"
+DOMAIN_TEMPLATE = "**{title} — {level}**  \nDrivers: {drivers}"
+ACTION_TEMPLATE = "**Action {i}: {title}**  \nTarget: {target}  \nWhy: {why}"
+# (Report field, summary title), in display order
+SUMMARY_DOMAINS: Tuple[Tuple[str, str], ...] = (
+    ("cardio", "Cardiometabolic risk"),
+    ("msk", "Musculoskeletal / energy decline"),
+    ("sleep", "Sleep / stress load"),
+)
+
+
+@dataclass(frozen=True)
+class Report:
+    cardio: DomainResult
+    sleep: DomainResult
+    msk: DomainResult
+    actions: Tuple[Tuple[str, str, str], ...]  # (title, target, why)
+    risk_summary_md: Tuple[str, ...]
+    priority_actions_md: Tuple[str, ...]
+
+    def debug(self) -> Dict[str, object]:
+        return {
+            "cardiometabolic": {"level": self.cardio[0], "points": self.cardio[1], "drivers": list(self.cardio[2])},
+            "sleep_stress": {"level": self.sleep[0], "points": self.sleep[1], "drivers": list(self.sleep[2])},
+            "msk_energy": {"level": self.msk[0], "points": self.msk[1], "drivers": list(self.msk[2])},
+            "actions_selected": [a[0] for a in self.actions],
+        }
+
+
+def _score_with_rules(x: Inputs):
+    r = instrumentation.score_all(x) if _rules is RULES else _rules.score(x)
+    return r.cardio, r.sleep, r.msk, r.actions
+
+
+_scorer: Callable[[Inputs], tuple] = _score_with_rules
+_table: Optional[ScoreTable] = None
+_rules: RuleSet = RULES
+
+
+def use_score_table(table: Optional[ScoreTable]) -> None:
+    """Score cache misses, and counterfactual.for_key(), through `table` (None: the rules).
+
+    Safe to call on every rerun.
+    """
+    global _scorer, _table
+    counterfactual.use_score_table(table)
+    if table is _table:
+        return
+    _table = table
+    _scorer = table.lookup if table is not None else _score_with_rules
+    build_report.cache_clear()
+
+
+def use_rules(rules: RuleSet) -> None:
+    """Score cache misses, and counterfactual.for_key(), with `rules` (default: risk_engine.RULES).
+
+    Reports are keyed by score-table key, so the rules may only read what a
+    key holds (counterfactual.check_rules raises RuleError otherwise). Safe
+    to call on every rerun.
+    """
+    global _rules
+    counterfactual.use_rules(rules)
+    if rules is _rules:
+        return
+    _rules = rules
+    build_report.cache_clear()
+
+
+def report_key(x: Inputs) -> int:
+    return key_of(x)
+
+
+def _drivers(reasons: Tuple[str, ...]) -> str:
+    return ", ".join(reasons) if reasons else "insufficient data"
+
+
+# Fragments take few distinct values, so their caches stay small.
+@lru_cache(maxsize=None)
+def domain_md(title: str, level: Likelihood, reasons: Tuple[str, ...]) -> str:
+    return DOMAIN_TEMPLATE.format(title=title, level=level, drivers=_drivers(reasons))
+
+
+@lru_cache(maxsize=None)
+def action_md(i: int, title: str, target: str, why: str) -> str:
+    return ACTION_TEMPLATE.format(i=i, title=title, target=target, why=why)
+
+
+def _make_report(cardio, sleep, msk, actions) -> Report:
+    cardio, sleep, msk = [(lvl, pts, tuple(reasons)) for lvl, pts, reasons in (cardio, sleep, msk)]
+    acts = tuple((a["title"], a["target"], a["why"]) for a in actions)
+    results = {"cardio": cardio, "sleep": sleep, "msk": msk}
+    return Report(
+        cardio=cardio,
+        sleep=sleep,
+        msk=msk,
+        actions=acts,
+        risk_summary_md=(
+            RISK_SUMMARY_HEADING,
+            *(domain_md(title, results[d][0], results[d][2]) for d, title in SUMMARY_DOMAINS),
+        ),
+        priority_actions_md=(
+            PRIORITY_ACTIONS_HEADING,
+            *(action_md(i, *a) for i, a in enumerate(acts, 1)),
+        ),
+    )
+
+
+@lru_cache(maxsize=REPORT_CACHE_SIZE)
+def build_report(key: int) -> Report:
+    return _make_report(*_scorer(key_inputs(key)))
+
+
+def get_report(x: Inputs) -> Report:
+    return build_report(report_key(x))
+
+
+def cache_stats() -> Dict[str, int]:
+    info = build_report.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "entries": info.currsize, "max_entries": info.maxsize}
+
+
+# ---- Bulk rendering ----
+
+FORMATS: Tuple[str, ...] = ("md", "html")
+HTML_HEAD = '<!doctype html>\n<html lang="en">\n<head><meta charset="utf-8"><title>HealthSignal report</title></head>\n<body>\n'
+HTML_TAIL = "</body>\n</html>\n"
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+
+
+def _inline_html(text: str) -> str:
+    return _BOLD.sub(r"<strong>\1</strong>", html.escape(text, quote=False))
+
+
+@lru_cache(maxsize=None)
+def md_to_html(md: str) -> str:
+    """One report block (heading, bullet list or paragraph) as HTML."""
+    if md.startswith("## "):
+        return f"<h2>{_inline_html(md[3:])}</h2>\n"
+    lines = md.split("\n")
+    if all(line.startswith("- ") for line in lines):
+        return "<ul>\n" + "".join(f"<li>{_inline_html(line[2:])}</li>\n" for line in lines) + "</ul>\n"
+    return "<p>" + "<br>\n".join(_inline_html(line.rstrip()) for line in md.split("  \n")) + "</p>\n"
+
+
+def _merge_lists(blocks: Tuple[str, ...]) -> List[str]:
+    # The app renders each bullet as its own block; a document wants one list.
+    out: List[str] = []
+    for b in blocks:
+        if out and b.startswith("- ") and out[-1].startswith("- "):
+            out[-1] += "\n" + b
+        else:
+            out.append(b)
+    return out
+
+
+def _static(blocks: Tuple[str, ...], fmt: str) -> str:
+    blocks = tuple(_merge_lists(blocks))
+    if fmt == "md":
+        return "".join(b + "\n\n" for b in blocks)
+    return "".join(md_to_html(b) for b in blocks)
+
+
+# Pre-rendered once; identical in every report.
+_TAILS = {
+    "md": _static((*WARNING_SIGNALS_MD, *DEPRIORITIZATION_MD, f"_{DISCLAIMER}_"), "md"),
+    "html": _static((*WARNING_SIGNALS_MD, *DEPRIORITIZATION_MD), "html")
+    + f"<p><em>{html.escape(DISCLAIMER, quote=False)}</em></p>\n",
+}
+
+
+def render(report: Report, fmt: str = "md") -> str:
+    """The four-section report as one Markdown or HTML document."""
+    head = _static(report.risk_summary_md + report.priority_actions_md, fmt)
+    if fmt == "md":
+        return head + _TAILS["md"]
+    return HTML_HEAD + head + _TAILS["html"] + HTML_TAIL
+
+
+@lru_cache(maxsize=REPORT_CACHE_SIZE)
+def render_code(code: int, fmt: str = "md") -> str:
+    """render() for a compact result code (see compact.py)."""
+    return render(_make_report(*decode_result(code)), fmt)
+
+
+def render_results(result: Mapping[str, np.ndarray], fmt: str = "md", rules: Optional[RuleSet] = None) -> List[str]:
+    """One document per row of a score_batch result of `rules` (default: the engine's).
+
+    Each distinct result is rendered once.
+    """
+    if rules is None or rules.version == RULES_VERSION:
+        codes, inverse = np.unique(pack_results(result), return_inverse=True)
+        docs = [render_code(c, fmt) for c in codes.tolist()]
+    else:
+        rows = np.column_stack([
+            *(result[f"{d}_{part}"] for d in ("cardio", "sleep", "msk") for part in ("level", "points")),
+            *(result[f"{d}_reasons"] for d in ("cardio", "sleep", "msk")),
+            result["actions"],
+        ])
+        _, first, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
+        docs = [render(_make_report(*batch_row(result, i, rules)), fmt) for i in first.tolist()]
+    return [docs[i] for i in inverse.reshape(-1).tolist()]
@@ -1,8 +1,23 @@
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from rules import DOMAINS, RuleSet, load_rules
 
 Likelihood = str  # "Low" | "Moderate" | "High"
 
+# Level codes used by the batch API index into this tuple.
+LEVELS: Tuple[Likelihood, ...] = ("Low", "Moderate", "High")
+
+# BMI at or above which excess_weight_signal fires (internal only; never shown).
+EXCESS_WEIGHT_BMI = 27.0
+
+# Reasons reported per domain: the first TOP_REASONS rules that fired, in reason order.
+TOP_REASONS = 3
+
 @dataclass
 class Inputs:
     age: int
@@ -30,13 +45,39 @@ class Inputs:
     rhr_bucket: str       # "UNKNOWN" | "NORMAL" | "ELEVATED"
 
 
+# Allowed values of each categorical Inputs field; position is the field's code.
+CATEGORIES: Dict[str, Tuple[str, ...]] = {
+    "sex": ("Male", "Female"),
+    "exercise_bucket": ("LOW", "MID", "HIGH"),
+    "sleep_quality": ("RESTFUL", "FRAGMENTED", "POOR"),
+    "sleep_duration_bucket": ("<6", "6-7", "7+", "UNKNOWN"),
+    "alcohol_bucket": ("0-3", "4-7", "8-14", "15+"),
+    "smoking_vaping": ("YES", "NO", "UNKNOWN"),
+    "bp_bucket": ("UNKNOWN", "NORMAL", "SOMETIMES_HIGH", "CONSISTENTLY_HIGH", "DIAGNOSED"),
+    "ldl_bucket": ("UNKNOWN", "NORMAL", "BORDERLINE", "HIGH"),
+    "a1c_bucket": ("UNKNOWN", "NORMAL", "BORDERLINE", "ELEVATED"),
+    "rhr_bucket": ("UNKNOWN", "NORMAL", "ELEVATED"),
+}
+BOOL_FIELDS: Tuple[str, ...] = (
+    "family_cvd", "family_t2d", "known_htn", "known_prediabetes", "known_sleep_apnea",
+)
+
+
 def excess_weight_signal(height_cm: float, weight_kg: float) -> bool:
     # Internal-only heuristic; do not display BMI.
     h_m = height_cm / 100.0
     if h_m <= 0:
         return False
     bmi = weight_kg / (h_m ** 2)
-    return bmi >= 27.0  # conservative "excess weight signal"
+    return bmi >= EXCESS_WEIGHT_BMI  # conservative "excess weight signal"
+
+def excess_weight_signal_batch(height_cm: np.ndarray, weight_kg: np.ndarray) -> np.ndarray:
+    h_m = np.asarray(height_cm, dtype=np.float64) / 100.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bmi = np.asarray(weight_kg, dtype=np.float64) / (h_m ** 2)
+    return (h_m > 0) & (bmi >= EXCESS_WEIGHT_BMI)
+
+
 
 
 def level_from_points(points: int, low_max: int, mod_max: int) -> Likelihood:
@@ -47,6 +88,13 @@ def level_from_points(points: int, low_max: int, mod_max: int) -> Likelihood:
     return "High"
 
 
+
+# ---- Reference scorers ----
+#
+# The hand-written form of rules/v1.json. Scoring goes through the compiled
+# rules below; tests, score_table.py --verify and artifact.check hold those to
+# these functions, and rescore() reuses them per domain.
+
 def score_cardiometabolic(x: Inputs) -> Tuple[Likelihood, int, List[str]]:
     p = 0
     reasons: List[str] = []
@@ -80,7 +128,7 @@ def score_cardiometabolic(x: Inputs) -> Tuple[Likelihood, int, List[str]]:
 
     override = x.known_htn and (x.known_prediabetes or x.a1c_bucket == "ELEVATED")
     level = "High" if (override or p >= 5) else level_from_points(p, low_max=1, mod_max=4)
-    return level, p, reasons[:3]
+    return level, p, reasons[:TOP_REASONS]
 
 
 def score_sleep_stress(x: Inputs) -> Tuple[Likelihood, int, List[str]]:
@@ -107,7 +155,7 @@ def score_sleep_stress(x: Inputs) -> Tuple[Likelihood, int, List[str]]:
 
     override = x.known_sleep_apnea or (x.sleep_duration_bucket == "<6" and x.sleep_quality == "POOR")
     level = "High" if (override or p >= 4) else level_from_points(p, low_max=1, mod_max=3)
-    return level, p, reasons[:3]
+    return level, p, reasons[:TOP_REASONS]
 
 
 def score_msk_energy(x: Inputs) -> Tuple[Likelihood, int, List[str]]:
@@ -128,9 +176,10 @@ def score_msk_energy(x: Inputs) -> Tuple[Likelihood, int, List[str]]:
         p += 1; reasons.append("fragmented recovery")
 
     level = "High" if p >= 4 else level_from_points(p, low_max=1, mod_max=3)
-    return level, p, reasons[:3]
+    return level, p, reasons[:TOP_REASONS]
 
 
+# Action catalog, in the order pick_actions considers them. Entries are
 def pick_actions(cardio: Likelihood, sleep: Likelihood, msk: Likelihood, x: Inputs) -> List[Dict[str, str]]:
     actions: List[Dict[str, str]] = []
 
@@ -138,41 +187,252 @@ def pick_actions(cardio: Likelihood, sleep: Likelihood, msk: Likelihood, x: Inpu
     strength_trigger = (msk in {"Moderate", "High"}) or (x.exercise_bucket == "LOW") or excess_weight_signal(x.height_cm, x.weight_kg)
 
     if sleep_trigger:
-        actions.append({
-            "title": "Lock a non-negotiable sleep floor",
-            "target": "≥7 hours in bed; consistent window (±45 min); 5 nights/week",
-            "why": "Highest-leverage lever for BP, glucose regulation, recovery, and adherence."
-        })
+        actions.append(dict(ACTIONS[SLEEP_FLOOR]))
 
     if strength_trigger:
-        actions.append({
-            "title": "Strength training 2×/week",
-            "target": "30–40 minutes; simple compound/bodyweight; consistency > intensity",
-            "why": "Protects against cardiometabolic decline and improves energy even without weight loss."
-        })
+        actions.append(dict(ACTIONS[STRENGTH]))
 
     # Alcohol (only if room, not redundant)
     if len(actions) < 2 and x.alcohol_bucket in {"8-14", "15+"} and (sleep in {"Moderate", "High"} or cardio in {"Moderate", "High"}):
-        actions.append({
-            "title": "Reduce alcohol exposure",
-            "target": "Aim ≤7 drinks/week; 2 alcohol-free days/week",
-            "why": "Improves sleep quality and reduces cardiometabolic load."
-        })
+        actions.append(dict(ACTIONS[REDUCE_ALCOHOL]))
 
     # ---- FALLBACKS (maintenance actions) ----
     if len(actions) < 2:
-        actions.append({
-            "title": "Maintain your current sleep routine",
-            "target": "Keep sleep consistent; avoid <6 hours on multiple nights/week",
-            "why": "Your sleep looks stable—maintenance prevents drift and supports long-term resilience."
-        })
+        actions.append(dict(ACTIONS[MAINTAIN_SLEEP]))
 
     if len(actions) < 2:
-        actions.append({
-            "title": "Maintain a minimum activity baseline",
-            "target": "150 min/week moderate activity OR 2×/week strength (keep what’s working)",
-            "why": "Low-risk status is fragile; baseline consistency protects it with minimal time cost."
-        })
+        actions.append(dict(ACTIONS[MAINTAIN_ACTIVITY]))
 
     return actions[:2]
 
+
+
+# What a scoring call can be asked to compute (see score_all, score_batch).
+OUTPUTS: Tuple[str, ...] = ("levels", "points", "reasons", "actions")
+_ALL_OUTPUTS = frozenset(OUTPUTS)
+
+
+_PROJECTIONS: Dict[Any, FrozenSet[str]] = {}
+_PROJECTIONS_LIMIT = 256  # distinct spellings cached; the rest are just re-validated
+
+
+def projection(outputs: Optional[Iterable[str]]) -> FrozenSet[str]:
+    """The validated set of outputs to compute; None means all of OUTPUTS."""
+    if outputs is None:
+        return _ALL_OUTPUTS
+    want = _PROJECTIONS.get(outputs) if isinstance(outputs, (tuple, frozenset)) else None
+    if want is not None:
+        return want
+    want = frozenset(outputs)
+    unknown = want - _ALL_OUTPUTS
+    if unknown:
+        raise ValueError(f"unknown outputs: {', '.join(sorted(unknown))} (expected some of {', '.join(OUTPUTS)})")
+    if isinstance(outputs, (tuple, frozenset)) and len(_PROJECTIONS) < _PROJECTIONS_LIMIT:
+        _PROJECTIONS[outputs] = want
+    return want
+
+
+@dataclass
+class Assessment:
+    cardio: Tuple[Likelihood, int, List[str]]
+    sleep: Tuple[Likelihood, int, List[str]]
+    msk: Tuple[Likelihood, int, List[str]]
+    actions: List[Dict[str, str]]
+    rules_version: str = field(default_factory=lambda: RULES_VERSION)
+
+
+# ---- Rules ----
+#
+# Scoring follows rules/v1.json, compiled once at import (see rules.py). The
+# names below are that RuleSet's: reason and weight tuples list every rule of
+# a domain in evaluation order, and score_all, score_batch, the result codes,
+# the score table and projections all index into them. Load another version
+# with rules.load_rules() to score with it side by side.
+#
+# score_all derives each shared signal once and records which rules fired as
+# a bitmask per domain (bit i = reason i). Overrides and action picks are
+# functions of the same bits, so level, points and the top-3 reasons are
+# precomputed per mask. That makes it about 2x the records/s of calling the
+# three reference scorers and pick_actions separately (bench.py reports the
+# ratio; roughly 420k against 220k records/s on one core).
+
+RULES: RuleSet = load_rules()
+RULES_VERSION: str = RULES.version
+
+CARDIO_REASONS, SLEEP_REASONS, MSK_REASONS = (RULES.reasons[d] for d in DOMAINS)
+CARDIO_WEIGHTS, SLEEP_WEIGHTS, MSK_WEIGHTS = (RULES.weights[d] for d in DOMAINS)
+
+# Action catalog, in the order the picks consider them. Entries are read-only
+# and shared; callers get dict copies. ACTION_IDS are the catalog keys.
+ACTIONS: Tuple[Mapping[str, str], ...] = RULES.actions
+ACTION_IDS: Tuple[str, ...] = RULES.action_ids
+SLEEP_FLOOR, STRENGTH, REDUCE_ALCOHOL, MAINTAIN_SLEEP, MAINTAIN_ACTIVITY = (
+    ACTION_IDS.index(a) for a in ("sleep_floor", "strength", "reduce_alcohol", "maintain_sleep", "maintain_activity")
+)
+
+# (level, points, top-3 reasons) per rule mask, by domain
+MASK_RESULTS: Dict[str, List[Tuple[Likelihood, int, Tuple[str, ...]]]] = RULES.mask_results
+# Override conditions as functions of a domain's rule mask
+MASK_OVERRIDES: Dict[str, Callable[[int], bool]] = RULES.overrides
+
+# rule_masks(x) -> (cardio, sleep, msk) masks; everything score_all returns is
+# a function of these three.
+rule_masks: Callable[[Inputs], Tuple[int, int, int]] = RULES.rule_masks
+# pick_action_codes(cardio, sleep, msk, cardio_mask, sleep_mask, msk_mask) ->
+# the picked ACTIONS codes, from the three levels and masks.
+pick_action_codes: Callable[..., List[int]] = RULES.pick
+# score_all(x, outputs=None) -> Assessment: all three domains plus the
+# actions in one pass; same output as the reference scorers. ``outputs`` is a
+# projection of OUTPUTS. Parts left out are None and are not built: the
+# level, points or reasons slot of each domain tuple, or actions. Default: all.
+score_all: Callable[..., Assessment] = RULES.score
+# score_batch(cols, outputs=None) -> arrays: score a population given one
+# array per Inputs field. Categorical columns may hold bucket strings or
+# their integer codes (position in CATEGORIES), e.g. from compact.columns().
+# Returns, per domain, ``<domain>_level`` codes into LEVELS,
+# ``<domain>_points``, ``<domain>_reasons`` (n x 3 codes into the domain's
+# reason tuple, -1 padded) and ``<domain>_mask`` (every rule that fired), plus
+# ``actions`` (n x 2 codes into ACTIONS). Row i matches score_all on the same
+# record. ``outputs`` is a projection of OUTPUTS; only those arrays are
+# computed and returned ("reasons" covers reasons and masks). Default: all.
+score_batch: Callable[..., Dict[str, np.ndarray]] = RULES.score_batch
+
+# ---- Incremental re-scoring ----
+#
+# Which Inputs fields each scorer reads, and what each pick_actions trigger
+# depends on. rescore() uses them to recompute only the domains and triggers
+# a change can reach; age, sex and smoking_vaping reach none.
+
+DOMAIN_FIELDS: Dict[str, FrozenSet[str]] = {
+    "cardio": frozenset({
+        "known_htn", "known_prediabetes", "a1c_bucket", "bp_bucket", "family_cvd", "family_t2d",
+        "height_cm", "weight_kg", "exercise_bucket", "ldl_bucket", "alcohol_bucket", "rhr_bucket",
+    }),
+    "sleep": frozenset({
+        "sleep_quality", "sleep_duration_bucket", "known_sleep_apnea",
+        "alcohol_bucket", "rhr_bucket", "exercise_bucket",
+    }),
+    "msk": frozenset({"exercise_bucket", "sleep_quality", "sleep_duration_bucket", "height_cm", "weight_kg"}),
+}
+_DOMAIN_SCORERS: Dict[str, Callable[[Inputs], Tuple[Likelihood, int, List[str]]]] = {
+    "cardio": score_cardiometabolic,
+    "sleep": score_sleep_stress,
+    "msk": score_msk_energy,
+}
+# pick_actions triggers: (fields, domain levels) each one reads
+TRIGGER_DEPS: Dict[str, Tuple[FrozenSet[str], FrozenSet[str]]] = {
+    "sleep_floor": (frozenset({"sleep_quality"}), frozenset({"sleep"})),
+    "strength": (frozenset({"exercise_bucket", "height_cm", "weight_kg"}), frozenset({"msk"})),
+    "reduce_alcohol": (frozenset({"alcohol_bucket"}), frozenset({"sleep", "cardio"})),
+}
+
+_rescore_stats: Counter = Counter()
+_rescore_stats_lock = threading.Lock()
+
+
+@dataclass
+class ScoreState:
+    inputs: Inputs
+    assessment: Assessment
+    triggers: Dict[str, bool]
+
+
+def _trigger(name: str, x: Inputs, levels: Mapping[str, Likelihood]) -> bool:
+    if name == "sleep_floor":
+        return levels["sleep"] != "Low" or x.sleep_quality != "RESTFUL"
+    if name == "strength":
+        return levels["msk"] != "Low" or x.exercise_bucket == "LOW" or excess_weight_signal(x.height_cm, x.weight_kg)
+    return x.alcohol_bucket in {"8-14", "15+"} and (levels["sleep"] != "Low" or levels["cardio"] != "Low")
+
+
+def _actions_from_triggers(t: Mapping[str, bool]) -> List[int]:
+    # Same order and fallbacks as pick_actions.
+    picked = [a for a, hit in ((SLEEP_FLOOR, t["sleep_floor"]), (STRENGTH, t["strength"])) if hit]
+    if len(picked) < 2 and t["reduce_alcohol"]:
+        picked.append(REDUCE_ALCOHOL)
+    return (picked + [MAINTAIN_SLEEP, MAINTAIN_ACTIVITY])[:2]
+
+
+def score_state(x: Inputs) -> ScoreState:
+    """Full score of x, keeping what rescore() needs to update it later."""
+    a = score_all(x)
+    levels = {"cardio": a.cardio[0], "sleep": a.sleep[0], "msk": a.msk[0]}
+    return ScoreState(x, a, {t: _trigger(t, x, levels) for t in TRIGGER_DEPS})
+
+
+def changed_fields(old: Inputs, new: Inputs) -> FrozenSet[str]:
+    return frozenset(f for f, v in vars(new).items() if getattr(old, f) != v)
+
+
+def rescore(prev: ScoreState, x: Inputs, changed: Optional[Iterable[str]] = None) -> ScoreState:
+    """Re-score x given the state of an earlier version of the same intake.
+
+    Only domains whose fields are in ``changed`` (default: every field that
+    differs from prev.inputs) are recomputed, and only the pick_actions
+    triggers whose fields or domain levels changed are re-evaluated. The
+    result equals score_state(x); see rescore_stats() for the work skipped.
+    """
+    changed = changed_fields(prev.inputs, x) if changed is None else frozenset(changed)
+    old = prev.assessment
+    results = {"cardio": old.cardio, "sleep": old.sleep, "msk": old.msk}
+    moved = set()
+    stats: Counter = Counter()
+    for d, deps in DOMAIN_FIELDS.items():
+        if changed & deps:
+            r = _DOMAIN_SCORERS[d](x)
+            if r[0] != results[d][0]:
+                moved.add(d)
+            results[d] = r
+            stats["domains_recomputed"] += 1
+        else:
+            r = results[d]
+            results[d] = (r[0], r[1], list(r[2]))
+            stats["domains_skipped"] += 1
+
+    levels = {d: r[0] for d, r in results.items()}
+    triggers = dict(prev.triggers)
+    for t, (fields, domains) in TRIGGER_DEPS.items():
+        if changed & fields or moved & domains:
+            triggers[t] = _trigger(t, x, levels)
+            stats["triggers_recomputed"] += 1
+        else:
+            stats["triggers_skipped"] += 1
+    stats["calls"] += 1
+    with _rescore_stats_lock:
+        _rescore_stats.update(stats)
+
+    return ScoreState(x, Assessment(
+        cardio=results["cardio"],
+        sleep=results["sleep"],
+        msk=results["msk"],
+        actions=[dict(ACTIONS[a]) for a in _actions_from_triggers(triggers)],
+        rules_version=old.rules_version,
+    ), triggers)
+
+
+def rescore_stats(reset: bool = False) -> Dict[str, int]:
+    with _rescore_stats_lock:
+        stats = dict(_rescore_stats)
+        if reset:
+            _rescore_stats.clear()
+    return stats
+
+
+def batch_row(result: Mapping[str, np.ndarray], i: int, rules: RuleSet = RULES) -> Tuple[
+    Tuple[Likelihood, int, List[str]],
+    Tuple[Likelihood, int, List[str]],
+    Tuple[Likelihood, int, List[str]],
+    List[Dict[str, str]],
+]:
+    """Decode row i of a score_batch result (of `rules`) into the scalar functions' shapes."""
+    def domain(prefix: str) -> Tuple[Likelihood, int, List[str]]:
+        names = rules.reasons[prefix]
+        reasons = [names[c] for c in result[prefix + "_reasons"][i] if c >= 0]
+        return LEVELS[result[prefix + "_level"][i]], int(result[prefix + "_points"][i]), reasons
+
+    return (
+        domain("cardio"),
+        domain("sleep"),
+        domain("msk"),
+        [dict(rules.actions[c]) for c in result["actions"][i] if c >= 0],
+    )
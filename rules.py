@@ -0,0 +1,615 @@
+# rules.py
+#
+# Versioned, declarative scoring rules (rules/*.json), compiled once at load.
+#
+# A rule file lists, per domain, the point rules in reason order, override
+# conditions and the low_max/mod_max/high_at cutoffs, plus the action catalog
+# and the ordered action picks. risk_engine scores with rules/v1.json; other
+# versions load side by side as separate RuleSets (`--rules` on
+# healthsignal.py, server.py and daemon.py, HEALTHSIGNAL_RULES for the app).
+#
+# Which rules fired in a domain is a bitmask (bit i = rule i), and everything
+# a RuleSet returns is a function of the three masks: level, points and top-3
+# reasons come from a table per mask, and overrides and action picks are
+# rewritten as tests on mask bits. So an override may only combine its own
+# domain's rule conditions, and each field condition of a pick must be a rule
+# condition or a union of single-field ones (sleep_quality not in RESTFUL is
+# the poor sleep rule plus the fragmented sleep rule). The scalar scorer is
+# generated source with shared predicates hoisted into locals; score_batch
+# evaluates the same conditions over columns.
+#
+# Conditions:
+#   "known_htn"                                  boolean Inputs field or signal
+#   {"field": "bp_bucket", "in": [...]}          categorical membership
+#   {"field": "sleep_quality", "not_in": [...]}
+#   {"level": "sleep", "in": [...]}              domain level (action picks only)
+#   {"any": [...]}, {"all": [...]}, {"not": cond}
+#
+# risk_engine compiles its rules while it is being imported, so the names
+# used here from it are imported inside the functions that need them.
+import argparse
+import json
+import os
+import random
+import sys
+from collections import Counter
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules")
+DEFAULT_RULES_PATH = os.path.join(RULES_DIR, "v1.json")
+
+DOMAINS: Tuple[str, ...] = ("cardio", "sleep", "msk")  # the Assessment fields
+SIGNALS: Dict[str, str] = {
+    "excess_weight": "excess_weight_signal(x.height_cm, x.weight_kg)",
+}
+MAX_DOMAIN_RULES = 16  # mask tables have 2**n entries
+
+# A parsed condition: ("flag", name), ("in", field, values, negate),
+# ("level", domain, levels), ("any" | "all", parts) or ("not", part); after
+# rewriting onto rule masks also ("bits", domain, bits). Equal conditions
+# parse to equal nodes.
+Node = Tuple[Any, ...]
+DomainResult = Tuple[str, int, Tuple[str, ...]]
+
+
+class RuleError(ValueError):
+    pass
+
+
+class RuleSet:
+    """A compiled rule file.
+
+    score(x, outputs=None) and score_batch(cols, outputs=None) return what
+    risk_engine.score_all and score_batch do, with reasons and actions from
+    this rule set. rule_masks(x) and pick(cardio, sleep, msk, cardio_mask,
+    sleep_mask, msk_mask) expose the mask scheme: mask_results[d][mask] is
+    (level, points, top reasons) and overrides[d](mask) whether an override
+    holds. `fields` are the Inputs fields the rules read; `path` is the rule
+    file, if loaded from one.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        description: str,
+        reasons: Dict[str, Tuple[str, ...]],
+        weights: Dict[str, Tuple[int, ...]],
+        cutoffs: Dict[str, Tuple[int, int, Optional[int]]],
+        overrides: Dict[str, Callable[[int], bool]],
+        mask_results: Dict[str, List[DomainResult]],
+        action_ids: Tuple[str, ...],
+        actions: Tuple[Mapping[str, str], ...],
+        max_actions: int,
+        rule_nodes: Dict[str, Tuple[Node, ...]],
+        pick_nodes: Tuple[Optional[Node], ...],
+        pick_codes: Tuple[int, ...],
+    ):
+        from risk_engine import LEVELS
+
+        self.version = version
+        self.description = description
+        self.reasons = reasons
+        self.weights = weights
+        self.cutoffs = cutoffs
+        self.overrides = overrides
+        self.mask_results = mask_results
+        self.action_ids = action_ids
+        self.actions = actions
+        self.max_actions = max_actions
+        self.fields = frozenset(f for nodes in rule_nodes.values() for n in nodes for f in _fields(n))
+        self.path: Optional[str] = None
+        self._rule_nodes = rule_nodes
+        self._pick_nodes = pick_nodes  # None: always
+        self._pick_codes = pick_codes  # catalog code of each pick
+        self._bits = {d: 1 << np.arange(len(r), dtype=np.int32) for d, r in reasons.items()}
+        self._weights = {d: np.array(w, dtype=np.int16) for d, w in weights.items()}
+        self._level_codes = {
+            d: np.array([LEVELS.index(r[0]) for r in table], dtype=np.int8) for d, table in mask_results.items()
+        }
+        self._projected: Dict[FrozenSet[str], Tuple[List[tuple], ...]] = {}
+        self.source, self.score = self._generate_score()
+        self.rule_masks: Callable[[Any], Tuple[int, int, int]] = self._generate_rule_masks()
+        self.pick: Callable[..., List[int]] = self._generate_pick()
+
+    def __repr__(self) -> str:
+        return f"RuleSet({self.version!r})"
+
+    # ---- Generated scalar code ----
+
+    def _mask_lines(self, comp: "_Compiler") -> List[str]:
+        lines = []
+        for d in DOMAINS:
+            lines.append(f"    {d}_mask = 0")
+            lines += [f"    if {comp.expr(n)}: {d}_mask |= {1 << i}" for i, n in enumerate(self._rule_nodes[d])]
+        return lines
+
+    def _pick_lines(self, comp: "_Compiler", append: Callable[[int], str]) -> List[str]:
+        lines = ["    a = []"]
+        for i, node in enumerate(self._pick_nodes):
+            guards = [f"len(a) < {self.max_actions}"] if i >= self.max_actions else []
+            if node is not None:
+                guards.append(comp.expr(node))
+            lines.append(f"    if {' and '.join(guards)}: a.append({append(i)})" if guards else f"    a.append({append(i)})")
+        return lines
+
+    def _generate_score(self) -> Tuple[str, Callable[..., Any]]:
+        from risk_engine import Assessment, excess_weight_signal
+
+        comp = _Compiler()
+        body = self._mask_lines(comp)
+        for d in DOMAINS:
+            body.append(f"    {d}, {d}_pts, {d}_reasons = {comp.const(self.mask_results[d])}[{d}_mask]")
+        # picks append copies of plain dicts from the catalog (a copy per pick
+        # is cheaper than a comprehension over the picks on return)
+        catalog = [comp.const(dict(a)) for a in self.actions]
+        body += self._pick_lines(comp, lambda i: f"{catalog[self._pick_codes[i]]}.copy()")
+        domains = ", ".join(f"({d}, {d}_pts, list({d}_reasons))" for d in DOMAINS)
+        body.append(f"    return Assessment({domains}, a, {comp.const(self.version)})")
+        head = ["def score(x, outputs=None):", "    if outputs is not None:", "        return project(x, outputs)"]
+        source = comp.finish(head, body)
+        return source, comp.build(source, "score", {
+            "Assessment": Assessment, "excess_weight_signal": excess_weight_signal, "project": self.project,
+        }, self.version)
+
+    def _generate_rule_masks(self) -> Callable[[Any], Tuple[int, int, int]]:
+        from risk_engine import excess_weight_signal
+
+        comp = _Compiler()
+        body = self._mask_lines(comp) + ["    return " + ", ".join(f"{d}_mask" for d in DOMAINS)]
+        source = comp.finish(["def rule_masks(x):"], body)
+        return comp.build(source, "rule_masks", {"excess_weight_signal": excess_weight_signal}, self.version)
+
+    def _generate_pick(self) -> Callable[..., List[int]]:
+        comp = _Compiler()
+        params = ", ".join([*DOMAINS, *(f"{d}_mask" for d in DOMAINS)])
+        body = self._pick_lines(comp, lambda i: str(self._pick_codes[i])) + ["    return a"]
+        source = comp.finish([f"def pick({params}):"], body)
+        return comp.build(source, "pick", {}, self.version)
+
+    # ---- Projections and batches ----
+
+    def project(self, x: Any, outputs: Iterable[str]) -> Any:
+        """score(x, outputs): parts left out of the projection are None and are not built."""
+        from risk_engine import Assessment, projection
+
+        want = projection(outputs)
+        masks = self.rule_masks(x)
+        cardio, sleep, msk = (t[m] for t, m in zip(self._projected_tables(want), masks))
+        if "reasons" in want:
+            cardio, sleep, msk = ((r[0], r[1], list(r[2])) for r in (cardio, sleep, msk))
+        actions = None
+        if "actions" in want:
+            levels = [self.mask_results[d][m][0] for d, m in zip(DOMAINS, masks)]
+            actions = [dict(self.actions[c]) for c in self.pick(*levels, *masks)]
+        return Assessment(cardio, sleep, msk, actions, self.version)
+
+    def _projected_tables(self, want: FrozenSet[str]) -> Tuple[List[tuple], ...]:
+        # mask_results with the slots left out of the projection set to None
+        tables = self._projected.get(want)
+        if tables is None:
+            keep = ("levels" in want, "points" in want, "reasons" in want)
+            tables = self._projected[want] = tuple(
+                [tuple(v if k else None for v, k in zip(r, keep)) for r in self.mask_results[d]] for d in DOMAINS
+            )
+        return tables
+
+    def score_batch(self, cols: Mapping[str, np.ndarray], outputs: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """risk_engine.score_batch under these rules; reason and action codes index this RuleSet."""
+        from risk_engine import TOP_REASONS, projection
+
+        want = projection(outputs)
+        memo: Dict[Node, np.ndarray] = {}
+        masks: Dict[str, np.ndarray] = {}
+        levels: Dict[str, np.ndarray] = {}
+        out: Dict[str, np.ndarray] = {}
+        for d in DOMAINS:
+            hits = np.column_stack([_on_columns(n, cols, memo) for n in self._rule_nodes[d]])
+            masks[d] = hits @ self._bits[d]
+            levels[d] = self._level_codes[d][masks[d]]
+            if "levels" in want:
+                out[f"{d}_level"] = levels[d]
+            if "points" in want:
+                out[f"{d}_points"] = hits @ self._weights[d]
+            if "reasons" in want:
+                out[f"{d}_reasons"] = _first_hits(hits, TOP_REASONS)
+                out[f"{d}_mask"] = masks[d]
+        if "actions" in want:
+            n = len(masks[DOMAINS[0]])
+            candidates = np.column_stack([
+                np.ones(n, dtype=bool) if node is None else _on_masks(node, masks, levels)
+                for node in self._pick_nodes
+            ])
+            picks = _first_hits(candidates, self.max_actions)
+            out["actions"] = np.where(picks >= 0, np.array(self._pick_codes, dtype=np.int8)[picks], -1).astype(np.int8)
+        return out
+
+
+class _Compiler:
+    def __init__(self) -> None:
+        self.consts: Dict[str, Any] = {}
+        self.leaves: Dict[str, str] = {}  # source -> token
+        self.uses: Counter = Counter()
+
+    def const(self, value: Any) -> str:
+        if isinstance(value, (frozenset, str)):
+            # reuse equal constants so equal predicates share one hoisted local
+            for name, v in self.consts.items():
+                if type(v) is type(value) and v == value:
+                    return name
+        name = f"_K{len(self.consts)}"
+        self.consts[name] = value
+        return name
+
+    def leaf(self, src: str) -> str:
+        token = self.leaves.setdefault(src, f"\x00{len(self.leaves)}\x00")
+        self.uses[src] += 1
+        return token
+
+    def expr(self, node: Node) -> str:
+        op = node[0]
+        if op == "flag":
+            name = node[1]
+            return self.leaf(name if name in SIGNALS else f"x.{name}")
+        if op == "in":
+            _, field, values, negate = node
+            if len(values) == 1:
+                (v,) = values
+                return self.leaf(f"x.{field} {'!=' if negate else '=='} {v!r}")
+            return self.leaf(f"x.{field} {'not in' if negate else 'in'} {self.const(values)}")
+        if op == "bits":
+            return f"({node[1]}_mask & {node[2]})"
+        if op == "level":
+            return f"({node[1]} in {self.const(node[2])})"
+        if op in ("any", "all"):
+            return "(" + (" or " if op == "any" else " and ").join(self.expr(p) for p in node[1]) + ")"
+        return f"(not {self.expr(node[1])})"
+
+    def finish(self, head: List[str], body: List[str]) -> str:
+        # Hoist predicates used more than once (and every signal) into locals.
+        prologue: List[str] = []
+        replace: Dict[str, str] = {}
+        for src, token in self.leaves.items():
+            if src in SIGNALS:
+                replace[token] = src
+                prologue.append(f"    {src} = {SIGNALS[src]}")
+            elif self.uses[src] > 1:
+                name = f"_v{len(prologue)}"
+                replace[token] = name
+                prologue.append(f"    {name} = {src}")
+            else:
+                replace[token] = f"({src})"
+        text = "\n".join([*head, *prologue, *body]) + "\n"
+        for token, value in replace.items():
+            text = text.replace(token, value)
+        return text
+
+    def build(self, source: str, name: str, names: Mapping[str, Any], version: str) -> Callable[..., Any]:
+        namespace = {**names, **self.consts}
+        exec(compile(source, f"<rules {version}>", "exec"), namespace)
+        return namespace[name]
+
+
+# ---- Conditions ----
+
+def _parse(c: Any, where: str, levels: bool = False) -> Node:
+    from risk_engine import BOOL_FIELDS, CATEGORIES, LEVELS
+
+    if isinstance(c, str):
+        if c in SIGNALS or c in BOOL_FIELDS:
+            return ("flag", c)
+        raise RuleError(f"{where}: unknown boolean field or signal {c!r}")
+    if not isinstance(c, dict) or not c:
+        raise RuleError(f"{where}: malformed condition {c!r}")
+    if "any" in c or "all" in c:
+        op = "any" if "any" in c else "all"
+        if not isinstance(c[op], list) or not c[op]:
+            raise RuleError(f"{where}: empty {op!r}")
+        return (op, tuple(_parse(p, where, levels) for p in c[op]))
+    if "not" in c:
+        return ("not", _parse(c["not"], where, levels))
+    if "field" in c:
+        field = c["field"]
+        if field not in CATEGORIES:
+            raise RuleError(f"{where}: unknown categorical field {field!r}")
+        negate = "not_in" in c
+        values = c.get("not_in" if negate else "in")
+        if not values or any(v not in CATEGORIES[field] for v in values):
+            raise RuleError(f"{where}: values {values!r} not all in {CATEGORIES[field]}")
+        return ("in", field, frozenset(values), negate)
+    if "level" in c:
+        domain = c["level"]
+        if not levels or domain not in DOMAINS:
+            raise RuleError(f"{where}: level of {domain!r} is not available here")
+        values = c.get("in") or []
+        if not values or any(v not in LEVELS for v in values):
+            raise RuleError(f"{where}: unknown levels {values!r}")
+        return ("level", domain, frozenset(values))
+    raise RuleError(f"{where}: malformed condition {c!r}")
+
+
+def _fields(node: Node) -> Iterable[str]:
+    op = node[0]
+    if op == "flag":
+        return ("height_cm", "weight_kg") if node[1] == "excess_weight" else (node[1],)
+    if op == "in":
+        return (node[1],)
+    if op == "not":
+        return _fields(node[1])
+    return [f for p in node[1] for f in _fields(p)]
+
+
+def _describe(node: Node) -> str:
+    op = node[0]
+    if op == "flag":
+        return node[1]
+    if op == "in":
+        return f"{node[1]} {'not in' if node[3] else 'in'} {sorted(node[2])}"
+    if op == "not":
+        return f"not ({_describe(node[1])})"
+    return f"{op}({', '.join(_describe(p) for p in node[1])})"
+
+
+def _accepts(node: Node) -> FrozenSet[str]:
+    # the values of a categorical condition's field it holds for
+    from risk_engine import CATEGORIES
+
+    _, field, values, negate = node
+    return frozenset(CATEGORIES[field]) - values if negate else values
+
+
+def _covering_bits(node: Node, rules: Sequence[Node]) -> int:
+    """Bits of the rules that together fire exactly when `node` holds; 0 if there are none."""
+    if node in rules:
+        return 1 << rules.index(node)
+    if node[0] != "in":
+        return 0
+    want = _accepts(node)
+    bits, got = 0, frozenset()
+    for i, r in enumerate(rules):
+        if r[0] == "in" and r[1] == node[1] and _accepts(r) <= want:
+            bits |= 1 << i
+            got |= _accepts(r)
+    return bits if got == want else 0
+
+
+def _onto_masks(node: Node, rules: Mapping[str, Sequence[Node]], where: str) -> Node:
+    """`node` as tests on the rule masks of the domains in `rules` (first match wins)."""
+    for d, domain_rules in rules.items():
+        bits = _covering_bits(node, domain_rules)
+        if bits:
+            return ("bits", d, bits)
+    op = node[0]
+    if op in ("any", "all"):
+        return (op, tuple(_onto_masks(p, rules, where) for p in node[1]))
+    if op == "not":
+        return ("not", _onto_masks(node[1], rules, where))
+    if op == "level":
+        return node
+    raise RuleError(f"{where}: {_describe(node)} is not a {'/'.join(rules)} rule condition")
+
+
+def _holds(node: Node, masks: Mapping[str, int]) -> bool:
+    # a mask node without levels (overrides)
+    op = node[0]
+    if op == "bits":
+        return bool(masks[node[1]] & node[2])
+    if op == "any":
+        return any(_holds(p, masks) for p in node[1])
+    if op == "all":
+        return all(_holds(p, masks) for p in node[1])
+    return not _holds(node[1], masks)
+
+
+def _on_columns(node: Node, cols: Mapping[str, np.ndarray], memo: Dict[Node, np.ndarray]) -> np.ndarray:
+    # Categorical columns may hold the strings or their CATEGORIES codes.
+    from risk_engine import CATEGORIES, excess_weight_signal_batch
+
+    v = memo.get(node)
+    if v is not None:
+        return v
+    op = node[0]
+    if op == "flag":
+        if node[1] == "excess_weight":
+            v = excess_weight_signal_batch(cols["height_cm"], cols["weight_kg"])
+        else:
+            v = np.asarray(cols[node[1]]).astype(bool)
+    elif op == "in":
+        _, field, values, negate = node
+        col = np.asarray(cols[field])
+        order = CATEGORIES[field]
+        wanted = [order.index(v) if col.dtype.kind in "iu" else v for v in sorted(values, key=order.index)]
+        v = col == wanted[0] if len(wanted) == 1 else np.isin(col, wanted)
+        if negate:
+            v = ~v
+    elif op in ("any", "all"):
+        parts = [_on_columns(p, cols, memo) for p in node[1]]
+        v = np.logical_or.reduce(parts) if op == "any" else np.logical_and.reduce(parts)
+    else:
+        v = ~_on_columns(node[1], cols, memo)
+    memo[node] = v
+    return v
+
+
+def _on_masks(node: Node, masks: Mapping[str, np.ndarray], levels: Mapping[str, np.ndarray]) -> np.ndarray:
+    from risk_engine import LEVELS
+
+    op = node[0]
+    if op == "bits":
+        return (masks[node[1]] & node[2]) != 0
+    if op == "level":
+        return np.isin(levels[node[1]], [LEVELS.index(v) for v in node[2]])
+    if op in ("any", "all"):
+        parts = [_on_masks(p, masks, levels) for p in node[1]]
+        return np.logical_or.reduce(parts) if op == "any" else np.logical_and.reduce(parts)
+    return ~_on_masks(node[1], masks, levels)
+
+
+def _first_hits(hits: np.ndarray, k: int) -> np.ndarray:
+    # Column index of the first k True entries of each row; -1 pads short rows.
+    rank = np.cumsum(hits, axis=1, dtype=np.int16) * hits
+    out = np.empty((hits.shape[0], k), dtype=np.int8)
+    for j in range(k):
+        sel = rank == j + 1
+        out[:, j] = np.where(sel.any(axis=1), sel.argmax(axis=1), -1)
+    return out
+
+
+# ---- Compiling ----
+
+def _mask_table(
+    reasons: Tuple[str, ...], weights: Tuple[int, ...], cutoffs: Tuple[int, int, Optional[int]],
+    override: Callable[[int], bool],
+) -> List[DomainResult]:
+    from risk_engine import TOP_REASONS, level_from_points
+
+    low_max, mod_max, high_at = cutoffs
+    table = []
+    for mask in range(1 << len(reasons)):
+        hit = [i for i in range(len(reasons)) if mask >> i & 1]
+        points = sum(weights[i] for i in hit)
+        high = override(mask) or (high_at is not None and points >= high_at)
+        level = "High" if high else level_from_points(points, low_max, mod_max)
+        table.append((level, points, tuple(reasons[i] for i in hit[:TOP_REASONS])))
+    return table
+
+
+def compile_rules(spec: Mapping[str, Any]) -> RuleSet:
+    try:
+        version = str(spec["version"])
+        domains = spec["domains"]
+        action_spec = spec["actions"]
+    except KeyError as e:
+        raise RuleError(f"missing top-level key {e.args[0]!r}") from None
+    if set(domains) != set(DOMAINS):
+        raise RuleError(f"domains must be exactly {DOMAINS}, got {sorted(domains)}")
+
+    reasons: Dict[str, Tuple[str, ...]] = {}
+    weights: Dict[str, Tuple[int, ...]] = {}
+    cutoffs: Dict[str, Tuple[int, int, Optional[int]]] = {}
+    rule_nodes: Dict[str, Tuple[Node, ...]] = {}
+    overrides: Dict[str, Callable[[int], bool]] = {}
+    mask_results: Dict[str, List[DomainResult]] = {}
+    for d in DOMAINS:
+        ds = domains[d]
+        rules = ds.get("rules", [])
+        if not rules or len(rules) > MAX_DOMAIN_RULES:
+            raise RuleError(f"{d}: expected 1 to {MAX_DOMAIN_RULES} rules, got {len(rules)}")
+        try:
+            reasons[d] = tuple(str(r["reason"]) for r in rules)
+            weights[d] = tuple(int(r["points"]) for r in rules)
+            rule_nodes[d] = tuple(_parse(r["when"], f"{d} rule {i}") for i, r in enumerate(rules))
+            high_at = ds.get("high_at")
+            cutoffs[d] = (int(ds["low_max"]), int(ds["mod_max"]), None if high_at is None else int(high_at))
+        except KeyError as e:
+            raise RuleError(f"{d}: missing key {e.args[0]!r}") from None
+        own = {d: rule_nodes[d]}
+        high = [
+            _onto_masks(_parse(o, f"{d} override {i}"), own, f"{d} override {i}")
+            for i, o in enumerate(ds.get("overrides", []))
+        ]
+        overrides[d] = lambda m, d=d, high=tuple(high): any(_holds(h, {d: m}) for h in high)
+        mask_results[d] = _mask_table(reasons[d], weights[d], cutoffs[d], overrides[d])
+
+    catalog = action_spec.get("catalog") or {}
+    action_ids = tuple(catalog)
+    max_actions = int(action_spec.get("max", 2))
+    if max_actions < 1:
+        raise RuleError(f"actions: max must be at least 1, got {max_actions}")
+    pick_nodes: List[Optional[Node]] = []
+    pick_codes: List[int] = []
+    for i, pick in enumerate(action_spec.get("pick", [])):
+        if pick.get("action") not in catalog:
+            raise RuleError(f"action pick {i}: unknown action {pick.get('action')!r}")
+        pick_codes.append(action_ids.index(pick["action"]))
+        where = f"action pick {i}"
+        pick_nodes.append(_onto_masks(_parse(pick["when"], where, levels=True), rule_nodes, where)
+                          if "when" in pick else None)
+    if not pick_nodes:
+        raise RuleError("actions: no picks")
+
+    return RuleSet(
+        version=version,
+        description=spec.get("description", ""),
+        reasons=reasons,
+        weights=weights,
+        cutoffs=cutoffs,
+        overrides=overrides,
+        mask_results=mask_results,
+        action_ids=action_ids,
+        actions=tuple(MappingProxyType(dict(catalog[a])) for a in action_ids),
+        max_actions=max_actions,
+        rule_nodes=rule_nodes,
+        pick_nodes=tuple(pick_nodes),
+        pick_codes=tuple(pick_codes),
+    )
+
+
+def rules_path(name: str) -> str:
+    """A rule file path, or a version name for rules/<name>.json."""
+    if name.endswith(".json") or os.sep in name:
+        return name
+    return os.path.join(RULES_DIR, f"{name}.json")
+
+
+def load_rules(path: str = DEFAULT_RULES_PATH) -> RuleSet:
+    """Compile a rule file; `path` may also be a version name (see rules_path)."""
+    path = rules_path(path)
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except FileNotFoundError:
+        raise RuleError(f"no rule file {path}") from None
+    except json.JSONDecodeError as e:
+        raise RuleError(f"{path}: invalid JSON: {e}") from None
+    rules = compile_rules(spec)
+    rules.path = path
+    return rules
+
+
+def diff_against_engine(rules: RuleSet, records: Iterable[Any]) -> List[Any]:
+    """Records where `rules` disagrees with the hand-written v1 scorers in risk_engine."""
+    from risk_engine import pick_actions, score_cardiometabolic, score_msk_energy, score_sleep_stress
+
+    bad = []
+    for x in records:
+        got = rules.score(x)
+        cardio, sleep, msk = score_cardiometabolic(x), score_sleep_stress(x), score_msk_energy(x)
+        if (got.cardio, got.sleep, got.msk, got.actions) != (cardio, sleep, msk, pick_actions(cardio[0], sleep[0], msk[0], x)):
+            bad.append(x)
+    return bad
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from score_table import TABLE_SIZE, key_inputs
+
+    ap = argparse.ArgumentParser(description="Compile a rule file and compare it with risk_engine's v1 scorers.")
+    ap.add_argument("path", nargs="?", default=DEFAULT_RULES_PATH, help="rule file or version name")
+    ap.add_argument("--sample", type=int, help="check N random input combinations instead of all")
+    ap.add_argument("--show-source", action="store_true", help="print the generated scoring function")
+    args = ap.parse_args(argv)
+
+    try:
+        rules = load_rules(args.path)
+    except RuleError as e:
+        print(f"rules.py: {e}", file=sys.stderr)
+        return 2
+    if args.show_source:
+        print(rules.source)
+    if args.sample is None:
+        keys: Iterable[int] = range(TABLE_SIZE)
+    else:
+        keys = random.Random(0).sample(range(TABLE_SIZE), min(args.sample, TABLE_SIZE))
+    bad = diff_against_engine(rules, (key_inputs(k) for k in keys))
+    if bad:
+        print(f"rules {rules.version}: {len(bad)} combinations differ from risk_engine, e.g. {bad[0]}",
+              file=sys.stderr)
+        return 1
+    print(f"rules {rules.version}: matches risk_engine")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
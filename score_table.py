@@ -0,0 +1,354 @@
+# score_table.py
+#
+# Optional engine mode: every input combination that can reach the scorers is
+# scored once into a flat table, so scoring a record is a key computation plus
+# one index lookup. Age, sex and smoking never reach the scorers; height and
+# weight only do through excess_weight_signal, so the key uses that boolean.
+#
+# File layout: MAGIC (8) | header length (u32 LE) | header JSON, padded to
+# HEADER_ALIGN | entries (u64 LE, one per key). The header stamps the rules
+# version, key layout (fields and their values) and result-code layout; load()
+# refuses a table whose stamp differs from the running engine, and scores a
+# sample of keys to catch rule edits made without a version bump.
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from compact import RESULT_LAYOUT, decode_result, pack_results, result_field, unpack_results
+from risk_engine import (
+    ACTIONS,
+    CATEGORIES,
+    RULES_VERSION,
+    Inputs,
+    Likelihood,
+    excess_weight_signal,
+    excess_weight_signal_batch,
+    pick_actions,
+    score_batch,
+    score_cardiometabolic,
+    score_msk_energy,
+    score_sleep_stress,
+)
+
+# Key fields, most significant first. Booleans have radix 2.
+KEY_FIELDS: Tuple[str, ...] = (
+    "family_cvd",
+    "family_t2d",
+    "known_htn",
+    "known_prediabetes",
+    "known_sleep_apnea",
+    "exercise_bucket",
+    "sleep_quality",
+    "sleep_duration_bucket",
+    "alcohol_bucket",
+    "bp_bucket",
+    "ldl_bucket",
+    "a1c_bucket",
+    "rhr_bucket",
+    "excess_weight",
+)
+
+# Inputs fields a key determines; height and weight only through the excess
+# weight signal, which is all the rules read of them.
+KEY_INPUTS: FrozenSet[str] = frozenset(KEY_FIELDS) - {"excess_weight"} | {"height_cm", "weight_kg"}
+
+
+def _radix(field: str) -> int:
+    return len(CATEGORIES[field]) if field in CATEGORIES else 2
+
+
+_RADIX = [_radix(f) for f in KEY_FIELDS]
+_STRIDE: Dict[str, int] = {}
+_stride = 1
+for _f, _r in reversed(list(zip(KEY_FIELDS, _RADIX))):
+    _STRIDE[_f] = _stride
+    _stride *= _r
+TABLE_SIZE = _stride
+
+# key contribution of each categorical value
+_OFFSET: Dict[str, Dict[str, int]] = {
+    f: {v: i * _STRIDE[f] for i, v in enumerate(CATEGORIES[f])}
+    for f in KEY_FIELDS if f in CATEGORIES
+}
+_BOOL_KEY_FIELDS = tuple(f for f in KEY_FIELDS if f not in CATEGORIES and f != "excess_weight")
+
+# Entries are compact.py result codes (uint64).
+MAGIC = b"HSTAB\x00\x01\x00"
+FORMAT_VERSION = 1
+HEADER_ALIGN = 64
+_LEN = struct.Struct("<I")
+SPOT_CHECK_KEYS = 4096
+
+
+class TableError(ValueError):
+    pass
+
+
+def stamp() -> Dict[str, object]:
+    """What a table file must have been built against to be used by this engine."""
+    return {
+        "format": "healthsignal-score-table",
+        "format_version": FORMAT_VERSION,
+        "rules_version": RULES_VERSION,
+        "key": [[f, list(CATEGORIES[f]) if f in CATEGORIES else _radix(f)] for f in KEY_FIELDS],
+        "result_layout": [list(item) for item in RESULT_LAYOUT],
+        "entries": TABLE_SIZE,
+    }
+
+
+_EWS = _STRIDE["excess_weight"]
+_FAMILY_CVD, _FAMILY_T2D = _STRIDE["family_cvd"], _STRIDE["family_t2d"]
+_HTN, _PREDIABETES, _APNEA = _STRIDE["known_htn"], _STRIDE["known_prediabetes"], _STRIDE["known_sleep_apnea"]
+(_EXERCISE, _SLEEP_QUALITY, _SLEEP_DURATION, _ALCOHOL,
+ _BP, _LDL, _A1C, _RHR) = (_OFFSET[f] for f in KEY_FIELDS[5:13])
+
+
+def key_of(x: Inputs) -> int:
+    # Unrolled on purpose: this is the per-record hot path.
+    try:
+        k = (
+            _EXERCISE[x.exercise_bucket]
+            + _SLEEP_QUALITY[x.sleep_quality]
+            + _SLEEP_DURATION[x.sleep_duration_bucket]
+            + _ALCOHOL[x.alcohol_bucket]
+            + _BP[x.bp_bucket]
+            + _LDL[x.ldl_bucket]
+            + _A1C[x.a1c_bucket]
+            + _RHR[x.rhr_bucket]
+        )
+    except KeyError as e:
+        raise TableError(f"unknown category value {e.args[0]!r}") from None
+    if x.family_cvd:
+        k += _FAMILY_CVD
+    if x.family_t2d:
+        k += _FAMILY_T2D
+    if x.known_htn:
+        k += _HTN
+    if x.known_prediabetes:
+        k += _PREDIABETES
+    if x.known_sleep_apnea:
+        k += _APNEA
+    if excess_weight_signal(x.height_cm, x.weight_kg):
+        k += _EWS
+    return k
+
+
+def key_field(key: int, field: str) -> int:
+    """Code of one KEY_FIELDS entry in a key (booleans and excess_weight: 0/1)."""
+    return key // _STRIDE[field] % _radix(field)
+
+
+def key_delta(field: str, old: int, new: int) -> int:
+    """What to add to a key to change `field` from code `old` to `new`."""
+    return (new - old) * _STRIDE[field]
+
+
+def keys_of(cols: Mapping[str, np.ndarray]) -> np.ndarray:
+    keys = np.where(excess_weight_signal_batch(cols["height_cm"], cols["weight_kg"]),
+                    _STRIDE["excess_weight"], 0).astype(np.int64)
+    for f in _BOOL_KEY_FIELDS:
+        keys += np.asarray(cols[f]).astype(bool) * _STRIDE[f]
+    for f, offsets in _OFFSET.items():
+        col = np.asarray(cols[f])
+        if col.dtype.kind in "iu":
+            # integer codes, e.g. from compact.columns()
+            if col.size and (col.min() < 0 or col.max() >= len(CATEGORIES[f])):
+                bad = col.min() if col.min() < 0 else col.max()
+                raise TableError(f"code {bad} out of range for {f}")
+            keys += col.astype(np.int64) * _STRIDE[f]
+            continue
+        known = np.zeros(col.shape, dtype=bool)
+        for v, off in offsets.items():
+            hit = col == v
+            keys[hit] += off
+            known |= hit
+        if not known.all():
+            bad = col[~known][0]
+            raise TableError(f"unknown value {bad!r} for {f}")
+    return keys
+
+
+def key_columns(keys: np.ndarray) -> Dict[str, np.ndarray]:
+    """Representative score_batch columns (categoricals as codes) for each key.
+
+    Height/weight are picked to land on the right side of the excess weight
+    threshold.
+    """
+    cols: Dict[str, np.ndarray] = {}
+    for f, r in zip(KEY_FIELDS, _RADIX):
+        code = (keys // _STRIDE[f]) % r
+        if f == "excess_weight":
+            cols["height_cm"] = np.full(keys.shape, 100.0)
+            cols["weight_kg"] = np.where(code == 1, 100.0, 0.0)
+        elif f in CATEGORIES:
+            cols[f] = code.astype(np.uint8)
+        else:
+            cols[f] = code.astype(bool)
+    return cols
+
+
+def key_inputs(key: int) -> Inputs:
+    # A representative Inputs for a key; every key is one distinct scoring case.
+    values = {}
+    for f, r in zip(KEY_FIELDS, _RADIX):
+        code = key // _STRIDE[f] % r
+        if f == "excess_weight":
+            values["height_cm"] = 100.0
+            values["weight_kg"] = 100.0 if code else 0.0
+        elif f in CATEGORIES:
+            values[f] = CATEGORIES[f][code]
+        else:
+            values[f] = bool(code)
+    return Inputs(age=40, sex="Male", smoking_vaping="UNKNOWN", **values)
+
+
+DomainResult = Tuple[Likelihood, int, List[str]]
+
+
+def _data_offset(header_len: int) -> int:
+    n = len(MAGIC) + _LEN.size + header_len
+    return -(-n // HEADER_ALIGN) * HEADER_ALIGN
+
+
+class ScoreTable:
+    def __init__(self, entries: np.ndarray):
+        if entries.shape != (TABLE_SIZE,) or entries.dtype != np.uint64:
+            raise TableError(f"expected {TABLE_SIZE} uint64 entries, got {entries.shape} {entries.dtype}")
+        self.entries = entries
+        # memoryview indexing returns plain ints and is much cheaper than numpy
+        # scalar indexing on the single-record path
+        self._view = memoryview(np.ascontiguousarray(entries)).cast("B").cast("Q")
+        # decoded per-domain results, filled lazily; few distinct values occur
+        self._decoded: Dict[int, Tuple[DomainResult, DomainResult, DomainResult, Tuple[int, int]]] = {}
+
+    @classmethod
+    def build(cls, chunk: int = 1 << 18) -> "ScoreTable":
+        entries = np.empty(TABLE_SIZE, dtype=np.uint64)
+        for start in range(0, TABLE_SIZE, chunk):
+            keys = np.arange(start, min(start + chunk, TABLE_SIZE), dtype=np.int64)
+            entries[keys] = pack_results(score_batch(key_columns(keys)))
+        return cls(entries)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, spot_check: int = SPOT_CHECK_KEYS) -> "ScoreTable":
+        """Open a table file; raises TableError unless it was built against this engine."""
+        with open(path, "rb") as f:
+            head = f.read(len(MAGIC) + _LEN.size)
+            if head[:6] == b"\x93NUMPY":
+                raise TableError(f"{path}: unstamped table from an older build; rebuild it with score_table.py build")
+            if head[:len(MAGIC)] != MAGIC or len(head) < len(MAGIC) + _LEN.size:
+                raise TableError(f"{path}: not a score table")
+            (n,) = _LEN.unpack_from(head, len(MAGIC))
+            try:
+                header = json.loads(f.read(n))
+            except ValueError:
+                raise TableError(f"{path}: corrupt header") from None
+        expected = stamp()
+        for k, v in expected.items():
+            if header.get(k) != v:
+                raise TableError(f"{path}: built for a different {k.replace('_', ' ')} "
+                                 f"({header.get(k)!r:.60} vs {v!r:.60}); rebuild it with score_table.py build")
+        offset = _data_offset(n)
+        size = os.path.getsize(path)
+        if size != offset + TABLE_SIZE * 8:
+            raise TableError(f"{path}: truncated or padded ({size} bytes, expected {offset + TABLE_SIZE * 8})")
+        if mmap:
+            entries = np.memmap(path, dtype="<u8", mode="r", offset=offset, shape=(TABLE_SIZE,))
+        else:
+            entries = np.fromfile(path, dtype="<u8", count=TABLE_SIZE, offset=offset)
+        table = cls(np.asarray(entries, dtype=np.uint64))
+        if spot_check:
+            keys = np.sort(np.random.default_rng(0).choice(TABLE_SIZE, min(spot_check, TABLE_SIZE), replace=False))
+            stale = np.flatnonzero(table.entries[keys] != pack_results(score_batch(key_columns(keys))))
+            if stale.size:
+                raise TableError(f"{path}: {stale.size} of {len(keys)} sampled keys disagree with risk_engine "
+                                 f"(first: {int(keys[stale[0]])}); rebuild it with score_table.py build")
+        return table
+
+    def save(self, path: str) -> None:
+        header = json.dumps(stamp()).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(MAGIC + _LEN.pack(len(header)) + header)
+            f.write(b"\0" * (_data_offset(len(header)) - f.tell()))
+            np.asarray(self.entries).astype("<u8").tofile(f)
+
+    def _decode(self, entry: int):
+        cardio, sleep, msk, _ = decode_result(entry)
+        return cardio, sleep, msk, (result_field(entry, "action1"), result_field(entry, "action2"))
+
+    def lookup(self, x: Inputs) -> Tuple[DomainResult, DomainResult, DomainResult, List[Dict[str, str]]]:
+        # Same shapes as score_cardiometabolic/score_sleep_stress/score_msk_energy/pick_actions.
+        entry = self._view[key_of(x)]
+        decoded = self._decoded.get(entry)
+        if decoded is None:
+            decoded = self._decoded[entry] = self._decode(entry)
+        cardio, sleep, msk, (a1, a2) = decoded
+        return (
+            (cardio[0], cardio[1], list(cardio[2])),
+            (sleep[0], sleep[1], list(sleep[2])),
+            (msk[0], msk[1], list(msk[2])),
+            [dict(ACTIONS[a1]), dict(ACTIONS[a2])],
+        )
+
+    def score_batch(self, cols: Mapping[str, np.ndarray], outputs: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        # Same output as risk_engine.score_batch, projection included.
+        return unpack_results(np.asarray(self.entries)[keys_of(cols)], outputs)
+
+    def verify(self, sample: Optional[int] = None, seed: int = 0) -> List[int]:
+        """Check entries against the scalar functions; returns mismatching keys.
+
+        Checks every key by default (slow: runs the scalar scorers millions of
+        times); pass ``sample`` to check a random subset instead.
+        """
+        if sample is None:
+            keys = range(TABLE_SIZE)
+        else:
+            keys = random.Random(seed).sample(range(TABLE_SIZE), min(sample, TABLE_SIZE))
+        bad = []
+        for k in keys:
+            x = key_inputs(k)
+            cardio = score_cardiometabolic(x)
+            sleep = score_sleep_stress(x)
+            msk = score_msk_energy(x)
+            expected = (cardio, sleep, msk, pick_actions(cardio[0], sleep[0], msk[0], x))
+            if key_of(x) != k or self.lookup(x) != expected:
+                bad.append(k)
+        return bad
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Build or verify the HealthSignal score table.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("path")
+    v = sub.add_parser("verify")
+    v.add_argument("path")
+    v.add_argument("--sample", type=int, default=None, help="check N random keys instead of all")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        ScoreTable.build().save(args.path)
+        print(f"wrote {TABLE_SIZE} entries to {args.path}")
+        return 0
+
+    try:
+        table = ScoreTable.load(args.path)
+    except TableError as e:
+        print(e, file=sys.stderr)
+        return 1
+    bad = table.verify(sample=args.sample)
+    if bad:
+        print(f"{len(bad)} mismatching keys, first: {bad[:10]}", file=sys.stderr)
+        return 1
+    print("table matches risk_engine")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
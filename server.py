@@ -0,0 +1,344 @@
+# server.py
+#
+# Stdlib asyncio HTTP/1.1 scoring service:
+#
+#   python server.py --port 8080 [--max-batch 512] [--max-wait-ms 2] [--rules v1]
+#
+#   POST /score          one intake object  -> one result row
+#   POST /score/batch    array of intakes   -> {"results": [row | {"error": ..., "codes": [...]}]}
+#   GET  /health
+#   GET  /metrics
+#   GET  /instrumentation  rule-hit counters and stage timings (with --instrument)
+#
+# Connections are kept alive (HTTP/1.1 default). Records from concurrent
+# requests are coalesced into one score_batch call, flushed when --max-batch
+# records are pending or --max-wait-ms after the first one arrived. Batches
+# are scored one at a time on a worker thread, so the event loop keeps
+# accepting and parsing requests (which join the next batch) meanwhile. Rows
+# have the same shape as `healthsignal.py score` JSONL output. See loadgen.py
+# for a matching load generator.
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import healthsignal as hs
+import instrumentation
+from risk_engine import RULES
+from rules import RuleSet
+
+MAX_BODY = 16 << 20
+LATENCY_WINDOW = 10000
+RATE_WINDOW_S = 10.0  # records_per_s covers this many recent seconds
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+
+class Batcher:
+    def __init__(self, scorer: hs.Scorer, max_batch: int, max_wait: float, rules: RuleSet = RULES):
+        self.scorer = scorer
+        self.rules = rules
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending: List[Tuple[List[Any], List[Dict[str, Any]], asyncio.Future]] = []
+        self._size = 0
+        self._timer: Optional[asyncio.Handle] = None
+        # one thread: batches run in order, and requests arriving meanwhile
+        # coalesce into the next one
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="score")
+        self.batches = 0
+        self.batched_records = 0
+        self.busy_s = 0.0
+
+    async def score(self, ids: List[Any], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((ids, rows, fut))
+        self._size += len(rows)
+        if self._size >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._size = self._pending, [], 0
+        if pending:
+            asyncio.get_running_loop().create_task(self._run(pending))
+
+    def _score_rows(self, ids: List[Any], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        t0 = time.perf_counter()
+        try:
+            return list(hs.result_rows(ids, self.scorer(hs.to_columns(rows)), rules=self.rules))
+        finally:
+            self.busy_s += time.perf_counter() - t0
+
+    async def _run(self, pending: List[Tuple[List[Any], List[Dict[str, Any]], asyncio.Future]]) -> None:
+        ids = [i for p in pending for i in p[0]]
+        rows = [r for p in pending for r in p[1]]
+        try:
+            out = await asyncio.get_running_loop().run_in_executor(self._executor, self._score_rows, ids, rows)
+        except Exception as e:  # hand the failure to every waiting request
+            for _, _, fut in pending:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_records += len(rows)
+        start = 0
+        for p_ids, _, fut in pending:
+            if not fut.done():
+                fut.set_result(out[start:start + len(p_ids)])
+            start += len(p_ids)
+
+    async def call(self, fn: Callable[[], Any]) -> Any:
+        """fn() on the scoring thread, between batches."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.records = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._scored: Deque[Tuple[float, int]] = deque()  # (monotonic time, records) within RATE_WINDOW_S
+
+    def count(self, records: int) -> None:
+        now = time.monotonic()
+        self.records += records
+        self._scored.append((now, records))
+        while self._scored[0][0] < now - RATE_WINDOW_S:
+            self._scored.popleft()
+
+    def rate(self) -> float:
+        """Records per second over the last RATE_WINDOW_S (or the uptime, if shorter)."""
+        now = time.monotonic()
+        while self._scored and self._scored[0][0] < now - RATE_WINDOW_S:
+            self._scored.popleft()
+        span = min(RATE_WINDOW_S, now - self.started)
+        return sum(n for _, n in self._scored) / span if span > 0 else 0.0
+
+    def snapshot(self, batcher: Batcher) -> Dict[str, Any]:
+        uptime = time.monotonic() - self.started
+        lat = sorted(self.latencies)
+
+        def pct(p: float) -> float:
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 3) if lat else 0.0
+
+        return {
+            "uptime_s": round(uptime, 3),
+            "rules_version": batcher.rules.version,
+            "requests": self.requests,
+            "errors": self.errors,
+            "records": self.records,
+            "records_per_s": round(self.rate(), 1),
+            "scorer_busy_s": round(batcher.busy_s, 3),
+            "batches": batcher.batches,
+            "mean_batch_records": round(batcher.batched_records / batcher.batches, 2) if batcher.batches else 0.0,
+            "latency_ms": {"p50": pct(0.50), "p99": pct(0.99), "max": pct(1.0), "window": len(lat)},
+        }
+
+
+class ScoringServer:
+    def __init__(
+        self, scorer: hs.Scorer = hs.score_batch, max_batch: int = 512, max_wait: float = 0.002,
+        rules: RuleSet = RULES,
+    ):
+        # `scorer` must produce results of `rules`, which name reasons and actions
+        self.batcher = Batcher(scorer, max_batch, max_wait, rules)
+        self.metrics = Metrics()
+
+    async def _score_one(self, body: bytes) -> Tuple[int, Any]:
+        try:
+            rid, values = hs.parse_record(body.decode("utf-8"))
+        except hs.RecordError as e:
+            return 400, {"error": str(e), "codes": e.codes}
+        except UnicodeDecodeError as e:
+            return 400, {"error": str(e)}
+        (row,) = await self.batcher.score([rid], [values])
+        self.metrics.count(1)
+        return 200, row
+
+    async def _score_batch(self, body: bytes) -> Tuple[int, Any]:
+        try:
+            items = json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            return 400, {"error": f"invalid JSON: {e}"}
+        if not isinstance(items, list):
+            return 400, {"error": "expected a JSON array of intake objects"}
+        results: List[Any] = [None] * len(items)
+        ok: List[int] = []
+        ids: List[Any] = []
+        rows: List[Dict[str, Any]] = []
+        for i, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise hs.RecordError("expected a JSON object", [hs.normalize.NOT_AN_OBJECT])
+                rid, values = hs.parse_record(item)
+            except hs.RecordError as e:
+                results[i] = {"index": i, "error": str(e), "codes": e.codes}
+                continue
+            ok.append(i)
+            ids.append(i if rid is None else rid)
+            rows.append(values)
+        if rows:
+            for i, row in zip(ok, await self.batcher.score(ids, rows)):
+                results[i] = row
+        self.metrics.count(len(rows))
+        return 200, {"results": results}
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        routes = {
+            "/score": ("POST", self._score_one),
+            "/score/batch": ("POST", self._score_batch),
+        }
+        if path == "/health":
+            return (200, {"status": "ok"}) if method == "GET" else (405, {"error": "use GET"})
+        if path == "/metrics":
+            return (200, self.metrics.snapshot(self.batcher)) if method == "GET" else (405, {"error": "use GET"})
+        if path == "/instrumentation":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            snap = await self.batcher.call(instrumentation.snapshot)  # not mid-batch
+            return (200, snap) if snap is not None else (404, {"error": "start the server with --instrument"})
+        if path not in routes:
+            return 404, {"error": f"no route {path}"}
+        want, handler = routes[path]
+        if method != want:
+            return 405, {"error": f"use {want}"}
+        return await handler(body)
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool,
+                       t0: float) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+            + data
+        )
+        await writer.drain()
+        self.metrics.requests += 1
+        if status >= 400:
+            self.metrics.errors += 1
+        self.metrics.latencies.append(time.perf_counter() - t0)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Lines longer than the reader's limit raise ValueError from readline();
+        # the rest of the request cannot be framed, so reply and close.
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "request line too long"}, False, time.perf_counter())
+                    break
+                if not line:
+                    break
+                t0 = time.perf_counter()
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, False, t0)
+                    break
+                headers: Dict[str, str] = {}
+                too_long = False
+                while True:
+                    try:
+                        h = await reader.readline()
+                    except ValueError:
+                        too_long = True
+                        break
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                if too_long:
+                    await self._respond(writer, 431, {"error": "header line too long"}, False, t0)
+                    break
+
+                conn = headers.get("connection", "").lower()
+                keep_alive = conn != "close" if version == "HTTP/1.1" else conn == "keep-alive"
+                if "chunked" in headers.get("transfer-encoding", "").lower():
+                    status, payload, keep_alive = 411, {"error": "send Content-Length"}, False
+                else:
+                    try:
+                        length = int(headers.get("content-length") or 0)
+                    except ValueError:
+                        length = -1
+                    if length < 0:
+                        status, payload, keep_alive = 400, {"error": "bad Content-Length"}, False
+                    elif length > MAX_BODY:
+                        status, payload, keep_alive = 413, {"error": f"body over {MAX_BODY} bytes"}, False
+                    else:
+                        body = await reader.readexactly(length) if length else b""
+                        try:
+                            status, payload = await self.dispatch(method, target.split("?", 1)[0], body)
+                        except Exception as e:
+                            status, payload = 500, {"error": str(e)}
+
+                await self._respond(writer, status, payload, keep_alive, t0)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int, server: ScoringServer) -> None:
+    srv = await asyncio.start_server(server.handle, host, port)
+    addrs = ", ".join(str(s.getsockname()) for s in srv.sockets)
+    print(f"healthsignal scoring service on {addrs}", flush=True)
+    try:
+        async with srv:
+            await srv.serve_forever()
+    finally:
+        server.batcher.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="HealthSignal HTTP scoring service.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--max-batch", type=int, default=512, help="flush once this many records are pending")
+    ap.add_argument("--max-wait-ms", type=float, default=2.0, help="longest a record waits for a batch")
+    ap.add_argument("--table", help="score through a prebuilt score table (see score_table.py)")
+    ap.add_argument("--rules", type=hs.rules_option, default=RULES, metavar="VERSION",
+                    help=f"rule version under rules/, or a rule file, to score with (default: {RULES.version})")
+    ap.add_argument("--instrument", action="store_true", help="collect rule-hit counters and stage timings")
+    args = ap.parse_args(argv)
+    if args.instrument and args.rules.version != RULES.version:
+        ap.error(f"--instrument counts rules {RULES.version} only")
+    if args.table and args.rules.version != RULES.version:
+        ap.error(f"score tables hold rules {RULES.version} results; --table cannot score rules {args.rules.version}")
+
+    scorer = hs.load_scorer(args.table, rules=args.rules)
+    if args.instrument:
+        instrumentation.enable()
+        scorer = instrumentation.instrumented(scorer)
+    server = ScoringServer(scorer, args.max_batch, args.max_wait_ms / 1000.0, args.rules)
+    try:
+        asyncio.run(serve(args.host, args.port, server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+# store.py
+#
+# SQLite store of assessments, one row per subject and date:
+#
+#   python store.py ingest assessments.db intake.jsonl [--date 2026-01-31] [--table score_table.hst]
+#   python store.py history assessments.db SUBJECT [--json]
+#   python store.py increases assessments.db [--domain cardio] [--since DATE] [--json]
+#   python store.py counts assessments.db [--domain cardio] [--since DATE] [--until DATE] [--json]
+#   python store.py bench [-n 2000000] [--visits 4] [--db PATH]
+#
+# Rows hold the inputs and the result in their compact forms (see compact.py):
+# the 32-bit input code plus height and weight, and the result code. Each
+# domain's level is repeated in its own column so the trend queries read
+# indexes instead of decoding results. Subjects are the records' "id" values;
+# a record without one is rejected rather than keyed by its position.
+#
+# The database runs in WAL mode with synchronous=NORMAL. Ingest is a bulk
+# upsert: one executemany per batch inside one transaction, with constant
+# statement text so the connection's statement cache prepares it once. A
+# re-ingested (subject, date) replaces the earlier row.
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from dataclasses import dataclass
+from datetime import date, timedelta
+from time import perf_counter
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from compact import decode, encode_columns, pack_results, result_fields
+from risk_engine import LEVELS, RULES_VERSION, Inputs, score_batch
+
+DOMAINS: Tuple[str, ...] = ("cardio", "sleep", "msk")
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    subject       TEXT    NOT NULL,
+    assessed_on   TEXT    NOT NULL,  -- ISO date
+    input_code    INTEGER NOT NULL,  -- compact.encode()
+    height_cm     REAL    NOT NULL,
+    weight_kg     REAL    NOT NULL,
+    result        INTEGER NOT NULL,  -- compact result code
+    cardio_level  INTEGER NOT NULL,
+    sleep_level   INTEGER NOT NULL,
+    msk_level     INTEGER NOT NULL,
+    rules_version TEXT    NOT NULL,
+    PRIMARY KEY (subject, assessed_on)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS assessments_by_date
+    ON assessments (assessed_on, cardio_level, sleep_level, msk_level);
+"""
+
+UPSERT = """
+INSERT INTO assessments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (subject, assessed_on) DO UPDATE SET
+    input_code = excluded.input_code,
+    height_cm = excluded.height_cm,
+    weight_kg = excluded.weight_kg,
+    result = excluded.result,
+    cardio_level = excluded.cardio_level,
+    sleep_level = excluded.sleep_level,
+    msk_level = excluded.msk_level,
+    rules_version = excluded.rules_version
+"""
+
+# Subjects whose latest assessment raised a level: find each latest row, then
+# seek the one before it on the primary key. Without a since date the latest
+# rows come from one grouped pass over the primary key (SQLite returns the
+# bare columns of the MAX row); with one, from the date index, so the cost
+# follows the rows assessed since then.
+_INCREASES_ALL = """
+SELECT l.subject, l.assessed_on, p.assessed_on, p.{col}, l.level FROM (
+    SELECT subject, MAX(assessed_on) AS assessed_on, {col} AS level
+    FROM assessments GROUP BY subject
+) l
+JOIN assessments p ON p.subject = l.subject AND p.assessed_on = (
+    SELECT MAX(assessed_on) FROM assessments WHERE subject = l.subject AND assessed_on < l.assessed_on
+)
+WHERE l.level > p.{col}
+"""
+
+_INCREASES_SINCE = """
+SELECT l.subject, l.assessed_on, p.assessed_on, p.{col}, l.{col} FROM assessments l
+JOIN assessments p ON p.subject = l.subject AND p.assessed_on = (
+    SELECT MAX(assessed_on) FROM assessments WHERE subject = l.subject AND assessed_on < l.assessed_on
+)
+WHERE l.assessed_on >= ? AND l.{col} > p.{col}
+  AND NOT EXISTS (SELECT 1 FROM assessments WHERE subject = l.subject AND assessed_on > l.assessed_on)
+"""
+
+_COUNTS = """
+SELECT assessed_on, {col}, COUNT(*) FROM assessments
+WHERE assessed_on >= ? AND assessed_on <= ?
+GROUP BY assessed_on, {col}
+"""
+
+
+class StoreError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class StoredAssessment:
+    subject: str
+    assessed_on: str
+    inputs: Inputs
+    result: int                 # compact result code
+    levels: Tuple[str, str, str]
+    rules_version: str
+
+
+def _level_column(domain: str) -> str:
+    if domain not in DOMAINS:
+        raise StoreError(f"unknown domain {domain!r} (expected one of {', '.join(DOMAINS)})")
+    return f"{domain}_level"
+
+
+def iso_date(value: Any) -> str:
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise StoreError(f"not an ISO date: {value!r}") from None
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        conn.close()
+        raise StoreError(f"{path}: schema version {version}, expected {SCHEMA_VERSION}")
+    conn.executescript(SCHEMA)
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+
+class Store:
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = connect(path)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "Store":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---- Write ----
+
+    def upsert(
+        self,
+        subjects: Sequence[Any],
+        assessed_on: Any,
+        cols: Mapping[str, np.ndarray],
+        codes: np.ndarray,
+        rules_version: str = RULES_VERSION,
+    ) -> int:
+        """Save one batch: integer-coded input columns and their result codes.
+
+        assessed_on is one date for the batch or one per row. Returns rows written.
+        """
+        n = len(subjects)
+        if isinstance(assessed_on, (str, date)):
+            dates: Iterable[str] = [iso_date(assessed_on)] * n
+        else:
+            dates = [iso_date(d) for d in assessed_on]
+        codes = np.asarray(codes, dtype=np.uint64)
+        rows = zip(
+            [str(s) for s in subjects],
+            dates,
+            encode_columns(cols).tolist(),
+            np.asarray(cols["height_cm"], dtype=np.float64).tolist(),
+            np.asarray(cols["weight_kg"], dtype=np.float64).tolist(),
+            codes.tolist(),
+            *(result_fields(codes, f"{d}_level").tolist() for d in DOMAINS),
+            [rules_version] * n,
+        )
+        with self.conn:
+            self.conn.executemany(UPSERT, rows)
+        return n
+
+    def ingest(
+        self,
+        batches: Iterable[Tuple[Sequence[Any], Mapping[str, np.ndarray]]],
+        assessed_on: Any,
+        scorer=score_batch,
+    ) -> int:
+        """Score and save (subjects, columns) batches, one transaction each."""
+        total = 0
+        for subjects, cols in batches:
+            total += self.upsert(subjects, assessed_on, cols, pack_results(scorer(cols)))
+        return total
+
+    # ---- Query ----
+
+    def history(self, subject: Any) -> List[StoredAssessment]:
+        """Every assessment of one subject, oldest first."""
+        cur = self.conn.execute(
+            "SELECT assessed_on, input_code, height_cm, weight_kg, result, cardio_level, sleep_level, msk_level,"
+            " rules_version FROM assessments WHERE subject = ? ORDER BY assessed_on",
+            (str(subject),),
+        )
+        return [
+            StoredAssessment(
+                subject=str(subject),
+                assessed_on=on,
+                inputs=decode(code, h, w),
+                result=result,
+                levels=(LEVELS[c], LEVELS[s], LEVELS[m]),
+                rules_version=version,
+            )
+            for on, code, h, w, result, c, s, m, version in cur
+        ]
+
+    def increases(self, domain: str = "cardio", since: Optional[Any] = None) -> List[Tuple[str, str, str, str, str]]:
+        """Subjects whose latest assessment (on or after since) raised the domain's level.
+
+        Rows are (subject, assessed_on, previous assessed_on, previous level, level).
+        """
+        col = _level_column(domain)
+        if since:
+            cur = self.conn.execute(_INCREASES_SINCE.format(col=col), (iso_date(since),))
+        else:
+            cur = self.conn.execute(_INCREASES_ALL.format(col=col))
+        return [(s, on, prev_on, LEVELS[prev], LEVELS[lvl]) for s, on, prev_on, prev, lvl in cur]
+
+    def level_counts(
+        self, domain: str = "cardio", since: Optional[Any] = None, until: Optional[Any] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        """Assessment date -> level -> count for one domain."""
+        sql = _COUNTS.format(col=_level_column(domain))
+        bounds = (iso_date(since) if since else "", iso_date(until) if until else "9999-12-31")
+        out: Dict[str, Dict[str, int]] = {}
+        for on, level, n in self.conn.execute(sql, bounds):
+            out.setdefault(on, {lv: 0 for lv in LEVELS})[LEVELS[level]] = n
+        return out
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM assessments").fetchone()[0]
+
+
+# ---- Benchmark ----
+
+def _bench_batches(n: int, visits: int, batch: int, seed: int) -> Iterator[Tuple[str, List[str], Dict[str, np.ndarray]]]:
+    # visits dates, each assessing the same n // visits subjects
+    from synthetic import population
+    subjects = max(1, n // visits)
+    start = date(2026, 1, 1)
+    for v in range(visits):
+        on = (start + timedelta(days=30 * v)).isoformat()
+        for lo in range(0, subjects, batch):
+            hi = min(lo + batch, subjects)
+            yield on, [f"s{i:08d}" for i in range(lo, hi)], population(hi - lo, seed + v * 1000 + lo // batch)
+
+
+def bench(path: str, n: int, visits: int, batch: int = 50_000, seed: int = 0, queries: int = 1000) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    with Store(path) as db:
+        rows = 0
+        elapsed = 0.0
+        for on, subjects, cols in _bench_batches(n, visits, batch, seed):
+            codes = pack_results(score_batch(cols))
+            t = perf_counter()
+            rows += db.upsert(subjects, on, cols, codes)
+            elapsed += perf_counter() - t
+        out["ingest_rows"] = rows
+        out["ingest_rows_per_s"] = rows / elapsed
+        # the last batch again: every row takes the update path
+        t = perf_counter()
+        db.upsert(subjects, on, cols, codes)
+        out["reupsert_rows_per_s"] = len(subjects) / (perf_counter() - t)
+
+        rng = np.random.default_rng(seed)
+        picks = [f"s{i:08d}" for i in rng.integers(0, max(1, n // visits), queries).tolist()]
+        times = []
+        for s in picks:
+            t = perf_counter()
+            db.history(s)
+            times.append(perf_counter() - t)
+        out["history_p50_us"] = float(np.percentile(times, 50) * 1e6)
+        out["history_p99_us"] = float(np.percentile(times, 99) * 1e6)
+        t = perf_counter()
+        out["increases_found"] = len(db.increases("cardio"))
+        out["increases_s"] = perf_counter() - t
+        t = perf_counter()
+        db.increases("cardio", since=on)
+        out["increases_since_s"] = perf_counter() - t
+        t = perf_counter()
+        db.level_counts("cardio")
+        out["counts_s"] = perf_counter() - t
+    return out
+
+
+# ---- CLI ----
+
+def _positive_int(v: str) -> int:
+    n = int(v)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {v}")
+    return n
+
+
+def _print_json(obj: Any) -> None:
+    print(json.dumps(obj, indent=2, ensure_ascii=False))
+
+
+def cmd_ingest(args: argparse.Namespace) -> int:
+    import healthsignal as hs
+
+    rejected = 0
+
+    def batches(inp) -> Iterator[Tuple[List[Any], Dict[str, np.ndarray]]]:
+        nonlocal rejected
+        fmt = hs._infer_format(args.input, args.input_format)
+        for chunk in hs.chunked(hs.read_records(inp, fmt), args.chunk_size):
+            ids, cols, rejects = hs.parse_chunk(chunk, require_id=True)
+            for r in rejects:
+                sys.stderr.write(hs.format_reject(r, "text"))
+            rejected += len(rejects)
+            if ids:
+                yield ids, cols
+
+    on = iso_date(args.date) if args.date else date.today().isoformat()
+    inp = hs.open_input(args.input)
+    try:
+        with Store(args.db) as db:
+            saved = db.ingest(batches(inp), on, hs.load_scorer(args.table))
+    finally:
+        inp.close()
+    print(f"saved {saved}, rejected {rejected}", file=sys.stderr)
+    return 1 if rejected else 0
+
+
+def cmd_history(args: argparse.Namespace) -> int:
+    with Store(args.db) as db:
+        rows = db.history(args.subject)
+    if args.json:
+        _print_json([
+            {"assessed_on": r.assessed_on, "levels": dict(zip(DOMAINS, r.levels)),
+             "inputs": vars(r.inputs), "rules_version": r.rules_version}
+            for r in rows
+        ])
+    else:
+        for r in rows:
+            print(f"{r.assessed_on}  {'/'.join(r.levels)}")
+    return 0 if rows else 1
+
+
+def cmd_increases(args: argparse.Namespace) -> int:
+    with Store(args.db) as db:
+        rows = db.increases(args.domain, args.since)
+    if args.json:
+        keys = ("subject", "assessed_on", "previous_on", "previous", "level")
+        _print_json([dict(zip(keys, r)) for r in rows])
+    else:
+        for subject, on, prev_on, prev, level in rows:
+            print(f"{subject}\t{prev_on} {prev} -> {on} {level}")
+    print(f"{len(rows)} subjects", file=sys.stderr)
+    return 0
+
+
+def cmd_counts(args: argparse.Namespace) -> int:
+    with Store(args.db) as db:
+        counts = db.level_counts(args.domain, args.since, args.until)
+    if args.json:
+        _print_json(counts)
+    else:
+        print(f"{'date':<12}" + "".join(f"{lv:>10}" for lv in LEVELS))
+        for on, by_level in counts.items():
+            print(f"{on:<12}" + "".join(f"{by_level[lv]:>10,}" for lv in LEVELS))
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    if args.db:
+        results = bench(args.db, args.n, args.visits)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = bench(os.path.join(tmp, "bench.db"), args.n, args.visits)
+    for k, v in results.items():
+        print(f"{k:<22} {v:>14,.1f}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description="Save assessments to SQLite and query trends.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    i = sub.add_parser("ingest", help="score intake records and save them")
+    i.add_argument("db")
+    i.add_argument("input", help="CSV or JSONL file, or - for stdin")
+    i.add_argument("--input-format", choices=["csv", "jsonl"])
+    i.add_argument("--date", help="assessment date, YYYY-MM-DD (default: today)")
+    i.add_argument("--table", help="score through a prebuilt score table (see score_table.py)")
+    i.add_argument("--chunk-size", type=_positive_int, default=10000)
+    i.set_defaults(func=cmd_ingest)
+
+    h = sub.add_parser("history", help="one subject's assessments, oldest first")
+    h.add_argument("db")
+    h.add_argument("subject")
+    h.add_argument("--json", action="store_true")
+    h.set_defaults(func=cmd_history)
+
+    u = sub.add_parser("increases", help="subjects whose level went up at their latest assessment")
+    u.add_argument("db")
+    u.add_argument("--domain", choices=DOMAINS, default="cardio")
+    u.add_argument("--since", help="only latest assessments on or after this date")
+    u.add_argument("--json", action="store_true")
+    u.set_defaults(func=cmd_increases)
+
+    c = sub.add_parser("counts", help="level counts per assessment date")
+    c.add_argument("db")
+    c.add_argument("--domain", choices=DOMAINS, default="cardio")
+    c.add_argument("--since")
+    c.add_argument("--until")
+    c.add_argument("--json", action="store_true")
+    c.set_defaults(func=cmd_counts)
+
+    b = sub.add_parser("bench", help="measure ingest and query rates on synthetic assessments")
+    b.add_argument("-n", type=_positive_int, default=2_000_000, help="rows to ingest")
+    b.add_argument("--visits", type=_positive_int, default=4, help="assessment dates per subject")
+    b.add_argument("--db", help="database path (default: a temporary file)")
+    b.set_defaults(func=cmd_bench)
+    return ap
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except StoreError as e:
+        print(f"store.py: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
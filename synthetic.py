@@ -0,0 +1,133 @@
+# synthetic.py
+#
+# Seeded synthetic intake population, for benchmarks and load tests:
+#
+#   python synthetic.py 100000 -o intake.jsonl [--seed 0]
+#
+# Draws every Inputs field from a plausible distribution for the target users
+# (adults ~30-45) with a few dependencies between fields (height by sex, known
+# hypertension -> diagnosed BP bucket, sleep duration by quality). Generation
+# is vectorized; population() returns integer-coded columns that score_batch
+# accepts directly, and records() turns them into Inputs for the scalar paths.
+import argparse
+import csv
+import json
+import sys
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from risk_engine import BOOL_FIELDS, CATEGORIES, Inputs
+
+# Value probabilities in CATEGORIES order.
+WEIGHTS: Dict[str, tuple] = {
+    "sex": (0.5, 0.5),
+    "exercise_bucket": (0.40, 0.40, 0.20),
+    "sleep_quality": (0.45, 0.40, 0.15),
+    "alcohol_bucket": (0.45, 0.30, 0.17, 0.08),
+    "smoking_vaping": (0.12, 0.80, 0.08),
+    "ldl_bucket": (0.35, 0.35, 0.20, 0.10),
+    "a1c_bucket": (0.45, 0.40, 0.10, 0.05),
+    "rhr_bucket": (0.45, 0.40, 0.15),
+}
+# P(sleep_duration_bucket | sleep_quality): "<6", "6-7", "7+", "UNKNOWN"
+SLEEP_DURATION_WEIGHTS = (
+    (0.05, 0.35, 0.55, 0.05),  # RESTFUL
+    (0.20, 0.50, 0.22, 0.08),  # FRAGMENTED
+    (0.50, 0.35, 0.07, 0.08),  # POOR
+)
+# bp_bucket without known hypertension: UNKNOWN, NORMAL, SOMETIMES_HIGH, CONSISTENTLY_HIGH, DIAGNOSED
+BP_WEIGHTS = (0.30, 0.45, 0.18, 0.07, 0.0)
+FLAG_RATES: Dict[str, float] = {
+    "family_cvd": 0.30,
+    "family_t2d": 0.25,
+    "known_htn": 0.10,
+    "known_prediabetes": 0.08,
+    "known_sleep_apnea": 0.05,
+}
+AGE_RANGE = (25, 60)
+
+
+def _choice(rng: np.random.Generator, n: int, p) -> np.ndarray:
+    # inverse-CDF draw; much faster than rng.choice for small categoricals
+    cdf = np.cumsum(p)
+    return np.searchsorted(cdf / cdf[-1], rng.random(n), side="right").astype(np.uint8)
+
+
+def population(n: int, seed: Union[int, np.random.SeedSequence] = 0) -> Dict[str, np.ndarray]:
+    """n synthetic intakes as columns; categoricals are CATEGORIES codes."""
+    rng = np.random.default_rng(seed)
+    cols: Dict[str, np.ndarray] = {}
+    cols["age"] = np.clip(np.rint(rng.normal(39, 7, n)), *AGE_RANGE).astype(np.int64)
+    for f, p in WEIGHTS.items():
+        cols[f] = _choice(rng, n, p)
+    for f in BOOL_FIELDS:
+        cols[f] = rng.random(n) < FLAG_RATES[f]
+
+    female = cols["sex"] == CATEGORIES["sex"].index("Female")
+    height = np.where(female, rng.normal(163, 7, n), rng.normal(177, 7.5, n))
+    bmi = rng.lognormal(np.log(26.0), 0.16, n)
+    cols["height_cm"] = np.round(np.clip(height, 140, 210), 1)
+    cols["weight_kg"] = np.round(bmi * (cols["height_cm"] / 100.0) ** 2, 1)
+
+    duration = np.empty(n, dtype=np.uint8)
+    for q, p in enumerate(SLEEP_DURATION_WEIGHTS):
+        hit = cols["sleep_quality"] == q
+        duration[hit] = _choice(rng, int(hit.sum()), p)
+    cols["sleep_duration_bucket"] = duration
+
+    bp = _choice(rng, n, BP_WEIGHTS)
+    bp[cols["known_htn"]] = CATEGORIES["bp_bucket"].index("DIAGNOSED")
+    cols["bp_bucket"] = bp
+    return cols
+
+
+def records(cols: Dict[str, np.ndarray]) -> List[Inputs]:
+    """Inputs objects for integer-coded columns (e.g. from population())."""
+    values = {}
+    for f, col in cols.items():
+        if f in CATEGORIES and np.asarray(col).dtype.kind in "iu":
+            values[f] = np.asarray(CATEGORIES[f], dtype=object)[col].tolist()
+        else:
+            values[f] = np.asarray(col).tolist()
+    names = list(values)
+    return [Inputs(**dict(zip(names, row))) for row in zip(*values.values())]
+
+
+def iter_rows(n: int, seed: int = 0, chunk: int = 65536) -> Iterator[Dict[str, object]]:
+    # Intake dicts in the score CLI's input shape, generated chunk by chunk.
+    # Chunks draw from independent child streams of `seed`, so nearby seeds
+    # do not share chunks the way seed + i would.
+    seeds = np.random.SeedSequence(seed)
+    for start in range(0, n, chunk):
+        for x in records(population(min(chunk, n - start), seeds.spawn(1)[0])):
+            yield vars(x)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Write a seeded synthetic intake population.")
+    ap.add_argument("n", type=int)
+    ap.add_argument("-o", "--output", default="-", help="JSONL or CSV file (by extension); default stdout")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        if args.output.lower().endswith(".csv"):
+            w = None
+            for row in iter_rows(args.n, args.seed):
+                if w is None:
+                    w = csv.DictWriter(out, fieldnames=list(row), lineterminator="\n")
+                    w.writeheader()
+                w.writerow(row)
+        else:
+            for row in iter_rows(args.n, args.seed):
+                out.write(json.dumps(row) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import json
+
+import numpy as np
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+import arrow_io  # noqa: E402
+import healthsignal as hs  # noqa: E402
+from arrow_io import INPUT_FIELDS  # noqa: E402
+from risk_engine import score_batch  # noqa: E402
+from synthetic import iter_rows  # noqa: E402
+
+
+def _table(rows):
+    return pa.Table.from_pylist([{f: r.get(f) for f in INPUT_FIELDS} for r in rows])
+
+
+def _write(table, path):
+    if str(path).endswith(".parquet"):
+        pq.write_table(table, str(path))
+    else:
+        with pa.ipc.new_file(str(path), table.schema) as w:
+            w.write_table(table)
+    return str(path)
+
+
+def _read(path):
+    if path.endswith(".parquet"):
+        return pq.read_table(path)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def _codes(rejects):
+    return [(r.record, [(p.field, p.code) for p in r.problems]) for r in rejects]
+
+
+def test_rows_get_the_normalize_range_checks_and_codes(tmp_path):
+    rows = list(iter_rows(30, seed=11))
+    rows[2]["age"] = 12
+    rows[5]["height_cm"] = 20.0
+    rows[7]["weight_kg"] = 900.0
+    rows[9]["weight_kg"] = float("nan")
+    rows[11]["age"] = None
+    rows[13]["bp_bucket"] = "very high"
+    rows[17]["family_cvd"] = None
+    rows[19]["age"] = 38.9
+    src = _write(_table(rows), tmp_path / "in.parquet")
+    got = []
+    scored, rejected = arrow_io.score_file(src, str(tmp_path / "out.parquet"), on_reject=got.append)
+    assert (scored, rejected) == (22, 8)
+    assert _codes(got) == [
+        (3, [("age", "out_of_range")]),
+        (6, [("height_cm", "out_of_range")]),
+        (8, [("weight_kg", "out_of_range")]),
+        (10, [("weight_kg", "not_a_number")]),
+        (12, [("age", "missing")]),
+        (14, [("bp_bucket", "unknown_value")]),
+        (18, [("family_cvd", "missing")]),
+        (20, [("age", "not_an_integer")]),
+    ]
+    assert got[0].problems[0].value == 12 and got[5].problems[0].value == "very high"
+
+    # the same rows through JSONL intake are rejected with the same codes
+    _, _, rejects = hs.parse_chunk(list(enumerate(rows, 1)))
+    assert _codes(rejects) == _codes(got)
+
+
+def test_results_match_score_batch(tmp_path):
+    rows = list(iter_rows(500, seed=12))
+    rows[40]["age"] = 200
+    for ext in ("parquet", "arrow"):
+        src = _write(_table(rows), tmp_path / f"in.{ext}")
+        dst = str(tmp_path / f"out.{ext}")
+        assert arrow_io.score_file(src, dst) == (499, 1)
+        out = _read(dst)
+        keep = [r for i, r in enumerate(rows) if i != 40]
+        _, cols, rejects = hs.parse_chunk(list(enumerate(keep, 1)))
+        assert not rejects
+        ref = score_batch(cols)
+        assert out.column("row").to_pylist() == [i for i in range(500) if i != 40]
+        for d in ("cardio", "sleep", "msk"):
+            level = out.column(f"{d}_level").combine_chunks()
+            np.testing.assert_array_equal(level.indices.to_numpy(), ref[f"{d}_level"])
+            np.testing.assert_array_equal(out.column(f"{d}_points").to_numpy(), ref[f"{d}_points"])
+
+
+@pytest.mark.parametrize("ext", ["parquet", "arrow"])
+def test_empty_input_writes_an_empty_file_with_the_schema(tmp_path, ext):
+    src = _write(_table(list(iter_rows(3, seed=1))).slice(0, 0), tmp_path / f"in.{ext}")
+    dst = str(tmp_path / f"out.{ext}")
+    assert arrow_io.score_file(src, dst) == (0, 0)
+    out = _read(dst)
+    assert out.num_rows == 0
+    assert out.schema.equals(arrow_io.result_schema())
+
+
+def test_cli_writes_rejects_as_jsonl(tmp_path):
+    rows = list(iter_rows(5, seed=2))
+    rows[1]["height_cm"] = 300.0
+    src = _write(_table(rows), tmp_path / "in.parquet")
+    rej = tmp_path / "rejects.jsonl"
+    assert arrow_io.main([src, str(tmp_path / "out.parquet"), "--rejects", str(rej)]) == 1
+    [line] = rej.read_text().splitlines()
+    assert json.loads(line)["record"] == 2
+    assert "out_of_range" in line
@@ -0,0 +1,39 @@
+import pytest
+
+import artifact
+import risk_engine
+from risk_engine import EXCESS_WEIGHT_BMI, TOP_REASONS, score_all
+from synthetic import population, records
+
+
+@pytest.fixture(scope="module")
+def art():
+    return artifact.Artifact.from_bytes(artifact.build())
+
+
+def test_built_artifact_checks_against_the_engine(art):
+    assert artifact.check(art, sample=2000) == []
+
+
+def test_header_carries_the_engine_constants(art):
+    assert art.header["excess_weight_bmi"] == EXCESS_WEIGHT_BMI
+    assert art.header["top_reasons"] == TOP_REASONS
+    assert art.header["rules_version"] == risk_engine.RULES_VERSION
+
+
+@pytest.mark.parametrize("name,value", [("EXCESS_WEIGHT_BMI", 30.0), ("TOP_REASONS", 2)])
+def test_check_flags_an_artifact_from_other_engine_constants(art, monkeypatch, name, value):
+    monkeypatch.setattr(risk_engine, name, value)
+    key = "excess_weight_bmi" if name == "EXCESS_WEIGHT_BMI" else "top_reasons"
+    assert artifact.check(art) == [f"header {key!r} differs from the engine"]
+
+
+def test_loader_scores_around_the_bmi_cutoff_like_the_engine(art):
+    people = records(population(300, seed=8))
+    for x in people:
+        # weight putting BMI just below, at, and just above the cutoff
+        h_m = x.height_cm / 100.0
+        for w in (EXCESS_WEIGHT_BMI * h_m * h_m * f for f in (0.999, 1.0, 1.001)):
+            x.weight_kg = w
+            a = score_all(x)
+            assert art.score(vars(x)) == (a.cardio, a.sleep, a.msk, a.actions)
@@ -0,0 +1,35 @@
+import bench
+
+BASE = {"p": {"records_per_s": 1000.0, "p50_us": 10.0, "p99_us": 40.0, "peak_mem_kib": 512.0}}
+
+
+def _with(**changes):
+    return {"p": dict(BASE["p"], **changes)}
+
+
+def test_compare_within_tolerance_is_clean():
+    assert bench.compare(_with(records_per_s=900.0, p99_us=45.0, peak_mem_kib=580.0), BASE, 0.15) == []
+
+
+def test_compare_flags_every_metric():
+    got = bench.compare(_with(records_per_s=800.0, p50_us=12.0, p99_us=60.0, peak_mem_kib=1024.0), BASE, 0.15)
+    assert got == [
+        "p: records/s 1000 -> 800",
+        "p: p50 10.000us -> 12.000us",
+        "p: p99 40.000us -> 60.000us",
+        "p: peak memory 512.0KiB -> 1024.0KiB",
+    ]
+
+
+def test_compare_skips_metrics_the_baseline_lacks():
+    old = {"p": {"records_per_s": 1000.0, "p50_us": 10.0}}
+    assert bench.compare(_with(p99_us=400.0, peak_mem_kib=4096.0), old, 0.15) == []
+
+
+def test_speedups_pair_the_paths_that_ran():
+    results = {
+        "scalar_score_all": {"records_per_s": 400.0},
+        "scalar_separate": {"records_per_s": 200.0},
+    }
+    assert bench.speedups(results) == {"scalar_score_all vs scalar_separate": 2.0}
+    assert bench.speedups({"scalar_score_all": results["scalar_score_all"]}) == {}
@@ -0,0 +1,106 @@
+import copy
+import json
+
+import numpy as np
+import pytest
+
+import calibration
+from calibration import CalibrationError, baseline, mask_counts, sweep
+from risk_engine import DOMAINS, LEVELS, RULES
+from rules import DEFAULT_RULES_PATH, compile_rules
+from synthetic import iter_rows, population
+
+
+@pytest.fixture(scope="module")
+def spec():
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def cols():
+    return population(20000, seed=71)
+
+
+def _levels(rules, cols, d):
+    return rules.score_batch(cols, ("levels",))[f"{d}_level"]
+
+
+def test_baseline_is_the_rule_files_weights_and_cutoffs(spec):
+    for d in DOMAINS:
+        ds = spec["domains"][d]
+        b = baseline()[d]
+        assert b.weights == tuple(r["points"] for r in ds["rules"])
+        assert (b.low_max, b.mod_max, b.high_at, b.override) == (ds["low_max"], ds["mod_max"], ds.get("high_at"), True)
+
+
+def test_baseline_config_reproduces_the_engine(cols):
+    result = sweep(mask_counts([cols]), {d: {} for d in DOMAINS})
+    for d in DOMAINS:
+        s = result[d]
+        assert len(s.configs) == 1 and s.reasons == RULES.reasons[d]
+        want = np.bincount(_levels(RULES, cols, d), minlength=len(LEVELS))
+        np.testing.assert_array_equal(s.distribution[0], want)
+        np.testing.assert_array_equal(s.transitions[0], np.diag(want))
+        assert s.moved()[0] == 0
+
+
+@pytest.mark.parametrize("domain,grid,edit", [
+    ("cardio", {"mod_max": [3]}, lambda ds: ds.update(mod_max=3)),
+    ("sleep", {"override": [False]}, lambda ds: ds.update(overrides=[])),
+    ("cardio", {"weights": {"family history of type 2 diabetes": [2]}},
+     lambda ds: ds["rules"][[r["reason"] for r in ds["rules"]].index("family history of type 2 diabetes")]
+     .update(points=2)),
+    ("msk", {"weights": {"0": [3]}, "high_at": [None]}, lambda ds: (ds["rules"][0].update(points=3), ds.pop("high_at"))),
+])
+def test_sweep_matches_rescoring_with_the_edited_rules(spec, cols, domain, grid, edit):
+    edited = copy.deepcopy(spec)
+    edit(edited["domains"][domain])
+    rules = compile_rules(edited)
+
+    s = sweep(mask_counts([cols]), {domain: grid})[domain]
+    assert len(s.configs) == 2
+    before, after = _levels(RULES, cols, domain), _levels(rules, cols, domain)
+    np.testing.assert_array_equal(s.distribution[1], np.bincount(after, minlength=len(LEVELS)))
+    want = np.zeros((len(LEVELS), len(LEVELS)), dtype=np.int64)
+    np.add.at(want, (before, after), 1)
+    np.testing.assert_array_equal(s.transitions[1], want)
+    assert s.moved()[1] == int((before != after).sum())
+
+
+def test_sweeps_around_the_given_rules(spec, cols):
+    v2 = copy.deepcopy(spec)
+    v2["version"] = "v2"
+    for r in v2["domains"]["sleep"]["rules"]:
+        r["points"] += 1
+    v2["domains"]["sleep"]["overrides"] = []
+    rules = compile_rules(v2)
+
+    assert baseline(rules)["sleep"].weights == tuple(w + 1 for w in RULES.weights["sleep"])
+    s = sweep(mask_counts([cols], rules=rules), {"sleep": {"override": [False]}}, rules=rules)["sleep"]
+    np.testing.assert_array_equal(s.distribution[0], np.bincount(_levels(rules, cols, "sleep"), minlength=len(LEVELS)))
+    # v2 has no sleep overrides, so turning them off moves no one
+    assert s.moved().tolist() == [0, 0]
+
+
+def test_grid_errors():
+    counts = mask_counts([population(100, seed=72)])
+    with pytest.raises(CalibrationError, match="unknown domains: mood"):
+        sweep(counts, {"mood": {}})
+    with pytest.raises(CalibrationError, match="unknown rule 'nope'"):
+        sweep(counts, {"cardio": {"weights": {"nope": [1]}}})
+    with pytest.raises(CalibrationError, match="unknown parameter 'slope'"):
+        sweep(counts, {"cardio": {"slope": [1]}})
+
+
+def test_cli_counts_rejected_population_records(tmp_path, capsys):
+    rows = list(iter_rows(50, seed=73))
+    rows[7]["age"] = "old"
+    path = tmp_path / "pop.jsonl"
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+
+    assert calibration.main(["--population", str(path), "--set", "cardio.mod_max=3", "--json"]) == 1
+    out, err = capsys.readouterr()
+    assert json.loads(out)["cardio"]["configs"][0]["levels"] and "swept 49, rejected 1" in err
+    assert calibration.main(["--population", str(path), "--rules", "v0"]) == 2
+    assert "no rule file" in capsys.readouterr().err
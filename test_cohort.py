@@ -0,0 +1,59 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import cohort
+from risk_engine import ACTIONS, LEVELS, score_all, score_batch
+from synthetic import population, records
+
+
+def _chunks(cols, size):
+    n = len(cols["age"])
+    return [{f: c[i:i + size] for f, c in cols.items()} for i in range(0, n, size)]
+
+
+def test_totals_match_scalar_scoring():
+    cols = population(3000, seed=81)
+    stats = cohort.aggregate(_chunks(cols, 700))
+    assert stats.n == 3000
+
+    people = records(cols)
+    scored = [score_all(x) for x in people]
+    for d in ("cardio", "sleep", "msk"):
+        want = Counter(getattr(a, d)[0] for a in scored)
+        assert stats.level_counts(d) == {lvl: want[lvl] for lvl in LEVELS}
+        assert stats.levels[d].sum() == stats.masks[d].sum() == 3000
+    titles = Counter(a["title"] for s in scored for a in s.actions)
+    assert stats.action_counts() == {a["title"]: titles[a["title"]] for a in ACTIONS}
+    assert sum(c for _, c in stats.action_pair_counts()) == 3000
+
+    # per age band x sex: a band's High count over all of its people
+    bands = np.searchsorted(stats.age_edges, cols["age"], side="right")
+    for i, band in enumerate(stats.age_bands):
+        for j, sex in enumerate(cohort.SEXES):
+            group = [a for a, b, s in zip(scored, bands, cols["sex"]) if b == i and s == j]
+            high = sum(a.cardio[0] == "High" for a in group)
+            share = stats.level_share("cardio")[band][sex]
+            assert share == (round(high / len(group), 4) if group else 0.0)
+
+
+def test_merge_equals_one_pass_and_string_sex_counts_the_same():
+    cols = population(2000, seed=82)
+    whole = cohort.aggregate([cols])
+    a = cohort.aggregate([{f: c[:1200] for f, c in cols.items()}])
+    b = cohort.CohortStats()
+    rest = {f: c[1200:] for f, c in cols.items()}
+    b.add(score_batch(rest), rest["age"], np.asarray(cohort.SEXES, dtype=object)[rest["sex"]])
+    a.merge(b)
+    assert a.to_dict() == whole.to_dict()
+    with pytest.raises(ValueError, match="age bands"):
+        a.merge(cohort.CohortStats((40,)))
+
+
+def test_top_driver_sets_count_every_fired_rule():
+    stats = cohort.aggregate([population(2000, seed=83)])
+    for d, reasons in cohort.DOMAINS:
+        top = stats.top_driver_sets(d, k=1 << len(reasons))
+        assert sum(c for _, c in top) == 2000
+        assert all(set(r) <= set(reasons) for r, _ in top)
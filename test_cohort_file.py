@@ -0,0 +1,120 @@
+import json
+
+import numpy as np
+import pytest
+
+import cohort
+import cohort_file
+from compact import columns
+from risk_engine import score_all, score_batch
+from synthetic import iter_rows, population
+
+
+def _write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r) + "\n")
+    return str(path)
+
+
+def test_append_rejects_records_without_an_id(tmp_path, capsys):
+    path = str(tmp_path / "c.hsc")
+    a = _write_jsonl(tmp_path / "a.jsonl", iter_rows(20, seed=1))
+    b = _write_jsonl(tmp_path / "b.jsonl", iter_rows(20, seed=2))
+
+    assert cohort_file.main(["append", path, a, "--at", "2026-01-01"]) == 2
+    assert cohort_file.main(["append", path, b, "--at", "2026-02-01"]) == 2
+    assert 'no "id"' in capsys.readouterr().err
+    with cohort_file.CohortFile(path) as cf:
+        assert len(cf) == 0
+        assert len(cf.history(1)) == 0
+
+
+def test_append_rejects_non_integer_ids(tmp_path):
+    path = str(tmp_path / "c.hsc")
+    src = _write_jsonl(tmp_path / "a.jsonl", [dict(r, id="p1") for r in iter_rows(2, seed=1)])
+    assert cohort_file.main(["append", path, src]) == 2
+    with pytest.raises(cohort_file.CohortFileError):
+        cohort_file._subject_id(True)
+    assert cohort_file._subject_id(" 12 ") == 12
+
+
+def test_append_builds_histories_from_ids(tmp_path):
+    path = str(tmp_path / "c.hsc")
+    a = _write_jsonl(tmp_path / "a.jsonl", [dict(r, id=i) for i, r in enumerate(iter_rows(10, seed=1))])
+    b = _write_jsonl(tmp_path / "b.jsonl", [dict(r, id=str(i)) for i, r in enumerate(iter_rows(10, seed=2))])
+    assert cohort_file.main(["append", path, a, "--at", "2026-02-01"]) == 0
+    assert cohort_file.main(["append", path, b, "--at", "2026-01-01"]) == 0
+    with cohort_file.CohortFile(path) as cf:
+        hist = cf.history(3)
+        expected = [cohort_file.timestamp("2026-01-01"), cohort_file.timestamp("2026-02-01")]
+        assert hist["assessed_at"].tolist() == expected
+
+
+def _build(path, batches=4, n=5000, subjects=700):
+    rng = np.random.default_rng(0)
+    parts = []
+    with cohort_file.CohortWriter(path) as w:
+        for b in range(batches):
+            cols = population(n, b)
+            subs = rng.integers(0, subjects, n)
+            at = rng.integers(1_700_000_000, 1_800_000_000, n)
+            w.append_scored(subs, at, cols, score_batch(cols))
+            parts.append((cols, subs, at))
+            if b == 1:
+                with cohort_file.CohortFile(path) as cf:
+                    cf.update_index()  # later batches stay an unindexed tail
+    cols = {k: np.concatenate([p[0][k] for p in parts]) for k in parts[0][0]}
+    return cols, np.concatenate([p[1] for p in parts]), np.concatenate([p[2] for p in parts])
+
+
+def test_round_trip_matches_scoring(tmp_path):
+    path = str(tmp_path / "c.hsc")
+    cols, _, _ = _build(path)
+    ref = score_batch(cols)
+    with cohort_file.CohortFile(path) as cf:
+        view = cf[100:9000]
+        assert np.shares_memory(view, cf.records) and not view.flags.writeable
+        stored = cohort_file.results(cf.records)
+        rescored = score_batch(columns(cf.records))
+        for k in ref:
+            np.testing.assert_array_equal(stored[k], ref[k], err_msg=k)
+            np.testing.assert_array_equal(rescored[k], ref[k], err_msg=k)
+        for i in range(0, len(cf), 173):
+            assert cf.assessment(i) == score_all(cf.inputs(i))
+
+
+def test_history_matches_a_scan_before_and_after_index_update(tmp_path):
+    path = str(tmp_path / "c.hsc")
+    _, subs, at = _build(path)
+    with cohort_file.CohortFile(path) as cf:
+        for updated in (False, True):
+            if updated:
+                cf.update_index()
+                assert cf.index().shape == (2, len(cf))
+            for s in range(0, 700, 7):
+                rows = np.flatnonzero(subs == s)
+                rows = rows[np.argsort(at[rows], kind="stable")]
+                np.testing.assert_array_equal(cf.history(s), cf.records[rows])
+
+
+def test_aggregate_matches_cohort_aggregate(tmp_path):
+    path = str(tmp_path / "c.hsc")
+    cols, _, _ = _build(path)
+    with cohort_file.CohortFile(path) as cf:
+        stats = cohort_file.aggregate(cf, chunk=3000)
+    assert stats.to_dict() == cohort.aggregate([cols]).to_dict()
+
+
+def test_torn_tail_is_dropped_on_append(tmp_path):
+    path = str(tmp_path / "c.hsc")
+    cols, _, _ = _build(path, batches=1, n=10)
+    with open(path, "ab") as f:
+        f.write(b"\1\2\3")
+    with cohort_file.CohortFile(path) as cf:
+        assert len(cf) == 10
+    one = {k: v[:1] for k, v in cols.items()}
+    with cohort_file.CohortWriter(path) as w:
+        assert w.append_scored([42], "2026-03-01", one, score_batch(one)) == 10
+    with cohort_file.CohortFile(path) as cf:
+        assert len(cf) == 11 and int(cf[10]["subject"]) == 42
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+import compact
+from compact import (
+    MAX_AGE,
+    columns,
+    decode,
+    decode_result,
+    encode,
+    encode_columns,
+    from_bytes,
+    pack,
+    pack_array,
+    pack_results,
+    score_compact,
+    to_bytes,
+    unpack,
+    unpack_array,
+    unpack_results,
+)
+from risk_engine import BOOL_FIELDS, CATEGORIES, score_all, score_batch
+from synthetic import population, records
+
+BASE = records(population(1, seed=61))[0]
+
+
+def _variants():
+    # every value of every field, one field at a time
+    for f, values in CATEGORIES.items():
+        for v in values:
+            yield f, v
+    for f in BOOL_FIELDS:
+        for v in (False, True):
+            yield f, v
+    for age in (0, 1, 38, MAX_AGE):
+        yield "age", age
+
+
+@pytest.mark.parametrize("field,value", list(_variants()))
+def test_encode_decode_round_trip_every_field(field, value):
+    x = type(BASE)(**{**vars(BASE), field: value})
+    code = encode(x)
+    assert 0 <= code < 1 << compact.CODE_BITS
+    assert decode(code, x.height_cm, x.weight_kg) == x
+    assert unpack(pack(x)) == x
+    assert from_bytes(to_bytes(x)) == x
+
+
+def test_encode_rejects_what_does_not_fit():
+    with pytest.raises(ValueError, match="age"):
+        encode(type(BASE)(**{**vars(BASE), "age": MAX_AGE + 1}))
+    with pytest.raises(ValueError, match="bp_bucket"):
+        encode(type(BASE)(**{**vars(BASE), "bp_bucket": "very high"}))
+
+
+def test_columns_and_encode_columns_are_inverses():
+    people = records(population(2000, seed=62))
+    arr = pack_array(people)
+    assert unpack_array(arr) == people
+    cols = columns(arr)
+    np.testing.assert_array_equal(encode_columns(cols), arr["code"])
+
+
+@pytest.mark.parametrize("field", [f for f, _ in compact.LAYOUT])
+def test_encode_columns_rejects_negative_codes(field):
+    cols = columns(pack_array(records(population(10, seed=63))))
+    cols[field] = np.asarray(cols[field]).astype(np.int64)
+    cols[field][3] = -1
+    with pytest.raises(ValueError, match=field):
+        encode_columns(cols)
+
+
+def test_pack_unpack_results_round_trip():
+    cols = population(3000, seed=64)
+    result = score_batch(cols)
+    codes = pack_results(result)
+    assert codes.dtype == np.uint64
+    assert int(codes.max()) < 1 << compact.RESULT_BITS
+    back = unpack_results(codes)
+    assert set(back) == set(result)
+    for k in result:
+        np.testing.assert_array_equal(back[k], result[k], err_msg=k)
+    part = unpack_results(codes, ("levels",))
+    assert set(part) == set(score_batch(cols, ("levels",)))
+
+
+def test_result_codes_decode_to_score_all():
+    for code, x in zip(pack_results(score_batch(population(500, seed=65))).tolist(), records(population(500, seed=65))):
+        a = score_all(x)
+        assert decode_result(code) == (a.cardio, a.sleep, a.msk, a.actions)
+        assert score_compact(x) == code
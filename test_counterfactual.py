@@ -0,0 +1,79 @@
+import numpy as np
+
+import counterfactual
+from counterfactual import DOMAINS, EXCESS_WEIGHT_VALUES, evaluate
+from risk_engine import CATEGORIES, LEVELS, RULES, score_all
+from score_table import TABLE_SIZE, key_delta, key_inputs
+
+
+def _code(field, value):
+    return (EXCESS_WEIGHT_VALUES if field == "excess_weight" else CATEGORIES[field]).index(value)
+
+
+def _apply(key, changes):
+    for f, a, b in changes:
+        key += key_delta(f, _code(f, a), _code(f, b))
+    return key
+
+
+def _levels(x):
+    a = score_all(x)
+    return a.cardio[0], a.sleep[0], a.msk[0]
+
+
+def test_every_proposed_change_lowers_the_level():
+    keys = np.random.default_rng(101).choice(TABLE_SIZE, 150, replace=False).tolist()
+    proposed = 0
+    for key in keys:
+        before = _levels(key_inputs(key))
+        for di, d in enumerate(DOMAINS):
+            for cf in evaluate(key, limit=None)[d]:
+                after = _levels(key_inputs(_apply(key, cf.changes)))
+                assert after == cf.levels, (key, cf)
+                assert LEVELS.index(after[di]) < LEVELS.index(before[di]), (key, d, cf)
+                proposed += 1
+    assert proposed > 100
+
+
+def test_pairs_only_when_they_beat_both_single_changes():
+    keys = np.random.default_rng(102).choice(TABLE_SIZE, 100, replace=False).tolist()
+    for key in keys:
+        result = evaluate(key, limit=None)
+        for di, d in enumerate(DOMAINS):
+            for cf in result[d]:
+                if len(cf.changes) == 2:
+                    for one in cf.changes:
+                        alone = _levels(key_inputs(_apply(key, (one,))))[di]
+                        assert LEVELS.index(cf.levels[di]) < LEVELS.index(alone), (key, cf)
+
+
+def test_for_key_is_the_cached_default_evaluation():
+    key = int(np.random.default_rng(103).integers(TABLE_SIZE))
+    counterfactual.for_key.cache_clear()
+    got = counterfactual.for_key(key)
+    assert got == {d: tuple(cfs) for d, cfs in evaluate(key).items()}
+    assert counterfactual.for_key(key) is got
+
+
+def test_table_mode_routes_reports_and_counterfactuals_through_the_table(monkeypatch):
+    import report
+    from score_table import ScoreTable
+
+    keys = np.random.default_rng(104).choice(TABLE_SIZE, 20, replace=False).tolist()
+    want = {k: counterfactual.evaluate(k) for k in keys}
+    table = ScoreTable.build()
+
+    def no_engine(*a, **k):
+        raise AssertionError("scored through the engine in table mode")
+
+    report.use_score_table(table)
+    try:
+        monkeypatch.setattr(RULES, "score_batch", no_engine)
+        monkeypatch.setattr(RULES, "score", no_engine)
+        monkeypatch.setattr(report, "_score_with_rules", no_engine)
+        for k in keys:
+            assert counterfactual.for_key(k) == {d: tuple(cfs) for d, cfs in want[k].items()}
+            report.build_report(k)
+    finally:
+        report.use_score_table(None)
+    assert counterfactual._table is None
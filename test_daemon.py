@@ -0,0 +1,146 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import daemon
+import healthsignal as hs
+from risk_engine import Inputs, score_all
+from synthetic import iter_rows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_refuses_to_replace_a_regular_file(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"id": 1}\n')
+    with pytest.raises(SystemExit, match="not a socket"):
+        daemon.serve(str(path), workers=1)
+    assert path.read_text() == '{"id": 1}\n'
+
+
+def test_refuses_a_symlink_to_a_socket(tmp_path):
+    target = str(tmp_path / "real.sock")
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(target)
+    s.close()
+    link = tmp_path / "link.sock"
+    link.symlink_to(target)
+    with pytest.raises(SystemExit, match="not a socket"):
+        daemon.clear_stale_socket(str(link))
+    assert os.path.exists(target)
+
+
+def test_removes_a_stale_socket(tmp_path):
+    path = str(tmp_path / "d.sock")
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(path)
+    s.close()  # bound, never listening: a dead daemon's leftover
+    daemon.clear_stale_socket(path)
+    assert not os.path.exists(path)
+
+
+def test_refuses_a_live_socket(tmp_path):
+    path = str(tmp_path / "d.sock")
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(path)
+    s.listen(1)
+    try:
+        with pytest.raises(SystemExit, match="already listening"):
+            daemon.clear_stale_socket(path)
+        assert os.path.exists(path)
+    finally:
+        s.close()
+
+
+def _start(path):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "daemon.py"), "serve", "--socket", path, "--workers", "1"],
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while not os.path.exists(path):
+        assert proc.poll() is None and time.monotonic() < deadline
+        time.sleep(0.05)
+    return proc
+
+
+def test_serve_round_trip(tmp_path):
+    path = str(tmp_path / "d.sock")
+    proc = _start(path)
+    try:
+        rows = [dict(r, id=i) for i, r in enumerate(iter_rows(40, seed=5))]
+        with daemon.Client(path) as c:
+            assert c.request({"op": "ping"})["ok"] is True
+            one = c.score(rows[0])
+            many = c.score_many(rows)
+        for row, got in zip(rows, [one] + many[1:]):
+            a = score_all(Inputs(**hs.parse_record(row)[1]))
+            assert got["id"] == row["id"]
+            assert (got["cardio_level"], got["sleep_level"], got["msk_level"]) == (a.cardio[0], a.sleep[0], a.msk[0])
+        assert many[0] == one
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+    assert not os.path.exists(path)
+
+
+def test_sigterm_mid_frame_still_answers_the_request(tmp_path):
+    path = str(tmp_path / "d.sock")
+    proc = _start(path)
+    try:
+        row = dict(next(iter_rows(1, seed=6)), id="p1")
+        payload = json.dumps(row).encode("utf-8")
+        with daemon.Client(path) as c:
+            assert c.request({"op": "ping"})["ok"] is True
+            c.sock.sendall(daemon.HEADER.pack(len(payload)) + payload[:10])
+            proc.send_signal(signal.SIGTERM)
+            time.sleep(0.3)
+            c.sock.sendall(payload[10:])
+            reply = json.loads(daemon.recv_frame(c.sock))
+            assert reply["id"] == "p1" and "error" not in reply
+            assert daemon.recv_frame(c.sock) is None  # then the worker stops
+        proc.wait(timeout=30)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    assert not os.path.exists(path)
+
+
+class _FlakyEngine(daemon.Engine):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        one = self.one
+
+        def flaky(x):
+            self.calls += 1
+            if self.calls == 1:
+                raise RuntimeError("boom")
+            return one(x)
+        self.one = flaky
+
+
+def test_a_failing_request_gets_an_error_and_the_connection_keeps_serving():
+    server, client = socket.socketpair()
+    worker = daemon.Worker(None, _FlakyEngine(), idle_timeout=5.0)
+    t = threading.Thread(target=worker.serve_connection, args=(server,))
+    t.start()
+    try:
+        row = dict(next(iter_rows(1, seed=6)), id="p1")
+        for want_error in (True, False):
+            daemon.send_frame(client, json.dumps(row).encode("utf-8"))
+            reply = json.loads(daemon.recv_frame(client))
+            assert ("error" in reply) is want_error, reply
+        assert reply["id"] == "p1"
+    finally:
+        client.close()
+        t.join(timeout=10)
+    assert not t.is_alive()
@@ -0,0 +1,45 @@
+import copy
+import json
+import os
+
+import pytest
+
+import exhaustive
+from score_table import TABLE_SIZE
+
+SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules", "v1.snapshot.json")
+
+
+@pytest.fixture(scope="module")
+def committed():
+    with open(SNAPSHOT, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def current():
+    return exhaustive.snapshot(exhaustive.sweep(workers=1))
+
+
+def test_engine_matches_the_committed_snapshot(committed, current):
+    assert exhaustive.diff_snapshots(committed, current) == []
+    assert current == committed
+    assert current["keys"] == TABLE_SIZE
+
+
+def test_diff_reports_moved_results(committed):
+    changed = copy.deepcopy(committed)
+    changed["digest"] = "0" * 64
+    levels = changed["domains"]["cardio"]["levels"]
+    levels["High"] += 5
+    levels["Moderate"] -= 5
+    assert exhaustive.diff_snapshots(committed, changed) == [
+        f"results differ (rules {committed['rules_version']} -> {changed['rules_version']})",
+        f"cardio levels: High: {levels['High'] - 5:,} -> {levels['High']:,}",
+        f"cardio levels: Moderate: {levels['Moderate'] + 5:,} -> {levels['Moderate']:,}",
+    ]
+
+
+def test_cli_diff_against_the_committed_snapshot(capsys):
+    assert exhaustive.main(["--workers", "1", "--diff", SNAPSHOT]) == 0
+    assert "no changes" in capsys.readouterr().out
@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+
+import healthsignal as hs
+from risk_engine import score_batch
+from synthetic import iter_rows
+
+
+def _codes(rejects):
+    return [(r.record, r.id, [(p.field, p.code) for p in r.problems]) for r in rejects]
+
+
+def test_parse_chunk_reject_codes():
+    rows = [dict(r, id=f"p{i}") for i, r in enumerate(iter_rows(12, seed=71))]
+    rows[1]["age"] = 38.9
+    rows[2]["height_cm"] = 20
+    rows[3]["sleep_quality"] = "great"
+    rows[4]["known_htn"] = "sometimes"
+    del rows[5]["weight_kg"]
+    rows[6]["weight_kg"] = "heavy"
+    raw = [json.dumps(r) for r in rows]
+    raw[7] = "{not json"
+    raw[8] = "[1, 2]"
+    chunk = list(enumerate(raw, 101))
+
+    ids, cols, rejects = hs.parse_chunk(chunk)
+    assert _codes(rejects) == [
+        (102, "p1", [("age", "not_an_integer")]),
+        (103, "p2", [("height_cm", "out_of_range")]),
+        (104, "p3", [("sleep_quality", "unknown_value")]),
+        (105, "p4", [("known_htn", "not_a_boolean")]),
+        (106, "p5", [("weight_kg", "missing")]),
+        (107, "p6", [("weight_kg", "not_a_number")]),
+        (108, None, [("", "invalid_json")]),
+        (109, None, [("", "not_an_object")]),
+    ]
+    assert ids == ["p0", "p9", "p10", "p11"]
+    assert all(len(c) == len(ids) for c in cols.values())
+    ok = [json.loads(raw[i]) for i in (0, 9, 10, 11)]
+    ref = score_batch(hs.parse_chunk(list(enumerate(ok, 1)))[1])
+    got = score_batch(cols)
+    for k in ref:
+        np.testing.assert_array_equal(got[k], ref[k], err_msg=k)
+
+
+def test_missing_ids_fall_back_to_record_numbers_unless_required():
+    rows = list(iter_rows(3, seed=72))
+    rows[1]["id"] = "named"
+    chunk = list(enumerate(rows, 1))
+    assert hs.parse_chunk(chunk)[0] == [1, "named", 3]
+    ids, _, rejects = hs.parse_chunk(chunk, require_id=True)
+    assert ids == ["named"]
+    assert _codes(rejects) == [(1, None, [("id", "missing")]), (3, None, [("id", "missing")])]
+
+
+def test_score_cli_reports_rejects_as_jsonl(tmp_path, capsys):
+    rows = list(iter_rows(5, seed=73))
+    rows[2]["bp_bucket"] = "very high"
+    src = tmp_path / "in.jsonl"
+    src.write_text("".join(json.dumps(r) + "\n" for r in rows))
+    rej = tmp_path / "rejects.jsonl"
+    out = tmp_path / "out.jsonl"
+    assert hs.main(["score", str(src), "-o", str(out), "--rejects", str(rej)]) == 1
+    assert len(out.read_text().splitlines()) == 4
+    [line] = rej.read_text().splitlines()
+    assert json.loads(line)["record"] == 3
+    assert json.loads(line)["reasons"][0]["code"] == "unknown_value"
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import instrumentation
+from risk_engine import ACTION_IDS, MASK_OVERRIDES, rule_masks, score_all, score_batch
+from synthetic import population, records
+
+
+@pytest.fixture(autouse=True)
+def _off():
+    instrumentation.disable()
+    yield
+    instrumentation.disable()
+
+
+def test_disabled_is_a_no_op():
+    cols = population(500, seed=91)
+    assert instrumentation.current() is None
+    assert instrumentation.stage("score") is instrumentation.stage("other")
+    with instrumentation.stage("score"):
+        pass
+    wrapped = instrumentation.instrumented(score_batch)
+    got, want = wrapped(cols), score_batch(cols)
+    for k in want:
+        np.testing.assert_array_equal(got[k], want[k], err_msg=k)
+    for x in records(cols)[:50]:
+        assert instrumentation.score_all(x) == score_all(x)
+    assert instrumentation.current() is None
+    assert instrumentation.snapshot() is None
+    assert instrumentation.take() is None
+
+
+def test_enabled_counts_masks_from_batches_and_records():
+    cols = population(2000, seed=92)
+    people = records(cols)
+    inst = instrumentation.enable()
+    instrumentation.instrumented(score_batch)(cols)
+    for x in people[:300]:
+        assert instrumentation.score_all(x) == score_all(x)
+    assert inst.records == 2300
+
+    masks = [rule_masks(x) for x in people] + [rule_masks(x) for x in people[:300]]
+    for i, (d, reasons) in enumerate(instrumentation.DOMAINS):
+        want = np.bincount([m[i] for m in masks], minlength=1 << len(reasons))
+        assert inst.masks[d] == want.tolist()
+
+    snap = instrumentation.snapshot()
+    assert snap["records"] == 2300
+    for i, (d, reasons) in enumerate(instrumentation.DOMAINS):
+        assert snap["rule_hits"][d] == {r: sum(m[i] >> b & 1 for m in masks) for b, r in enumerate(reasons)}
+        fired = sum(MASK_OVERRIDES[d](m[i]) for m in masks)
+        assert snap["override_triggers"].get(d, 0) == fired
+    assert sum(snap["actions"].values()) == 2 * 2300
+    assert set(snap["actions"]) == set(ACTION_IDS)
+    assert {"score", "rules", "levels", "actions"} <= set(snap["stages"])
+    assert snap["stages"]["score"]["count"] == 1 and snap["stages"]["rules"]["count"] == 300
+
+
+def test_take_detaches_and_merge_adds_up():
+    cols = population(1000, seed=93)
+    instrumentation.enable()
+    scorer = instrumentation.instrumented(score_batch)
+    scorer(cols)
+    first = instrumentation.take()
+    scorer(cols)
+    second = instrumentation.take()
+    assert first.records == second.records == 1000
+    first.merge(second)
+    assert first.records == 2000
+    assert first.masks["cardio"] == [2 * c for c in second.masks["cardio"]]
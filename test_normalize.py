@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pytest
+
+import normalize
+from normalize import (
+    INVALID_JSON,
+    MISSING,
+    NOT_A_BOOLEAN,
+    NOT_A_NUMBER,
+    NOT_AN_INTEGER,
+    NOT_AN_OBJECT,
+    OUT_OF_RANGE,
+    UNKNOWN_VALUE,
+    canonical,
+    normalize_record,
+    normalize_records,
+)
+from risk_engine import CATEGORIES
+from synthetic import iter_rows
+
+BASE = next(iter_rows(1, seed=31))
+
+
+def _with(**changes):
+    return dict(BASE, **changes)
+
+
+BAD = [
+    (_with(age=None), [("age", MISSING)]),
+    (_with(age="  "), [("age", MISSING)]),
+    (_with(age="abc"), [("age", NOT_A_NUMBER)]),
+    (_with(age=True), [("age", NOT_A_NUMBER)]),
+    (_with(age=12), [("age", OUT_OF_RANGE)]),
+    (_with(age=38.9), [("age", NOT_AN_INTEGER)]),
+    (_with(age="38.5"), [("age", NOT_AN_INTEGER)]),
+    (_with(height_cm=20.0), [("height_cm", OUT_OF_RANGE)]),
+    (_with(weight_kg=float("nan")), [("weight_kg", NOT_A_NUMBER)]),
+    (_with(family_cvd="maybe"), [("family_cvd", NOT_A_BOOLEAN)]),
+    (_with(family_cvd=None), [("family_cvd", MISSING)]),
+    (_with(bp_bucket="very high"), [("bp_bucket", UNKNOWN_VALUE)]),
+    (_with(bp_bucket=["HIGH"]), [("bp_bucket", UNKNOWN_VALUE)]),
+    (_with(age=None, sex="X"), [("age", MISSING), ("sex", UNKNOWN_VALUE)]),
+    ("{not json", [("", INVALID_JSON)]),
+    ("[1, 2]", [("", NOT_AN_OBJECT)]),
+]
+
+
+@pytest.mark.parametrize("raw,want", BAD)
+def test_reject_codes_match_between_the_column_and_record_paths(raw, want):
+    batch = normalize_records([BASE, raw, BASE])
+    assert batch.rows.tolist() == [0, 2]
+    assert [(p.field, p.code) for p in batch.rejects[1]] == want
+    _, _, problems = normalize_record(raw)
+    assert [(p.field, p.code) for p in problems] == want
+    assert all(p.describe() for p in problems)
+
+
+def test_whole_number_ages_are_accepted_in_any_spelling():
+    for age in (38, 38.0, "38", " 38.0 "):
+        batch = normalize_records([_with(age=age)])
+        assert not batch.rejects, age
+        assert batch.cols["age"].tolist() == [38]
+        assert normalize_record(_with(age=age))[1]["age"] == 38
+
+
+@pytest.mark.parametrize("field,raw,want", [
+    ("exercise_bucket", "mid", "MID"),
+    ("exercise_bucket", "MID (2–3x/week)", "MID"),
+    ("exercise_bucket", "moderate", "MID"),
+    ("sleep_duration_bucket", "6–7", "6-7"),
+    ("bp_bucket", " sometimes high", "SOMETIMES_HIGH"),
+    ("bp_bucket", "n/a", "UNKNOWN"),
+    ("smoking_vaping", "y", "YES"),
+    ("sex", "F", "Female"),
+    ("sex", "robot", None),
+])
+def test_aliases(field, raw, want):
+    assert canonical(field, raw) == want
+    if want is not None:
+        batch = normalize_records([_with(**{field: raw})])
+        assert batch.cols[field].tolist() == [CATEGORIES[field].index(want)]
+
+
+def test_lookups_stop_caching_at_the_limit_but_still_resolve():
+    lookup = normalize._category_lookup("exercise_bucket")
+    junk = [f"junk {i}" for i in range(normalize._CACHE_LIMIT + 100)]
+    codes = normalize._codes(lookup, junk + ["mid", "LOW"])
+    assert len(lookup) == normalize._CACHE_LIMIT
+    assert (codes[:len(junk)] == normalize._UNKNOWN_CODE).all()
+    np.testing.assert_array_equal(codes[len(junk):], [CATEGORIES["exercise_bucket"].index(v) for v in ("MID", "LOW")])
+
+
+def test_json_strings_and_dicts_normalize_the_same():
+    rows = list(iter_rows(50, seed=32))
+    a = normalize_records(rows)
+    b = normalize_records([json.dumps(r) for r in rows])
+    assert not a.rejects and not b.rejects
+    for f in a.cols:
+        np.testing.assert_array_equal(a.cols[f], b.cols[f], err_msg=f)
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+
+import pytest
+
+import healthsignal as hs
+import parallel_score
+from synthetic import iter_rows
+
+
+def _rows(n, seed):
+    rows = [dict(r, id=f"p{i}") for i, r in enumerate(iter_rows(n, seed=seed))]
+    rows[7]["age"] = 12  # rejected: its record number must survive sharding
+    rows[-3]["bp_bucket"] = "very high"
+    return rows
+
+
+def _write(path, rows, fmt):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            w = csv.DictWriter(f, fieldnames=list(rows[0]), lineterminator="\n")
+            w.writeheader()
+            w.writerows(rows)
+        else:
+            f.writelines(json.dumps(r) + "\n" for r in rows)
+    return str(path)
+
+
+def _single(path, in_fmt, out_fmt):
+    out, err = io.StringIO(), io.StringIO()
+    with hs.open_input(path) as inp:
+        counts = hs.score_stream(inp, out, in_fmt, out_fmt, chunk_size=16, err=err, reject_fmt="jsonl")
+    return counts, out.getvalue(), err.getvalue()
+
+
+def _parallel(path, in_fmt, out_fmt):
+    out, err = io.StringIO(), io.StringIO()
+    counts = parallel_score.score_parallel(
+        path, out, in_fmt, out_fmt, workers=2, chunk_size=16, shard_bytes=512, err=err, reject_fmt="jsonl",
+    )
+    return counts, out.getvalue(), err.getvalue()
+
+
+@pytest.mark.parametrize("in_fmt,out_fmt", [("csv", "csv"), ("jsonl", "jsonl"), ("csv", "jsonl")])
+def test_sharded_output_is_byte_identical(tmp_path, in_fmt, out_fmt):
+    path = _write(tmp_path / f"in.{in_fmt}", _rows(120, seed=41), in_fmt)
+    _, _, shards = parallel_score.plan_shards(path, in_fmt, 512)
+    assert len(shards) > 10
+    assert _parallel(path, in_fmt, out_fmt) == _single(path, in_fmt, out_fmt)
+
+
+def test_quoted_newlines_in_csv_keep_output_and_record_numbers(tmp_path):
+    rows = _rows(120, seed=42)
+    for i in range(0, len(rows), 9):
+        rows[i]["id"] = f"line one\nline two {i}"
+    path = _write(tmp_path / "in.csv", rows, "csv")
+
+    _, data_start, shards = parallel_score.plan_shards(path, "csv", 512)
+    assert any(parallel_score._count_shard(path, s, data_start, "csv", None)[1] for s in shards)
+
+    got, want = _parallel(path, "csv", "jsonl"), _single(path, "csv", "jsonl")
+    assert got == want
+    assert got[0] == (118, 2)
+    assert [json.loads(line)["record"] for line in got[2].splitlines()] == [8, 118]
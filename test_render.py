@@ -0,0 +1,53 @@
+import json
+import os
+
+import healthsignal as hs
+import report
+from risk_engine import score_batch
+from synthetic import iter_rows
+
+
+def _write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r) + "\n")
+    return str(path)
+
+
+def _contents(d):
+    out = {}
+    for name in sorted(os.listdir(d)):
+        with open(os.path.join(d, name), encoding="utf-8") as f:
+            out[name] = f.read()
+    return out
+
+
+def _rows():
+    ids = ["a b", "a_b", "x", "x", "X", "../etc", "ok", None]
+    return [dict(r, id=i) if i is not None else r for i, r in zip(ids, iter_rows(len(ids), seed=7))]
+
+
+def test_colliding_ids_do_not_overwrite_each_other(tmp_path, capsys):
+    rows = _rows()
+    src = _write_jsonl(tmp_path / "in.jsonl", rows)
+    out = tmp_path / "reports"
+    assert hs.main(["render", src, "-o", str(out)]) == 0
+    assert "3 reports share a file name" in capsys.readouterr().err
+
+    files = _contents(out)
+    assert sorted(files) == ["8.md", "X~5.md", "_etc.md", "a_b.md", "a_b~2.md", "ok.md", "x.md", "x~4.md"]
+    cols = hs.parse_chunk(list(enumerate(rows, 1)))[1]
+    docs = report.render_results(score_batch(cols), "md")
+    expected = ["a_b.md", "a_b~2.md", "x.md", "x~4.md", "X~5.md", "_etc.md", "ok.md", "8.md"]
+    for name, doc in zip(expected, docs):
+        assert files[name] == doc
+
+
+def test_parallel_render_names_reports_like_a_single_process(tmp_path):
+    rows = _rows() * 5
+    src = _write_jsonl(tmp_path / "in.jsonl", rows)
+    one, many = tmp_path / "one", tmp_path / "many"
+    assert hs.main(["render", src, "-o", str(one), "--chunk-size", "3"]) == 0
+    assert hs.main(["render", src, "-o", str(many), "--chunk-size", "3", "--workers", "2"]) == 0
+    assert _contents(one) == _contents(many)
+    assert len(_contents(one)) == len(rows)
@@ -0,0 +1,110 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import risk_engine
+from compact import columns, pack_array
+from risk_engine import (
+    ACTION_IDS,
+    OUTPUTS,
+    TRIGGER_DEPS,
+    Inputs,
+    batch_row,
+    pick_actions,
+    projection,
+    rescore,
+    rescore_stats,
+    score_all,
+    score_batch,
+    score_cardiometabolic,
+    score_msk_energy,
+    score_sleep_stress,
+    score_state,
+)
+from score_table import TABLE_SIZE, key_columns, key_inputs
+from synthetic import population, records
+
+
+def _scalar(x):
+    cardio, sleep, msk = score_cardiometabolic(x), score_sleep_stress(x), score_msk_energy(x)
+    return cardio, sleep, msk, pick_actions(cardio[0], sleep[0], msk[0], x)
+
+
+def _assert_batch_matches_scalar(cols, people):
+    result = score_batch(cols)
+    for i, x in enumerate(people):
+        want = _scalar(x)
+        assert batch_row(result, i) == want, x
+        a = score_all(x)
+        assert (a.cardio, a.sleep, a.msk, a.actions) == want, x
+
+
+def test_batch_matches_scalar_on_a_population():
+    cols = population(5000, seed=21)
+    _assert_batch_matches_scalar(cols, records(cols))
+
+
+def test_batch_matches_scalar_across_the_key_space():
+    # sampled keys reach bucket combinations a realistic population rarely has
+    keys = np.random.default_rng(22).choice(TABLE_SIZE, 5000, replace=False)
+    _assert_batch_matches_scalar(key_columns(keys), [key_inputs(int(k)) for k in keys])
+
+
+def test_code_and_string_columns_score_the_same():
+    cols = population(3000, seed=23)
+    coded = columns(pack_array(records(cols)))
+    ref, got = score_batch(cols), score_batch(coded)
+    assert set(ref) == set(got)
+    for k in ref:
+        np.testing.assert_array_equal(got[k], ref[k], err_msg=k)
+
+
+@pytest.mark.parametrize("outputs", [p for n in range(1, len(OUTPUTS)) for p in itertools.combinations(OUTPUTS, n)])
+def test_projections_match_the_full_result(outputs):
+    cols = population(1000, seed=24)
+    full, part = score_batch(cols), score_batch(cols, outputs)
+    assert part and set(part) < set(full)
+    for k in part:
+        np.testing.assert_array_equal(part[k], full[k], err_msg=k)
+
+    slots = {"levels": 0, "points": 1, "reasons": 2}
+    for x in records(cols)[:200]:
+        a, p = score_all(x), score_all(x, outputs)
+        for d in ("cardio", "sleep", "msk"):
+            for name, i in slots.items():
+                assert getattr(p, d)[i] == (getattr(a, d)[i] if name in outputs else None)
+        assert p.actions == (a.actions if "actions" in outputs else None)
+
+
+def test_rescore_matches_a_full_score_and_counts_across_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    people = records(population(400, seed=25))
+    edits = records(population(400, seed=26))
+    rescore_stats(reset=True)
+
+    def check(i):
+        x, y = people[i], edits[i]
+        changed = {f: getattr(y, f) for f in ("sleep_quality", "alcohol_bucket", "weight_kg")}
+        new = Inputs(**{**vars(x), **changed})
+        got = rescore(score_state(x), new)
+        want = score_state(new)
+        assert (got.assessment, got.triggers) == (want.assessment, want.triggers), new
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(check, range(len(people))))
+    stats = rescore_stats(reset=True)
+    assert stats["calls"] == len(people)
+    assert stats["domains_recomputed"] + stats["domains_skipped"] == 3 * len(people)
+    assert rescore_stats() == {}
+
+
+def test_trigger_names_are_action_ids():
+    assert set(TRIGGER_DEPS) <= set(ACTION_IDS)
+
+
+def test_projection_cache_is_bounded():
+    for n in range(1, 2000):
+        assert projection(("levels",) * n) == {"levels"}
+    assert len(risk_engine._PROJECTIONS) <= risk_engine._PROJECTIONS_LIMIT
@@ -0,0 +1,173 @@
+import copy
+import json
+
+import numpy as np
+import pytest
+
+import healthsignal as hs
+import rules
+from risk_engine import RULES, RULES_VERSION, batch_row, score_all
+from rules import DEFAULT_RULES_PATH, RuleError, compile_rules, diff_against_engine, load_rules
+from score_table import TABLE_SIZE, key_columns, key_inputs
+from synthetic import iter_rows, population, records
+
+
+@pytest.fixture(scope="module")
+def spec():
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _v2(spec):
+    # v1 with other points, reasons and cutoffs, and a third action
+    v2 = copy.deepcopy(spec)
+    v2["version"] = "v2"
+    for rule in v2["domains"]["cardio"]["rules"]:
+        rule["points"] += 1
+        rule["reason"] = "v2 " + rule["reason"]
+    v2["domains"]["sleep"]["mod_max"] = 2
+    v2["actions"]["max"] = 3
+    return v2
+
+
+def _assert_batch_matches_scalar(rs, cols, people):
+    result = rs.score_batch(cols)
+    for i, x in enumerate(people):
+        a = rs.score(x)
+        assert batch_row(result, i, rs) == (a.cardio, a.sleep, a.msk, a.actions), x
+
+
+def test_compiled_v1_matches_score_all_and_the_reference_scorers(spec):
+    rs = compile_rules(spec)
+    assert rs.version == RULES_VERSION
+    people = records(population(3000, seed=61))
+    keys = np.random.default_rng(62).choice(TABLE_SIZE, 3000, replace=False)
+    people += [key_inputs(int(k)) for k in keys]
+    for x in people:
+        a, b = rs.score(x), score_all(x)
+        assert (a.cardio, a.sleep, a.msk, a.actions, a.rules_version) == (
+            b.cardio, b.sleep, b.msk, b.actions, b.rules_version), x
+    assert diff_against_engine(rs, people) == []
+    _assert_batch_matches_scalar(rs, key_columns(keys), people[3000:])
+
+
+def test_engine_tables_come_from_the_rule_file(spec):
+    import risk_engine
+
+    assert risk_engine.CARDIO_REASONS == tuple(r["reason"] for r in spec["domains"]["cardio"]["rules"])
+    assert risk_engine.ACTION_IDS == tuple(spec["actions"]["catalog"])
+    assert risk_engine.MASK_RESULTS is RULES.mask_results
+
+
+@pytest.mark.parametrize("edit,match", [
+    (lambda s: s.pop("actions"), "missing top-level key 'actions'"),
+    (lambda s: s["domains"].pop("msk"), "domains must be exactly"),
+    (lambda s: s["domains"]["sleep"].pop("low_max"), "sleep: missing key 'low_max'"),
+    (lambda s: s["domains"]["sleep"].update(rules=[]), "sleep: expected 1 to 16 rules, got 0"),
+    (lambda s: s["domains"]["sleep"]["rules"].extend(s["domains"]["sleep"]["rules"] * 2),
+     "sleep: expected 1 to 16 rules, got 21"),
+    (lambda s: s["domains"]["cardio"]["rules"][0].update(when="tall"), "unknown boolean field or signal 'tall'"),
+    (lambda s: s["domains"]["cardio"]["rules"][0].update(when={"field": "shoe_size", "in": ["9"]}),
+     "unknown categorical field 'shoe_size'"),
+    (lambda s: s["domains"]["cardio"]["rules"][0].update(when={"field": "sleep_quality", "in": ["SOUND"]}),
+     "not all in"),
+    (lambda s: s["domains"]["cardio"]["rules"][0].update(when={"level": "sleep", "in": ["High"]}),
+     "cardio rule 0: level of 'sleep' is not available here"),
+    (lambda s: s["domains"]["sleep"]["overrides"].append("family_cvd"),
+     "sleep override 2: family_cvd is not a sleep rule condition"),
+    (lambda s: s["actions"]["pick"][0].update(when={"field": "sex", "in": ["Male"]}),
+     "action pick 0: .* is not a cardio/sleep/msk rule condition"),
+    (lambda s: s["actions"]["pick"][0].update(action="nap"), "action pick 0: unknown action 'nap'"),
+    (lambda s: s["actions"].update(pick=[]), "actions: no picks"),
+    (lambda s: s["actions"].update(max=0), "actions: max must be at least 1"),
+])
+def test_compile_rejects_bad_specs(spec, edit, match):
+    bad = copy.deepcopy(spec)
+    edit(bad)
+    with pytest.raises(RuleError, match=match):
+        compile_rules(bad)
+
+
+def test_load_rejects_missing_and_invalid_files(tmp_path):
+    with pytest.raises(RuleError, match="no rule file"):
+        load_rules("v0")
+    path = tmp_path / "broken.json"
+    path.write_text("{", encoding="utf-8")
+    with pytest.raises(RuleError, match="invalid JSON"):
+        load_rules(str(path))
+    assert rules.main([str(path)]) == 2
+
+
+def test_two_versions_score_side_by_side(spec, tmp_path):
+    path = tmp_path / "v2.json"
+    path.write_text(json.dumps(_v2(spec)), encoding="utf-8")
+    v1, v2 = load_rules("v1"), load_rules(str(path))
+    assert (v1.version, v2.version, v2.path) == ("v1", "v2", str(path))
+
+    cols = population(2000, seed=63)
+    people = records(cols)
+    _assert_batch_matches_scalar(v1, cols, people)
+    _assert_batch_matches_scalar(v2, cols, people)
+    res1, res2 = v1.score_batch(cols), v2.score_batch(cols)
+    np.testing.assert_array_equal(res2["cardio_points"][res1["cardio_mask"] == 0], 0)
+    assert (res2["cardio_points"] >= res1["cardio_points"]).all()
+    assert (res2["cardio_points"] > res1["cardio_points"]).any()
+    assert res2["actions"].shape == (2000, 3) and res1["actions"].shape == (2000, 2)
+    for x in people[:300]:
+        a, b = v1.score(x), v2.score(x)
+        assert (a.rules_version, b.rules_version) == ("v1", "v2")
+        assert [r[3:] for r in b.cardio[2]] == a.cardio[2]
+        assert b.sleep[2] == a.sleep[2]
+        if (a.cardio[0], a.sleep[0]) == (b.cardio[0], b.sleep[0]):
+            assert b.actions[:2] == a.actions
+    # v1 is untouched by compiling v2
+    assert score_all(people[0]).rules_version == RULES_VERSION
+
+
+def test_score_cli_takes_a_rules_version(spec, tmp_path, capsys):
+    path = tmp_path / "v2.json"
+    path.write_text(json.dumps(_v2(spec)), encoding="utf-8")
+    src = tmp_path / "in.jsonl"
+    src.write_text("".join(json.dumps(r) + "\n" for r in iter_rows(200, seed=64)), encoding="utf-8")
+    out = tmp_path / "out.jsonl"
+
+    assert hs.main(["score", str(src), "-o", str(out), "--rules", str(path)]) == 0
+    rows = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    v2 = load_rules(str(path))
+    assert {r for row in rows for r in row["cardio_reasons"]} <= set(v2.reasons["cardio"])
+    assert any(row["cardio_reasons"] for row in rows)
+    assert max(len(row["actions"]) for row in rows) == 3
+
+    with pytest.raises(SystemExit):
+        hs.main(["score", str(src), "--rules", "v0"])
+    with pytest.raises(SystemExit):
+        hs.main(["score", str(src), "--rules", str(path), "--table", "any.hst"])
+    assert "--table cannot score rules v2" in capsys.readouterr().err
+
+
+def test_render_cohort_and_daemon_use_the_given_rules(spec, tmp_path):
+    import cohort
+    import daemon
+    import report
+
+    path = tmp_path / "v2.json"
+    path.write_text(json.dumps(_v2(spec)), encoding="utf-8")
+    v2 = load_rules(str(path))
+    cols = population(500, seed=65)
+    res = v2.score_batch(cols)
+    docs = report.render_results(res, "md", v2)
+    for i in (0, 99, 499):
+        assert docs[i] == report.render(report._make_report(*batch_row(res, i, v2)), "md")
+    assert any("v2 " in d for d in docs)
+
+    stats = cohort.aggregate([cols], rules=v2)
+    assert set(stats.action_counts()) == {a["title"] for a in v2.actions}
+    assert sum(stats.action_counts().values()) == int((res["actions"] >= 0).sum())
+    with pytest.raises(ValueError, match="rules v1 and v2"):
+        cohort.CohortStats().merge(stats)
+
+    engine = daemon.Engine(rules_path=str(path))
+    assert engine.rules.version == "v2"
+    x = records(cols)[0]
+    a = v2.score(x)
+    assert engine.one(x) == (a.cardio, a.sleep, a.msk, a.actions)
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import score_table
+from compact import columns, pack_array
+from risk_engine import score_all, score_batch
+from score_table import TABLE_SIZE, ScoreTable, TableError
+from synthetic import population, records
+
+
+@pytest.fixture(scope="module")
+def table():
+    return ScoreTable.build()
+
+
+@pytest.fixture(scope="module")
+def table_file(table, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("table") / "t.hst")
+    table.save(path)
+    return path
+
+
+def test_saved_table_loads_and_scores_like_the_engine(table_file):
+    cols = population(20000, seed=3)
+    ref = score_batch(cols)
+    for mmap in (True, False):
+        got = ScoreTable.load(table_file, mmap=mmap).score_batch(cols)
+        for k in ref:
+            np.testing.assert_array_equal(got[k], ref[k], err_msg=k)
+
+
+def test_lookup_matches_scalar_scorers(table_file):
+    t = ScoreTable.load(table_file)
+    for x in records(population(500, seed=4)):
+        a = score_all(x)
+        assert t.lookup(x) == (a.cardio, a.sleep, a.msk, a.actions)
+
+
+def test_integer_code_columns_give_the_same_keys():
+    cols = population(5000, seed=5)
+    coded = columns(pack_array(records(cols)))
+    np.testing.assert_array_equal(score_table.keys_of(coded), score_table.keys_of(cols))
+
+
+def test_load_refuses_a_different_rules_version(table_file, monkeypatch):
+    monkeypatch.setattr(score_table, "RULES_VERSION", "v-next")
+    with pytest.raises(TableError, match="rules version"):
+        ScoreTable.load(table_file)
+
+
+def test_load_refuses_a_different_key_layout(table_file, monkeypatch):
+    monkeypatch.setitem(score_table.CATEGORIES, "bp_bucket", tuple(reversed(score_table.CATEGORIES["bp_bucket"])))
+    with pytest.raises(TableError, match="key"):
+        ScoreTable.load(table_file)
+
+
+def test_load_refuses_entries_that_disagree_with_the_engine(table, tmp_path):
+    path = str(tmp_path / "stale.hst")
+    stale = np.array(table.entries)
+    stale[::7] ^= np.uint64(1)  # as if a rule changed without a version bump
+    ScoreTable(stale).save(path)
+    with pytest.raises(TableError, match="disagree"):
+        ScoreTable.load(path)
+    assert len(ScoreTable.load(path, spot_check=0).entries) == TABLE_SIZE
+
+
+def test_load_refuses_unstamped_and_truncated_files(table, table_file, tmp_path):
+    bare = str(tmp_path / "bare.npy")
+    np.save(bare, np.asarray(table.entries))
+    with pytest.raises(TableError, match="unstamped"):
+        ScoreTable.load(bare)
+    cut = tmp_path / "cut.hst"
+    cut.write_bytes(open(table_file, "rb").read()[:-8])
+    with pytest.raises(TableError, match="truncated"):
+        ScoreTable.load(str(cut))
+    with pytest.raises(TableError, match="truncated"):
+        ScoreTable.load(str(cut), mmap=False)
+
+
+def test_keys_of_rejects_out_of_range_codes():
+    cols = score_table.key_columns(np.arange(3))
+    for bad in (-1, 5):
+        codes = np.array([0, bad, 1], dtype=np.int64)
+        with pytest.raises(TableError, match="out of range for bp_bucket"):
+            score_table.keys_of(dict(cols, bp_bucket=codes))
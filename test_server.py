@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+
+import healthsignal as hs
+import server
+from risk_engine import Inputs, score_all, score_batch
+from synthetic import iter_rows
+
+
+async def _request(port, method, path, body=None, headers=""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = b"" if body is None else json.dumps(body).encode("utf-8")
+    writer.write(f"{method} {path} HTTP/1.1\r\n{headers}Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        if k.lower() == "content-length":
+            length = int(v)
+    payload = json.loads(await reader.readexactly(length))
+    writer.close()
+    return status, payload
+
+
+def _with_server(test, scorer=score_batch, **kw):
+    async def run():
+        srv = server.ScoringServer(scorer, **kw)
+        tcp = await asyncio.start_server(srv.handle, "127.0.0.1", 0)
+        try:
+            return await test(srv, tcp.sockets[0].getsockname()[1])
+        finally:
+            tcp.close()
+            await tcp.wait_closed()
+            srv.batcher.close()
+    return asyncio.run(run())
+
+
+def _levels(row):
+    return row["cardio_level"], row["sleep_level"], row["msk_level"]
+
+
+def test_score_and_batch_match_the_engine():
+    rows = [dict(r, id=i) for i, r in enumerate(iter_rows(30, seed=51))]
+    rows[4]["age"] = 12
+
+    async def test(srv, port):
+        one = await _request(port, "POST", "/score", rows[0])
+        many = await _request(port, "POST", "/score/batch", rows)
+        bad = await _request(port, "POST", "/score", rows[4])
+        return one, many, bad
+
+    (s1, one), (s2, many), (s3, bad) = _with_server(test)
+    assert (s1, s2, s3) == (200, 200, 400)
+    assert bad["codes"] == ["out_of_range"]
+    results = many["results"]
+    assert results[4]["index"] == 4 and results[4]["codes"] == ["out_of_range"]
+    assert results[0] == one
+    for row, got in zip(rows, results):
+        if "error" not in got:
+            a = score_all(Inputs(**hs.parse_record(row)[1]))
+            assert got["id"] == row["id"] and _levels(got) == (a.cardio[0], a.sleep[0], a.msk[0])
+
+
+def test_scoring_runs_off_the_event_loop():
+    def slow(cols):
+        time.sleep(0.5)
+        return score_batch(cols)
+
+    row = next(iter_rows(1, seed=52))
+
+    async def test(srv, port):
+        scoring = asyncio.create_task(_request(port, "POST", "/score", row))
+        await asyncio.sleep(0.1)  # the batch is now on the scoring thread
+        t0 = time.perf_counter()
+        health = await _request(port, "GET", "/health")
+        waited = time.perf_counter() - t0
+        return health, waited, await scoring
+
+    (hstatus, _), waited, (status, _) = _with_server(test, scorer=slow, max_wait=0.001)
+    assert (hstatus, status) == (200, 200)
+    assert waited < 0.3
+
+
+def test_oversized_request_line_and_header_get_replies():
+    async def test(srv, port):
+        long_target = await _request(port, "GET", "/health?" + "x" * 70000)
+        long_header = await _request(port, "GET", "/health", headers=f"X-Pad: {'y' * 70000}\r\n")
+        return long_target, long_header
+
+    (s1, p1), (s2, p2) = _with_server(test)
+    assert s1 == 400 and "too long" in p1["error"]
+    assert s2 == 431 and "too long" in p2["error"]
+
+
+def test_records_per_s_covers_the_recent_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    m = server.Metrics()
+    now[0] += 3600.0  # an hour idle
+    m.count(500)
+    now[0] += 5.0
+    m.count(500)
+    assert m.rate() == 1000 / server.RATE_WINDOW_S
+    now[0] += server.RATE_WINDOW_S + 1
+    assert m.rate() == 0.0
+    assert m.records == 1000
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+import store
+from synthetic import iter_rows
+
+
+def _write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r) + "\n")
+    return str(path)
+
+
+def test_idless_records_are_rejected_not_keyed_by_record_number(tmp_path, capsys):
+    db = str(tmp_path / "a.db")
+    a = _write_jsonl(tmp_path / "a.jsonl", iter_rows(20, seed=1))
+    b = _write_jsonl(tmp_path / "b.jsonl", iter_rows(20, seed=2))
+
+    assert store.main(["ingest", db, a, "--date", "2026-01-01"]) == 1
+    assert store.main(["ingest", db, b, "--date", "2026-02-01"]) == 1
+    assert "id: missing" in capsys.readouterr().err
+
+    with store.Store(db) as s:
+        assert s.count() == 0
+        assert s.history(1) == []
+        assert s.increases("cardio") == []
+
+
+def test_records_with_ids_build_one_history_per_subject(tmp_path):
+    db = str(tmp_path / "a.db")
+    first = [dict(r, id=f"p{i}") for i, r in enumerate(iter_rows(10, seed=1))]
+    second = [dict(r, id=f"p{i}") for i, r in enumerate(iter_rows(10, seed=2))]
+    second.append(next(iter_rows(1, seed=3)))  # no id: rejected, the rest saved
+    a = _write_jsonl(tmp_path / "a.jsonl", first)
+    b = _write_jsonl(tmp_path / "b.jsonl", second)
+
+    assert store.main(["ingest", db, a, "--date", "2026-01-01"]) == 0
+    assert store.main(["ingest", db, b, "--date", "2026-02-01"]) == 1
+
+    with store.Store(db) as s:
+        assert s.count() == 20
+        hist = s.history("p3")
+        assert [h.assessed_on for h in hist] == ["2026-01-01", "2026-02-01"]
+        assert hist[0].inputs.age == first[3]["age"]
+        assert hist[1].inputs.age == second[3]["age"]
+
+
+def test_ingest_rejects_a_non_positive_chunk_size(tmp_path, capsys):
+    a = _write_jsonl(tmp_path / "a.jsonl", iter_rows(5, seed=1))
+    for bad in ("0", "-5"):
+        with pytest.raises(SystemExit) as e:
+            store.main(["ingest", str(tmp_path / "a.db"), a, "--chunk-size", bad])
+        assert e.value.code == 2
+        assert "expected a positive integer" in capsys.readouterr().err
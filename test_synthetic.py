@@ -0,0 +1,18 @@
+from synthetic import iter_rows
+
+
+def _chunks(seed, n=40, chunk=10):
+    rows = list(iter_rows(n, seed=seed, chunk=chunk))
+    return [tuple(map(repr, rows[i:i + chunk])) for i in range(0, n, chunk)]
+
+
+def test_iter_rows_is_reproducible():
+    assert _chunks(3) == _chunks(3)
+
+
+def test_nearby_seeds_share_no_chunks():
+    seen = {}
+    for seed in range(4):
+        for i, c in enumerate(_chunks(seed)):
+            assert c not in seen, f"seed {seed} chunk {i} repeats {seen.get(c)}"
+            seen[c] = (seed, i)